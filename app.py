@@ -1,6 +1,4 @@
 import streamlit as st
-from financial_agent.core.agent import create_financial_agent
-from financial_agent.core.llm_adapter import VolcanoLLM
 from webapp.session import (
     initialize_session_state,
     get_current_messages,
@@ -10,20 +8,53 @@ from webapp.ui import (
     render_page_config,
     render_sidebar,
     render_chat_messages,
-    render_agent_response
+    render_agent_response,
+    render_response_cache_metrics,
+    render_serving_metrics
 )
 
 # --- 1. 页面与会话初始化 ---
 render_page_config()
 initialize_session_state()
 
-# --- 2. 智能体初始化 ---
+# --- 2. 智能体初始化（延迟导入，先渲染页面再创建智能体） ---
 @st.cache_resource
 def get_agent():
     """缓存并返回金融智能体实例"""
+    from financial_agent.core.agent import create_financial_agent
+    from financial_agent.core.llm_adapter import VolcanoLLM
     llm = VolcanoLLM(streaming=True)
     return create_financial_agent(llm)
-agent = get_agent()
+
+@st.cache_resource
+def get_response_cache():
+    """进程级共享的回答缓存（RESPONSE_CACHE=0 关闭）"""
+    import os
+    if os.getenv("RESPONSE_CACHE", "1") == "0":
+        return None
+    from financial_agent.core.embeddings import create_embeddings
+    from financial_agent.core.response_cache import ResponseCache
+    from financial_agent.tools.knowledge_base_tool import kb_fingerprint
+    return ResponseCache(create_embeddings(), kb_fingerprint=kb_fingerprint)
+
+@st.cache_resource
+def get_router():
+    """快速路由（FAST_ROUTER=0 关闭），与智能体共用同一组工具"""
+    import os
+    if os.getenv("FAST_ROUTER", "1") == "0":
+        return None
+    from financial_agent.core.llm_adapter import VolcanoLLM
+    from financial_agent.core.router import FastPathRouter
+    return FastPathRouter.from_tools(get_agent().tools, VolcanoLLM(streaming=True))
+
+@st.cache_resource
+def get_agent_server():
+    """进程级共享的服务层：多个浏览器会话的智能体调用在固定数量的工作线程上排队执行（AGENT_SERVING=0 关闭）"""
+    import os
+    if os.getenv("AGENT_SERVING", "1") == "0":
+        return None
+    from financial_agent.core.serving import AgentServer
+    return AgentServer(get_agent())
 
 # --- 3. 渲染侧边栏 ---
 render_sidebar()
@@ -36,6 +67,14 @@ current_messages = get_current_messages()
 # 显示历史消息
 render_chat_messages(current_messages)
 
+# 历史消息已显示后再初始化智能体（知识库索引在后台加载）
+agent = get_agent()
+response_cache = get_response_cache()
+router = get_router()
+server = get_agent_server()
+render_response_cache_metrics(response_cache)
+render_serving_metrics(server)
+
 # 响应用户的新输入
 if prompt := st.chat_input("请输入您的问题..."):
     # a. 将用户消息添加到会话状态并显示
@@ -45,7 +84,8 @@ if prompt := st.chat_input("请输入您的问题..."):
 
     # b. 获取并流式显示智能体的回复
     # 注意：此时 current_messages 已经包含了最新的用户消息
-    full_response = render_agent_response(agent, prompt, current_messages)
+    full_response = render_agent_response(agent, prompt, current_messages, response_cache, router, server)
     
-    # c. 将完整的智能体回复添加到会话状态
-    add_message_to_current_session("assistant", full_response)
\ No newline at end of file
+    # c. 将完整的智能体回复添加到会话状态（排队已满时没有回答，提示只显示在界面上）
+    if full_response is not None:
+        add_message_to_current_session("assistant", full_response)
\ No newline at end of file
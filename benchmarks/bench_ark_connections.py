@@ -0,0 +1,96 @@
+"""
+方舟客户端连接复用基准：在本地桩服务上模拟一次智能体运行（多轮 LLM 调用 + 若干次 Embedding），
+统计共享连接池与“每次调用新建 Ark 客户端”两种方式建立的 TCP 连接数与耗时。
+
+运行：python -m benchmarks.bench_ark_connections --llm-calls 6 --embed-calls 2 --threads 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from volcenginesdkarkruntime import Ark
+
+from financial_agent.core import ark_client
+from financial_agent.core.llm_adapter import VolcanoEmbeddings, VolcanoLLM
+
+from .stub_ark import StubArkServer
+
+
+def agent_run(llm: VolcanoLLM, embeddings: VolcanoEmbeddings, llm_calls: int, embed_calls: int) -> None:
+    """一次智能体运行：检索知识库若干次，并进行多轮“思考-工具-观察”LLM 调用（最后一轮流式输出）。"""
+    for i in range(embed_calls):
+        embeddings.embed_query(f"市盈率是什么意思 {i}")
+    for i in range(llm_calls - 1):
+        llm.invoke(f"第 {i} 轮推理")
+    "".join(llm.stream("最终回答"))
+
+
+class UnpooledLLM(VolcanoLLM):
+    """对照组：沿用旧实现，每次调用都新建 Ark 客户端（各自的 httpx 连接池）。"""
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        completion = Ark(api_key=self.api_key, base_url=self.base_url).chat.completions.create(
+            model=self.model_id, messages=[{"role": "user", "content": prompt}], stream=False
+        )
+        return completion.choices[0].message.content
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+        from langchain.schema.output import GenerationChunk
+        stream = Ark(api_key=self.api_key, base_url=self.base_url).chat.completions.create(
+            model=self.model_id, messages=[{"role": "user", "content": prompt}], stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield GenerationChunk(text=chunk.choices[0].delta.content)
+
+
+class UnpooledEmbeddings(VolcanoEmbeddings):
+    @property
+    def client(self):
+        return Ark(api_key=self.api_key, base_url=self.base_url)
+
+
+def measure(server: StubArkServer, llm, embeddings, args) -> tuple:
+    server.stats.reset()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(lambda _: agent_run(llm, embeddings, args.llm_calls, args.embed_calls), range(args.runs)))
+    elapsed = time.perf_counter() - started
+    return server.stats.snapshot(), elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="方舟客户端连接复用基准")
+    parser.add_argument("--runs", type=int, default=8, help="智能体运行次数")
+    parser.add_argument("--threads", type=int, default=4, help="并发线程数（模拟 Streamlit 多会话）")
+    parser.add_argument("--llm-calls", type=int, default=6, help="每次运行的 LLM 调用次数")
+    parser.add_argument("--embed-calls", type=int, default=2, help="每次运行的 Embedding 调用次数")
+    parser.add_argument("--latency", type=float, default=0.01, help="桩服务每次请求的延迟（秒）")
+    args = parser.parse_args()
+
+    with StubArkServer(latency=args.latency, embedding_latency=args.latency) as server:
+        os.environ.update({
+            "ARK_API_KEY": "stub-key",
+            "ARK_MODEL_ID": "stub-model",
+            "ARK_EMBEDDING_MODEL_ID": "stub-embedding",
+            "ARK_BASE_URL": server.base_url,
+            # 关闭 Embedding 缓存与限流，只测量本基准关注的部分
+            "EMBEDDING_CACHE_MAX_ENTRIES": "0",
+            "EMBEDDING_RATE_LIMIT": "0",
+        })
+        results = {
+            "每次新建客户端": measure(server, UnpooledLLM(), UnpooledEmbeddings(), args),
+            "共享连接池": measure(server, VolcanoLLM(), VolcanoEmbeddings(), args),
+        }
+        ark_client.close_ark_clients()
+
+    calls = args.runs * (args.llm_calls + args.embed_calls)
+    print(f"{args.runs} 次智能体运行 × {args.llm_calls + args.embed_calls} 次请求，{args.threads} 个并发线程，共 {calls} 次请求")
+    for name, (stats, elapsed) in results.items():
+        print(f"{name}：TCP 连接 {stats['connections']} 条（每次运行 {stats['connections'] / args.runs:.1f}），"
+              f"耗时 {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
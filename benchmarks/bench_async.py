@@ -0,0 +1,105 @@
+"""
+异步路径验证：在本地桩服务上，用单个事件循环并发服务多个会话（知识库工具检索 + LLM 流式回答），
+与“每个会话占用一个线程”的同步实现对比总耗时与线程数。
+
+运行：python -m benchmarks.bench_async --sessions 50 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .stub_ark import StubArkServer
+
+
+def client_threads() -> int:
+    """进程内的线程数，不计桩服务处理请求的线程。"""
+    return sum(1 for t in threading.enumerate() if "process_request" not in t.name)
+
+
+class ThreadCounter:
+    """后台采样客户端线程数峰值。"""
+
+    def __init__(self):
+        self.peak = client_threads()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(0.005):
+            self.peak = max(self.peak, client_threads())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def sync_session(kb_tool, llm, i: int) -> str:
+    answer = kb_tool.run(f"什么是市盈率？会话 {i}")
+    return answer + "".join(llm.stream(f"请总结：{answer}"))
+
+
+async def async_session(kb_tool, llm, i: int) -> str:
+    answer = await kb_tool.arun(f"什么是市盈率？会话 {i}")
+    parts = [chunk async for chunk in llm.astream(f"请总结：{answer}")]
+    return answer + "".join(parts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="异步路径验证")
+    parser.add_argument("--sessions", type=int, default=50, help="并发会话数")
+    parser.add_argument("--latency", type=float, default=0.2, help="桩服务每次请求的延迟（秒）")
+    args = parser.parse_args()
+
+    with StubArkServer(latency=args.latency, embedding_latency=args.latency) as server:
+        os.environ.update({
+            "ARK_API_KEY": "stub-key",
+            "ARK_MODEL_ID": "stub-model",
+            "ARK_EMBEDDING_MODEL_ID": "stub-embedding",
+            "ARK_BASE_URL": server.base_url,
+            # 关闭 Embedding 缓存与限流，只测量本基准关注的部分
+            "EMBEDDING_CACHE_MAX_ENTRIES": "0",
+            "EMBEDDING_RATE_LIMIT": "0",
+        })
+        from financial_agent.core.llm_adapter import VolcanoLLM
+        from financial_agent.tools.knowledge_base_tool import KnowledgeBaseTool
+
+        llm = VolcanoLLM()
+        kb_tool = KnowledgeBaseTool(llm=llm)
+        baseline_threads = client_threads()
+
+        server.stats.reset()
+        with ThreadCounter() as sync_threads:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+                sync_results = list(pool.map(lambda i: sync_session(kb_tool, llm, i), range(args.sessions)))
+            sync_time = time.perf_counter() - started
+        sync_stats = server.stats.snapshot()
+
+        async def run_async():
+            return await asyncio.gather(*(async_session(kb_tool, llm, i) for i in range(args.sessions)))
+
+        server.stats.reset()
+        with ThreadCounter() as async_threads:
+            started = time.perf_counter()
+            async_results = asyncio.run(run_async())
+            async_time = time.perf_counter() - started
+        async_stats = server.stats.snapshot()
+
+    assert len(async_results) == len(sync_results) == args.sessions and all(async_results)
+    serial_estimate = args.sessions * 3 * args.latency
+    print(f"{args.sessions} 个并发会话，每个会话 3 次上游请求（Embedding + LLM + 流式 LLM），单次延迟 {args.latency}s，串行约需 {serial_estimate:.1f}s")
+    print(f"同步（每会话一个线程）：{sync_time:.2f}s，线程峰值 {sync_threads.peak}（基线 {baseline_threads}），"
+          f"上游请求 {sync_stats['chat_calls'] + sync_stats['embedding_calls']}，TCP 连接 {sync_stats['connections']}")
+    print(f"异步（单事件循环）：{async_time:.2f}s，线程峰值 {async_threads.peak}（基线 {baseline_threads}），"
+          f"上游请求 {async_stats['chat_calls'] + async_stats['embedding_calls']}，TCP 连接 {async_stats['connections']}")
+
+
+if __name__ == "__main__":
+    main()
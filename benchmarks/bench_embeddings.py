@@ -0,0 +1,53 @@
+"""
+Embedding 缓存与分批并发基准：在本地桩服务上比较
+单次整批请求（旧实现）、分批并发（冷缓存）、重复嵌入（热缓存）三种情况的耗时与请求数，并输出指标。
+
+运行：python -m benchmarks.bench_embeddings --texts 2000 --latency 0.1
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from .stub_ark import StubArkServer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Embedding 缓存与分批并发基准")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.1, help="桩服务每次请求的固定延迟（秒）")
+    parser.add_argument("--per-text", type=float, default=0.001, help="桩服务每条文本额外的处理时间（秒）")
+    args = parser.parse_args()
+
+    server = StubArkServer(embedding_latency=args.latency, embedding_latency_per_text=args.per_text, embedding_dim=64)
+    with tempfile.TemporaryDirectory() as tmp, server:
+        os.environ.update({
+            "ARK_API_KEY": "stub-key",
+            "ARK_EMBEDDING_MODEL_ID": "stub-embedding",
+            "ARK_BASE_URL": server.base_url,
+            "EMBEDDING_CACHE_PATH": os.path.join(tmp, "embeddings.sqlite3"),
+        })
+        from financial_agent.core.llm_adapter import VolcanoEmbeddings
+
+        texts = [f"基准文本 {i}：金融术语释义。" * 4 for i in range(args.texts)]
+        embeddings = VolcanoEmbeddings()
+
+        server.stats.reset()
+        started = time.perf_counter()
+        embeddings.client.embeddings.create(model=embeddings.model, input=texts)
+        rows = [("单次整批请求（旧实现）", time.perf_counter() - started, server.stats.snapshot())]
+        for name in ("分批并发（冷缓存）", "重复嵌入（热缓存）"):
+            server.stats.reset()
+            started = time.perf_counter()
+            embeddings.embed_documents(texts)
+            rows.append((name, time.perf_counter() - started, server.stats.snapshot()))
+
+    print(f"{args.texts} 条文本，批大小 {embeddings.batch_size}，并发 {embeddings.max_concurrency}，"
+          f"限流 {embeddings.rate_limiter.rate:g} 次/秒")
+    for name, elapsed, stats in rows:
+        print(f"{name}：{elapsed * 1000:.0f} ms，请求 {stats['embedding_calls']} 次")
+    print(f"指标：{embeddings.metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+向量索引类型基准：在合成语料（高斯聚类向量，模拟主题聚集的研报/公告文本块）上比较
+Flat（精确检索，作为基线）、IVF-Flat、IVF-PQ、HNSW 的
+
+- 构建耗时（含在样本上训练）与索引内存占用（序列化大小）；
+- 不同 nprobe / efSearch 下相对 Flat 的 recall@k 与逐条查询的 QPS；
+- 以内存映射方式从磁盘载入的耗时。
+
+索引均由 core/vector_index.build_index 按 KB_INDEX_* 的默认参数构建（规模门槛 min_vectors 除外）。
+
+运行：python -m benchmarks.bench_faiss_index --sizes 20000 100000 --dim 128
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from financial_agent.core.vector_index import (
+    IndexConfig, build_index, factory_string, index_bytes, search,
+)
+
+SWEEPS = {"ivf_flat": ("nprobe", (1, 4, 16, 64)), "ivf_pq": ("nprobe", (1, 4, 16, 64)),
+          "hnsw": ("ef_search", (16, 64, 256))}
+
+
+def synthetic_corpus(n: int, dim: int, queries: int, seed: int = 0):
+    """n 个向量分布在 √n 个高斯簇中；查询取自同一分布（语料点加噪声）。向量单位化，与 Embedding 一致。"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, int(np.sqrt(n))), dim)).astype(np.float32)
+    corpus = centers[rng.integers(len(centers), size=n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    picks = corpus[rng.integers(n, size=queries)]
+    probes = picks + 0.3 * rng.standard_normal((queries, dim)).astype(np.float32)
+    for matrix in (corpus, probes):
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return corpus, probes
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int, **params) -> tuple:
+    """逐条查询（与线上每次检索一条一致），返回 (recall@k, QPS)。"""
+    found = np.empty((len(queries), k), dtype=np.int64)
+    started = time.perf_counter()
+    for i in range(len(queries)):
+        found[i] = search(index, queries[i:i + 1], k, **params)[1][0]
+    elapsed = time.perf_counter() - started
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    return float(recall), len(queries) / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="向量索引类型基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--train-sample", type=int, default=50000, help="IVF / PQ 训练的样本数")
+    args = parser.parse_args()
+
+    print(f"维度 {args.dim}，{args.queries} 条查询逐条检索，recall@{args.k} 以 Flat 为准，"
+          f"faiss 线程数 {faiss.omp_get_max_threads()}")
+    print(f"{'规模':>7} {'索引':<18} {'构建(s)':>8} {'内存(MB)':>9} {'mmap 载入(ms)':>13} {'参数':<14} "
+          f"{'recall':>7} {'QPS':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            corpus, queries = synthetic_corpus(n, args.dim, args.queries)
+            for kind in ("flat", "ivf_flat", "ivf_pq", "hnsw"):
+                config = IndexConfig(kind=kind, min_vectors=0, train_sample=args.train_sample)
+                spec = factory_string(config, n, args.dim)
+                started = time.perf_counter()
+                index = build_index(corpus, spec, config)
+                built = time.perf_counter() - started
+
+                path = os.path.join(tmp, f"{kind}.faiss")
+                faiss.write_index(index, path)
+                started = time.perf_counter()
+                mapped = faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+                loaded = time.perf_counter() - started
+                del mapped
+
+                head = f"{n:>7} {spec:<18} {built:>8.2f} {index_bytes(index) / 2 ** 20:>9.1f} {loaded * 1000:>13.1f}"
+                if kind == "flat":
+                    truth = search(index, queries, args.k)[1]
+                    recall, qps = measure(index, queries, truth, args.k)
+                    print(f"{head} {'-':<14} {recall:>7.3f} {qps:>8.0f}")
+                    continue
+                name, values = SWEEPS[kind]
+                for value in values:
+                    recall, qps = measure(index, queries, truth, args.k, **{name: value})
+                    print(f"{head} {f'{name}={value}':<14} {recall:>7.3f} {qps:>8.0f}")
+                    head = " " * len(head)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+聊天历史侧边栏基准：生成大量旧格式历史文件（纯消息列表 与 {title, messages} 各半），比较
+旧实现每次渲染时扫描目录并解析全部文件，与 SQLite 元数据索引分页查询的耗时；同时给出一次性迁移的耗时。
+另测不同会话长度下保存一条新消息的耗时：旧实现整体重写 JSON，与追加写入消息日志。
+
+运行：python -m benchmarks.bench_history --sessions 10000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from webapp.history_store import HistoryStore
+
+PRICE_TABLE = "\n".join(
+    ["| 日期 | 开盘 | 最高 | 最低 | 收盘 | 成交量 |", "|---|---|---|---|---|---|"]
+    + [f"| 2024-03-{d:02d} | 1700.00 | 1720.50 | 1690.10 | 1712.30 | 3200000 |" for d in range(1, 21)]
+)
+
+
+def write_legacy(root: str, sessions: int, turns: int) -> None:
+    start = datetime(2024, 1, 1)
+    for i in range(sessions):
+        session_id = (start + timedelta(minutes=i)).strftime("%Y-%m-%d_%H-%M-%S")
+        messages = []
+        for t in range(turns):
+            messages.append({"role": "user", "content": f"600519 第 {t} 个问题：最近一个月的日K线？"})
+            messages.append({"role": "assistant", "content": f"以下是查询结果：\n{PRICE_TABLE}"})
+        payload = messages if i % 2 else {"title": f"会话 {i}", "messages": messages}
+        with open(os.path.join(root, f"{session_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=4)
+
+
+def legacy_render(root: str) -> int:
+    """旧侧边栏的做法：列目录并完整解析每个文件，只为读取标题。"""
+    labels = []
+    for filename in sorted(os.listdir(root), reverse=True):
+        with open(os.path.join(root, filename), "r", encoding="utf-8") as f:
+            parsed = json.load(f)
+        labels.append(parsed.get("title") if isinstance(parsed, dict) else None)
+    return len(labels)
+
+
+def save_latency(root: str, lengths, samples: int = 20) -> None:
+    """会话已有 n 条消息时，再保存一条消息的平均耗时。"""
+    message = {"role": "assistant", "content": f"以下是查询结果：\n{PRICE_TABLE}"}
+    store = HistoryStore(os.path.join(root, "append"), compact_every=10 ** 9)
+    print(f"{'已有消息数':>10} {'整体重写(ms)':>14} {'追加日志(ms)':>14}")
+    for n in lengths:
+        messages = [message] * n
+        path = os.path.join(root, f"rewrite_{n}.json")
+
+        def rewrite():
+            messages.append(message)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"title": None, "messages": messages}, f, ensure_ascii=False, indent=4)
+
+        store.save(f"s{n}", messages)
+        rewrite_ms = timed(rewrite, repeat=samples) * 1000
+        append_ms = timed(lambda: store.append(f"s{n}", message), repeat=samples) * 1000
+        print(f"{n:>10} {rewrite_ms:>14.2f} {append_ms:>14.2f}")
+    store.close()
+
+
+def timed(func, repeat: int = 1) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="聊天历史侧边栏基准")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=3, help="每个会话的问答轮数")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 1000], help="保存耗时测试的会话长度")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_legacy(root, args.sessions, args.turns)
+        size_mb = sum(os.path.getsize(os.path.join(root, name)) for name in os.listdir(root)) / 1e6
+        print(f"会话数 {args.sessions}，历史文件共 {size_mb:.1f} MB")
+
+        legacy = timed(lambda: legacy_render(root))
+        started = time.perf_counter()
+        store = HistoryStore(root)
+        migrate = time.perf_counter() - started
+        assert store.count() == args.sessions
+        store.close()
+
+        store = HistoryStore(root)
+        last_page = (args.sessions - 1) // args.page_size * args.page_size
+        first = timed(lambda: (store.count(), store.list_sessions(args.page_size, 0)), repeat=50)
+        last = timed(lambda: (store.count(), store.list_sessions(args.page_size, last_page)), repeat=50)
+        reopen = timed(lambda: HistoryStore(root).close(), repeat=10)
+
+        print(f"{'操作':<24} {'耗时(ms)':>10}")
+        for name, seconds in [
+            ("旧实现：扫描并解析全部文件", legacy),
+            ("一次性迁移", migrate),
+            ("打开已迁移的索引", reopen),
+            ("索引分页：第一页", first),
+            ("索引分页：最后一页", last),
+        ]:
+            print(f"{name:<24} {seconds * 1000:>10.2f}")
+        print(f"每次渲染加速 {legacy / first:.0f}x")
+
+    with tempfile.TemporaryDirectory() as root:
+        print()
+        save_latency(root, args.lengths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+技术指标引擎微基准：向量化批量内核 vs 逐行 pandas 循环的朴素实现。
+
+运行：python -m benchmarks.bench_indicators --symbols 20 --days 500
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from financial_agent.data.indicators import compute_indicators
+
+
+def synthetic_frames(symbols: int, days: int, seed: int = 0) -> dict:
+    """随机游走生成的 OHLCV，长度各不相同以覆盖尾部对齐逻辑。"""
+    rng = np.random.default_rng(seed)
+    frames = {}
+    for i in range(symbols):
+        n = days - int(rng.integers(0, days // 4))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+        spread = np.abs(rng.normal(0, 0.01, n)) * close
+        frames[f"S{i:03d}"] = pd.DataFrame(
+            {"Open": close, "High": close + spread, "Low": close - spread, "Close": close, "Volume": 1e6},
+            index=pd.bdate_range("2020-01-01", periods=n),
+        )
+    return frames
+
+
+def naive_indicators(df: pd.DataFrame) -> pd.DataFrame:
+    """朴素基线：逐行 iloc 取值、逐日递推，与引擎使用相同的公式与参数。"""
+    rows = []
+    ema12 = ema26 = dea = k = d = gain6 = loss6 = atr14 = None
+    for i in range(len(df)):
+        row = {}
+        close = df["Close"].iloc[i]
+        window20 = df["Close"].iloc[max(0, i - 19):i + 1]
+        row["MA20"] = window20.mean() if i >= 19 else np.nan
+        row["BOLL_UP"] = window20.mean() + 2 * window20.std(ddof=0) if i >= 19 else np.nan
+        ema12 = close if ema12 is None else (2 / 13) * close + (11 / 13) * ema12
+        ema26 = close if ema26 is None else (2 / 27) * close + (25 / 27) * ema26
+        dif = ema12 - ema26
+        dea = dif if dea is None else (2 / 10) * dif + (8 / 10) * dea
+        row["MACD"] = 2 * (dif - dea)
+        if i >= 8:
+            low9 = df["Low"].iloc[i - 8:i + 1].min()
+            high9 = df["High"].iloc[i - 8:i + 1].max()
+            rsv = (close - low9) / (high9 - low9) * 100 if high9 > low9 else 50.0
+            k = (rsv + 2 * (50.0 if k is None else k)) / 3
+            d = (k + 2 * (50.0 if d is None else d)) / 3
+            row["K"], row["D"] = k, d
+        else:
+            row["K"] = row["D"] = np.nan
+        if i >= 1:
+            prev = df["Close"].iloc[i - 1]
+            change = close - prev
+            gain6 = max(change, 0) if gain6 is None else (max(change, 0) + 5 * gain6) / 6
+            loss6 = abs(change) if loss6 is None else (abs(change) + 5 * loss6) / 6
+            row["RSI6"] = gain6 / loss6 * 100 if loss6 > 0 else 50.0
+            high, low = df["High"].iloc[i], df["Low"].iloc[i]
+            tr = max(high - low, abs(high - prev), abs(low - prev))
+        else:
+            row["RSI6"] = np.nan
+            tr = df["High"].iloc[i] - df["Low"].iloc[i]
+        atr14 = tr if atr14 is None else tr / 14 + atr14 * 13 / 14
+        row["ATR14"] = atr14
+        rows.append(row)
+    return pd.DataFrame(rows, index=df.index)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="技术指标引擎微基准")
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--days", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frames = synthetic_frames(args.symbols, args.days)
+    indicators = ["MA", "MACD", "KDJ", "RSI", "BOLL", "ATR"]
+
+    engine_times = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        fast = compute_indicators(frames, indicators)
+        engine_times.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    slow = {s: naive_indicators(df) for s, df in frames.items()}
+    naive_time = time.perf_counter() - started
+
+    # 校验两种实现结果一致
+    max_diff = 0.0
+    for symbol, expected in slow.items():
+        for column in expected.columns:
+            diff = np.nanmax(np.abs(fast[symbol][column].to_numpy() - expected[column].to_numpy()))
+            max_diff = max(max_diff, float(diff))
+
+    engine_best = min(engine_times)
+    print(f"标的数 {args.symbols}，每只约 {args.days} 个交易日，指标 {', '.join(indicators)}")
+    print(f"向量化引擎：{engine_best * 1000:.1f} ms（{args.repeat} 次取最优）")
+    print(f"朴素逐行循环：{naive_time * 1000:.1f} ms")
+    print(f"加速比：{naive_time / engine_best:.1f}x，最大绝对误差 {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
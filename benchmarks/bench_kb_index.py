@@ -0,0 +1,73 @@
+"""
+知识库索引启动基准：在本地桩服务上对不同规模的合成知识库，比较首次建库、未变化时重启、修改一行后重启
+三种情况下的耗时与 Embedding 调用量。
+
+运行：python -m benchmarks.bench_kb_index --sizes 100 1000 5000
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_community.document_loaders import CSVLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .stub_ark import StubArkServer
+
+
+def write_kb(path: Path, rows: int, edited: int | None = None) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["term", "definition"])
+        for i in range(rows):
+            suffix = "（已修订）" if i == edited else ""
+            writer.writerow([f"术语 {i}", f"术语 {i} 的释义，用于基准测试的合成文本。{suffix}" * 5])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="知识库索引启动基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--latency", type=float, default=0.05, help="桩服务每次 Embedding 请求的延迟（秒）")
+    args = parser.parse_args()
+
+    with StubArkServer(embedding_latency=args.latency, embedding_dim=256) as server, tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "ARK_API_KEY": "stub-key",
+            "ARK_EMBEDDING_MODEL_ID": "stub-embedding",
+            "ARK_BASE_URL": server.base_url,
+            # 关闭 Embedding 缓存与限流，只测量本基准关注的部分
+            "EMBEDDING_CACHE_MAX_ENTRIES": "0",
+            "EMBEDDING_RATE_LIMIT": "0",
+        })
+        from financial_agent.core.kb_index import KnowledgeBaseIndex
+        from financial_agent.core.llm_adapter import VolcanoEmbeddings
+
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        print(f"{'行数':>6} {'场景':<10} {'耗时(ms)':>9} {'Embedding 请求':>14} {'嵌入文本数':>10}")
+        for size in args.sizes:
+            kb_path = Path(tmp) / f"kb_{size}.csv"
+            index_dir = Path(tmp) / f"index_{size}"
+
+            def load_documents():
+                return splitter.split_documents(CSVLoader(file_path=str(kb_path), encoding="utf-8").load())
+
+            scenarios = [("首次建库", None), ("未变化重启", None), ("修改一行", size // 2)]
+            write_kb(kb_path, size)
+            for name, edited in scenarios:
+                if edited is not None:
+                    write_kb(kb_path, size, edited=edited)
+                server.stats.reset()
+                started = time.perf_counter()
+                index = KnowledgeBaseIndex(VolcanoEmbeddings(), index_dir=index_dir)
+                store = index.load_or_build(kb_path, load_documents)
+                elapsed = time.perf_counter() - started
+                stats = server.stats.snapshot()
+                assert len(store.index_to_docstore_id) == size
+                print(f"{size:>6} {name:<10} {elapsed * 1000:>9.1f} {stats['embedding_calls']:>14} {stats['embedded_texts']:>10}"
+                      f"{'  (mmap)' if index.stats['mmap'] else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+知识库检索基准：在本地桩服务（Embedding 有固定延迟）上用随包的知识库建索引，对一组典型查询比较
+原有的纯向量检索（每次查询都远程嵌入查询向量再做 FAISS top-3）与混合检索（术语/别名与 BM25 本地命中，
+仅模糊查询走向量检索并做 RRF 融合）的 Embedding 请求数与检索耗时。
+
+桩服务的向量只是文本哈希，没有语义，因此这里只比较调用量与耗时；混合检索各路径的命中情况单独列出。
+
+运行：python -m benchmarks.bench_kb_retrieval --latency 0.05 --repeat 20
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from .stub_ark import StubArkServer
+
+# (查询, 期望命中的术语；None 表示知识库中没有明确对应的条目)
+QUERIES = [
+    ("市盈率", "市盈率"),
+    ("什么是P/E", "市盈率"),
+    ("PE ratio 高说明什么", "市盈率"),
+    ("股息率怎么计算", "股息率"),
+    ("dividend yield", "股息率"),
+    ("KDJ", "KDJ指标"),
+    ("MA 金叉和死叉", "移动平均线"),
+    ("资产负债率多少算健康", "资产负债率"),
+    ("随机指标", "KDJ指标"),
+    ("公司总负债占总资产比例", "资产负债率"),
+    ("如何判断股票贵不贵", None),
+    ("解释 MACD", None),
+    ("MACD 和 MA 的区别", "移动平均线"),
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="知识库检索基准")
+    parser.add_argument("--latency", type=float, default=0.05, help="桩服务每次 Embedding 请求的延迟（秒）")
+    parser.add_argument("--repeat", type=int, default=20, help="每个查询的重复次数")
+    args = parser.parse_args()
+
+    with StubArkServer(embedding_latency=args.latency) as server, tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "ARK_API_KEY": "stub-key",
+            "ARK_EMBEDDING_MODEL_ID": "stub-embedding",
+            "ARK_BASE_URL": server.base_url,
+            "KB_INDEX_DIR": os.path.join(tmp, "kb_index"),
+            # 关闭 Embedding 缓存与限流，每次查询的嵌入都真实发出
+            "EMBEDDING_CACHE_MAX_ENTRIES": "0",
+            "EMBEDDING_RATE_LIMIT": "0",
+        })
+        from financial_agent.core.hybrid_retriever import HybridRetriever
+        from financial_agent.tools.knowledge_base_tool import KnowledgeBaseTool
+
+        os.environ["KB_HYBRID"] = "0"
+        vectorstore_retriever = KnowledgeBaseTool(llm=None).retriever
+        hybrid = HybridRetriever.from_vectorstore(vectorstore_retriever.vectorstore, k=3)
+
+        print(f"Embedding 延迟 {args.latency}s，{len(QUERIES)} 个查询各重复 {args.repeat} 次")
+        print(f"{'':<10} {'Embedding 请求':>14} {'平均(ms)':>9} {'p95(ms)':>8}")
+        for name, retriever in (("纯向量", vectorstore_retriever), ("混合检索", hybrid)):
+            server.stats.reset()
+            timings = []
+            for _ in range(args.repeat):
+                for query, _ in QUERIES:
+                    started = time.perf_counter()
+                    retriever.get_relevant_documents(query)
+                    timings.append(time.perf_counter() - started)
+            calls = server.stats.snapshot()["embedding_calls"]
+            print(f"{name:<10} {calls:>14} {np.mean(timings) * 1000:>9.2f} {np.percentile(timings, 95) * 1000:>8.2f}")
+
+        print("混合检索各查询的路径与第一名：")
+        for query, expected in QUERIES:
+            before = dict(hybrid.stats)
+            docs = hybrid.get_relevant_documents(query)
+            route = next(key for key, value in hybrid.stats.items() if value != before[key])
+            top = docs[0].page_content.split("\n", 1)[0].removeprefix("term: ") if docs else "-"
+            mark = "" if expected is None else (" ✓" if top.startswith(expected) else " ✗")
+            print(f"  {query:<24} {route:<8} {top}{mark}")
+
+
+if __name__ == "__main__":
+    main()
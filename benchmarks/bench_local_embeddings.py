@@ -0,0 +1,93 @@
+"""
+Embedding 后端基准：比较远程方舟 Embedding（默认为本地桩服务，--live 时使用 .env 中配置的真实接口）
+与本地哈希 n-gram 嵌入（EMBEDDING_BACKEND=local）的
+
+- 吞吐：整批嵌入合成文本的耗时与每秒文本数；
+- 延迟：单条查询嵌入的 p50 / p95；
+- 检索质量：以随包知识库为语料，bench_kb_retrieval 中有期望答案的查询按余弦相似度检索的 top-1 准确率与 MRR。
+
+桩服务的向量本身就是字符 n-gram 哈希，只反映字面相似度；远程一行的检索质量只有在 --live 下才代表真实模型。
+
+运行：python -m benchmarks.bench_local_embeddings --texts 2000 --latency 0.1
+"""
+import argparse
+import os
+import tempfile
+import time
+from contextlib import ExitStack
+
+import numpy as np
+
+from .bench_kb_retrieval import QUERIES
+from .stub_ark import StubArkServer
+
+
+def evaluate(embeddings, documents: list) -> tuple:
+    """返回 (top-1 准确率, MRR)。"""
+    matrix = np.asarray(embeddings.embed_documents(documents), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    labelled = [(query, expected) for query, expected in QUERIES if expected is not None]
+    hits, reciprocal = 0, 0.0
+    for query, expected in labelled:
+        vector = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+        order = np.argsort(-(matrix @ vector))
+        rank = next(r for r, i in enumerate(order, start=1) if documents[i].startswith(f"term: {expected}"))
+        hits += rank == 1
+        reciprocal += 1.0 / rank
+    return hits / len(labelled), reciprocal / len(labelled)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Embedding 后端基准")
+    parser.add_argument("--texts", type=int, default=2000, help="吞吐测试的文本条数")
+    parser.add_argument("--queries", type=int, default=50, help="延迟测试的查询次数")
+    parser.add_argument("--latency", type=float, default=0.1, help="桩服务每次 Embedding 请求的延迟（秒）")
+    parser.add_argument("--per-text", type=float, default=0.001, help="桩服务每条文本额外的处理时间（秒）")
+    parser.add_argument("--live", action="store_true", help="远程一行使用 .env 中配置的真实方舟接口")
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        tmp = stack.enter_context(tempfile.TemporaryDirectory())
+        # 关闭 Embedding 缓存，每次都真实计算或请求
+        os.environ.update({"EMBEDDING_CACHE_MAX_ENTRIES": "0", "EMBEDDING_CACHE_PATH": os.path.join(tmp, "e.sqlite3")})
+        if args.live:
+            from dotenv import load_dotenv
+            load_dotenv()
+        else:
+            server = stack.enter_context(StubArkServer(
+                embedding_latency=args.latency, embedding_latency_per_text=args.per_text, embedding_dim=256,
+            ))
+            os.environ.update({
+                "ARK_API_KEY": "stub-key",
+                "ARK_EMBEDDING_MODEL_ID": "stub-embedding",
+                "ARK_BASE_URL": server.base_url,
+            })
+        from langchain_community.document_loaders import CSVLoader
+
+        from financial_agent.core.embeddings import create_embeddings
+        from financial_agent.tools.knowledge_base_tool import KB_PATH
+
+        documents = [d.page_content for d in CSVLoader(file_path=str(KB_PATH), encoding="utf-8").load()]
+        texts = [f"基准文本 {i}：市盈率、股息率与移动平均线等金融术语的释义。" * 4 for i in range(args.texts)]
+        queries = [f"什么是市盈率 {i}" for i in range(args.queries)]
+
+        print(f"{args.texts} 条文本整批嵌入，{args.queries} 次单条查询；"
+              f"远程为{'真实方舟接口' if args.live else f'桩服务（延迟 {args.latency}s + {args.per_text}s/条）'}")
+        print(f"{'后端':<8} {'整批(ms)':>9} {'文本/秒':>9} {'查询 p50(ms)':>12} {'p95(ms)':>8} {'top-1':>6} {'MRR':>6}")
+        for backend in ("ark", "local"):
+            embeddings = create_embeddings(backend)
+            started = time.perf_counter()
+            embeddings.embed_documents(texts)
+            batch = time.perf_counter() - started
+            timings = []
+            for query in queries:
+                started = time.perf_counter()
+                embeddings.embed_query(query)
+                timings.append(time.perf_counter() - started)
+            accuracy, mrr = evaluate(embeddings, documents)
+            print(f"{backend:<8} {batch * 1000:>9.0f} {len(texts) / batch:>9.0f} {np.median(timings) * 1000:>12.2f} "
+                  f"{np.percentile(timings, 95) * 1000:>8.2f} {accuracy:>6.2f} {mrr:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+对话记忆基准：模拟一段多轮行情问答（每个回答附带完整日K表格），逐轮比较直接传入全部历史与
+ConversationMemory（最近几轮原文 + 滚动摘要 + 表格引用）送入智能体的 prompt token 数（估算）。
+摘要使用本地桩服务上的模型，延迟可调，用于确认后台摘要不阻塞每轮的组装。
+
+运行：python -m benchmarks.bench_memory --turns 30
+"""
+import argparse
+import os
+import time
+
+from .stub_ark import StubArkServer
+
+SYMBOLS = ["600519", "000858", "AAPL", "MSFT", "0700.HK"]
+
+
+def answer(turn: int) -> str:
+    symbol = SYMBOLS[turn % len(SYMBOLS)]
+    rows = "\n".join(f"| 2024-03-{d:02d} | 1700.00 | 1720.50 | 1690.10 | 1712.30 | 3200000 |" for d in range(1, 23))
+    return (
+        f"已获取 {symbol} 的日K线数据（数据句柄 {symbol}@2024-03-01~2024-03-31）：\n"
+        "| 日期 | 开盘 | 最高 | 最低 | 收盘 | 成交量 |\n|---|---|---|---|---|---|\n"
+        f"{rows}\n区间内整体震荡上行，涨幅约 {turn % 7 + 1}.2%。"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="对话记忆基准")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--summary-latency", type=float, default=0.5, help="桩服务摘要请求的延迟（秒）")
+    args = parser.parse_args()
+
+    with StubArkServer(latency=args.summary_latency, responder=lambda prompt: "用户先后查询了多只标的的三月日K线。") as server:
+        os.environ.update({
+            "ARK_API_KEY": "stub-key",
+            "ARK_MODEL_ID": "stub-model",
+            "ARK_BASE_URL": server.base_url,
+        })
+        from financial_agent.core.memory import ConversationMemory, memory_metrics
+        from financial_agent.core.tokens import estimate_tokens
+
+        memory = ConversationMemory()
+        messages = []
+        print(f"{'轮次':>4} {'完整历史':>10} {'记忆窗口':>10} {'组装(ms)':>9} {'已摘要消息':>10}")
+        for turn in range(1, args.turns + 1):
+            prompt = f"{SYMBOLS[turn % len(SYMBOLS)]} 三月的走势如何？"
+            started = time.perf_counter()
+            memory.build(messages, prompt)
+            elapsed = time.perf_counter() - started
+            stats = memory.last_stats
+            print(f"{turn:>4} {stats['full_tokens']:>10} {stats['prompt_tokens']:>10} {elapsed * 1000:>9.2f}"
+                  f" {stats['summarized_messages']:>10}")
+            messages += [{"role": "user", "content": prompt}, {"role": "assistant", "content": answer(turn)}]
+            # 模拟智能体回答所需的时间，摘要在此期间于后台完成
+            time.sleep(args.summary_latency / 2)
+
+        memory.wait()
+        total_full = sum(estimate_tokens(m["content"]) for m in messages)
+        snapshot = memory_metrics.snapshot()
+        print(f"\n第 {args.turns} 轮后完整历史约 {total_full} tokens；记忆窗口 p50 {snapshot['prompt_tokens_p50']:.0f}、"
+              f"p95 {snapshot['prompt_tokens_p95']:.0f}；摘要 {snapshot['summaries']} 次，失败 {snapshot['summary_failures']} 次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+并发工具调用基准：在本地桩服务（LLM / Embedding）与行情夹具数据源上，对需要多个互不依赖的工具调用的问题，
+比较原有执行器（每个 LLM 回合一个动作，工具依次执行）与并发模式（一个回合给出动作列表，工具在线程池中并发执行）
+的端到端耗时与智能体 LLM 回合数。
+
+桩模型按脚本给出工具动作：原有模式逐个给出，并发模式第一回合以列表一次给出，因此差异只来自回合数与工具的并发执行。
+
+运行：python -m benchmarks.bench_parallel_tools --latency 0.3 --data-latency 0.3
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from .harness import FixtureProvider
+from .stub_ark import StubArkServer
+
+START, END = "2024-03-01", "2024-05-31"
+
+# (问题, 该问题需要的工具调用)
+QUESTIONS = [
+    ("AAPL 最近三个月的走势如何，顺便解释一下市盈率", [
+        ("Financial Data Retrieval", {"symbol": "AAPL", "start_date": START, "end_date": END}),
+        ("Financial Knowledge Base", "市盈率"),
+    ]),
+    ("对比 600519 和 000858 近三个月的走势，并计算 600519 的 MACD", [
+        ("Batch Financial Data Retrieval", {"symbols": ["600519.SH", "000858.SZ"], "start_date": START,
+                                            "end_date": END}),
+        ("Technical Indicators", {"symbols": ["600519.SH"], "start_date": START, "end_date": END,
+                                  "indicators": ["MACD"]}),
+    ]),
+    ("解释一下 KDJ、RSI 和布林带指标", [
+        ("Financial Knowledge Base", "KDJ"),
+        ("Financial Knowledge Base", "RSI"),
+        ("Financial Knowledge Base", "布林带"),
+    ]),
+]
+
+
+def scripted_responder(answer: str, turns: list):
+    """智能体每个回合的脚本：并发模式的提示中含动作列表说明时一次给出全部动作，否则按已有的 Observation 数逐个给出。"""
+    plans = dict(QUESTIONS)
+
+    def respond(prompt: str) -> str:
+        if "Respond to the human" not in prompt[:100]:
+            return answer
+        turns.append(1)
+        question, _, scratchpad = prompt.rsplit("用户的请求是：", 1)[-1].partition("\n")
+        plan = plans[question.strip()]
+        observed = scratchpad.count("Observation:")
+        if "json list of independent tool actions" in prompt:
+            blob = ([{"action": tool, "action_input": arg} for tool, arg in plan] if not observed
+                    else {"action": "Final Answer", "action_input": answer})
+        elif observed < len(plan):
+            tool, arg = plan[observed]
+            blob = {"action": tool, "action_input": arg}
+        else:
+            blob = {"action": "Final Answer", "action_input": answer}
+        return f"Action:\n```\n{json.dumps(blob, ensure_ascii=False, indent=2)}\n```"
+
+    return respond
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="并发工具调用基准")
+    parser.add_argument("--latency", type=float, default=0.3, help="桩服务每次 LLM 调用的延迟（秒）")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="桩服务 Embedding 请求延迟（秒）")
+    parser.add_argument("--data-latency", type=float, default=0.3, help="夹具数据源每次取数的延迟（秒）")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    turns: list = []
+    answer = "根据数据，区间内整体震荡上行。"
+    with StubArkServer(responder=scripted_responder(answer, turns), latency=args.latency,
+                       embedding_latency=args.embedding_latency) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "ARK_API_KEY": "stub-key",
+            "ARK_MODEL_ID": "stub-model",
+            "ARK_EMBEDDING_MODEL_ID": "stub-embedding",
+            "ARK_BASE_URL": server.base_url,
+            "KB_INDEX_DIR": os.path.join(tmp, "kb_index"),
+            "PRICE_CACHE_DIR": os.path.join(tmp, "prices"),
+            "EMBEDDING_CACHE_MAX_ENTRIES": "0",
+            "EMBEDDING_RATE_LIMIT": "0",
+            "RESPONSE_CACHE": "0",
+        })
+        from financial_agent.core.agent import create_financial_agent
+        from financial_agent.core.llm_adapter import VolcanoLLM
+        from financial_agent.data.price_cache import PriceCache
+        from financial_agent.data.scheduler import ProviderScheduler
+
+        agents = {}
+        for name, parallel in (("逐个执行", False), ("并发执行", True)):
+            agent = create_financial_agent(VolcanoLLM(streaming=True), lazy=False, parallel=parallel,
+                                           scheduler=ProviderScheduler([FixtureProvider(args.data_latency)]))
+            agent.verbose = False
+            agents[name] = agent
+
+        print(f"LLM 延迟 {args.latency}s，Embedding 延迟 {args.embedding_latency}s，取数延迟 {args.data_latency}s，"
+              f"每题重复 {args.repeat} 次（取中位数）")
+        print(f"{'问题':<34} {'逐个(s)':>8} {'回合':>4} {'并发(s)':>8} {'回合':>4} {'加速':>6}")
+        totals = [0.0, 0.0]
+        for question, _ in QUESTIONS:
+            inputs = {"input": f"当前日期是 2024-06-01。用户的请求是：{question}", "chat_history": []}
+            row = []
+            for name, agent in agents.items():
+                timings = []
+                for _ in range(args.repeat):
+                    # 每次都从数据源取数，不让本地行情缓存掩盖取数耗时
+                    for tool in agent.tools:
+                        if isinstance(getattr(tool, "price_cache", None), PriceCache):
+                            tool.price_cache.clear()
+                    turns.clear()
+                    started = time.perf_counter()
+                    result = agent.invoke(inputs)
+                    timings.append(time.perf_counter() - started)
+                    assert result["output"] == answer, result
+                row.append((float(np.median(timings)), len(turns)))
+            (serial_s, serial_turns), (parallel_s, parallel_turns) = row
+            totals[0] += serial_s
+            totals[1] += parallel_s
+            print(f"{question:<34} {serial_s:>8.2f} {serial_turns:>4} {parallel_s:>8.2f} {parallel_turns:>4} "
+                  f"{serial_s / parallel_s:>5.1f}x")
+        print(f"合计：逐个执行 {totals[0]:.2f}s，并发执行 {totals[1]:.2f}s（线程数 {threading.active_count()}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+回答缓存基准：在本地桩服务上模拟一批重复度较高的提问（同一问题的不同说法，按 Zipf 分布抽取），
+比较无缓存时每题都走一遍智能体（若干次 LLM 调用）与经过 ResponseCache 的耗时、命中率与误命中数，
+并验证只用了知识库工具的回答按静态内容的 TTL 缓存、用了取数工具的按行情 TTL 缓存、只差日期区间的问题不会语义命中，
+以及知识库指纹变化后缓存失效。
+
+桩服务的 Embedding 是字符 n-gram 哈希向量，只有字面相近的说法才相似，因此默认阈值比线上低。
+
+运行：python -m benchmarks.bench_response_cache --questions 200
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from .stub_ark import StubArkServer
+
+# 规范问题 -> 不同说法
+QUESTIONS = {
+    "市盈率": ["什么是市盈率", "什么是市盈率？", "请问什么是市盈率", "市盈率是什么"],
+    "市净率": ["什么是市净率", "请问什么是市净率？", "市净率是什么"],
+    "KDJ": ["解释一下KDJ指标", "解释一下 KDJ 指标", "请解释一下KDJ指标"],
+    "MACD": ["MACD指标是什么", "MACD 指标是什么？", "请问MACD指标是什么"],
+    "ROE": ["什么是净资产收益率", "净资产收益率是什么", "什么是净资产收益率(ROE)"],
+    "茅台": ["600519 最近的走势如何", "600519最近的走势如何？"],
+    "苹果": ["AAPL 最近一个月的行情", "AAPL最近一个月的行情"],
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="回答缓存基准")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--llm-calls", type=int, default=3, help="智能体每题调用 LLM 的次数")
+    parser.add_argument("--latency", type=float, default=0.05, help="桩服务每次 LLM 调用的延迟（秒）")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    canon = list(QUESTIONS)
+    weights = 1.0 / np.arange(1, len(canon) + 1)
+    picks = rng.choice(len(canon), size=args.questions, p=weights / weights.sum())
+    workload = [(canon[i], QUESTIONS[canon[i]][rng.integers(len(QUESTIONS[canon[i]]))]) for i in picks]
+
+    with StubArkServer(latency=args.latency, embedding_dim=256) as server, tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "ARK_API_KEY": "stub-key",
+            "ARK_MODEL_ID": "stub-model",
+            "ARK_EMBEDDING_MODEL_ID": "stub-embedding",
+            "ARK_BASE_URL": server.base_url,
+            "EMBEDDING_CACHE_PATH": os.path.join(tmp, "embeddings.sqlite3"),
+            "EMBEDDING_RATE_LIMIT": "0",
+        })
+        from financial_agent.core.llm_adapter import VolcanoEmbeddings, VolcanoLLM
+        from financial_agent.core.response_cache import ResponseCache, is_time_sensitive, normalize_question
+        from financial_agent.tools.knowledge_base_tool import KB_TOOL_NAME
+
+        llm = VolcanoLLM()
+
+        def run_agent(canonical: str, question: str) -> str:
+            for _ in range(args.llm_calls):
+                llm.invoke(question)
+            return f"关于{canonical}的回答"
+
+        kb = {"fingerprint": "kb-v1"}
+        cache = ResponseCache(VolcanoEmbeddings(), kb_fingerprint=lambda: kb["fingerprint"],
+                              path=os.path.join(tmp, "responses.sqlite3"), threshold=args.threshold)
+
+        started = time.perf_counter()
+        for canonical, question in workload:
+            run_agent(canonical, question)
+        baseline = time.perf_counter() - started
+
+        server.stats.reset()
+        hit_latencies, wrong = [], 0
+        started = time.perf_counter()
+        for canonical, question in workload:
+            t0 = time.perf_counter()
+            hit = cache.lookup(question)
+            if hit is None:
+                answer = run_agent(canonical, question)
+                cache.store(question, answer, is_time_sensitive(question))
+                continue
+            hit_latencies.append(time.perf_counter() - t0)
+            if hit.answer != f"关于{canonical}的回答":
+                wrong += 1
+        cached = time.perf_counter() - started
+        stats = cache.metrics.snapshot()
+        calls = server.stats.snapshot()
+
+        print(f"提问 {args.questions} 个（{len(canon)} 个不同问题），每题 LLM 调用 {args.llm_calls} 次，阈值 {args.threshold}")
+        print(f"{'':<10} {'总耗时(s)':>10} {'LLM 调用':>10}")
+        print(f"{'无缓存':<10} {baseline:>10.2f} {args.questions * args.llm_calls:>10}")
+        print(f"{'回答缓存':<10} {cached:>10.2f} {calls['chat_calls']:>10}")
+        print(f"命中率 {stats['hit_rate']:.1%}（精确 {stats['exact_hits']}，语义 {stats['semantic_hits']}，"
+              f"未命中 {stats['misses']}），误命中 {wrong}")
+        if hit_latencies:
+            print(f"命中时耗时 p50 {np.percentile(hit_latencies, 50) * 1000:.2f} ms，"
+                  f"p95 {np.percentile(hit_latencies, 95) * 1000:.2f} ms")
+
+        # 与界面写入缓存时的判断一致：只调用过知识库工具的回答用静态 TTL，调用过取数工具的用行情 TTL
+        for question, tools_used, expected_ttl in (
+            ("什么是股息率", [KB_TOOL_NAME], cache.static_ttl),
+            ("贵州茅台的股息率", [KB_TOOL_NAME, "Financial Data Retrieval"], cache.quote_ttl),
+        ):
+            cache.store(question, "回答", is_time_sensitive(question, tools_used, static_tools={KB_TOOL_NAME}))
+            with sqlite3.connect(cache.path) as conn:
+                (ttl,) = conn.execute("SELECT expires - created FROM responses WHERE question = ?",
+                                      (normalize_question(question),)).fetchone()
+            assert abs(ttl - expected_ttl) < 1, (question, ttl, expected_ttl)
+            print(f"{question}（工具：{'、'.join(tools_used)}）缓存 TTL {ttl:.0f}s")
+
+        # 只差日期区间的问题向量几乎相同，但答案不同，不能语义命中
+        cache.store("AAPL 从 2024-01-01 到 2024-03-31 的日K线", "一季度行情", True)
+        assert cache.lookup("AAPL 从 2024-02-01 到 2024-03-31 的日K线") is None
+        print("只差日期区间的问题未命中")
+
+        kb["fingerprint"] = "kb-v2"
+        assert cache.lookup(workload[0][1]) is None
+        print(f"知识库指纹变化后失效 {cache.metrics.snapshot()['invalidated']} 条")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+快速路由基准：在本地桩服务（LLM / Embedding）与行情夹具数据源（benchmarks/harness.py）上，对行情、多标的对比、技术指标、
+名词解释四类问题，比较完整结构化聊天智能体与 FastPathRouter 的端到端耗时和 LLM 调用次数。
+
+智能体路径中，桩模型按问题给出与路由规则相同的工具参数（相当于一次完美的 JSON 动作），
+因此差异只来自调用次数与解析开销，是快速路由收益的下限。
+
+运行：python -m benchmarks.bench_router --latency 0.3
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+
+from .harness import FixtureProvider, agent_responder
+from .stub_ark import StubArkServer
+
+QUESTIONS = [
+    ("行情", "查询 AAPL 最近一个月的股价"),
+    ("行情", "600519 从 2024-01-01 到 2024-03-31 的日K线"),
+    ("对比", "对比 600519 和 000858 近三个月的走势"),
+    ("指标", "600519 的 MACD 和 KDJ"),
+    ("名词", "什么是市盈率？"),
+    ("名词", "解释一下KDJ指标"),
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="快速路由基准")
+    parser.add_argument("--latency", type=float, default=0.3, help="桩服务每次 LLM 调用的延迟（秒）")
+    parser.add_argument("--data-latency", type=float, default=0.05, help="夹具数据源每次取数的延迟（秒）")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    holder = {}
+    with StubArkServer(responder=agent_responder(holder, "根据数据，区间内整体震荡上行。"),
+                       latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "ARK_API_KEY": "stub-key",
+            "ARK_MODEL_ID": "stub-model",
+            "ARK_EMBEDDING_MODEL_ID": "stub-embedding",
+            "ARK_BASE_URL": server.base_url,
+            "KB_INDEX_DIR": os.path.join(tmp, "kb_index"),
+            "PRICE_CACHE_DIR": os.path.join(tmp, "prices"),
+            "EMBEDDING_CACHE_MAX_ENTRIES": "0",
+            "EMBEDDING_RATE_LIMIT": "0",
+        })
+        from financial_agent.core.agent import create_financial_agent
+        from financial_agent.core.llm_adapter import VolcanoLLM
+        from financial_agent.core.router import FastPathRouter
+        from financial_agent.data.scheduler import ProviderScheduler
+
+        llm = VolcanoLLM()
+        scheduler = ProviderScheduler([FixtureProvider(args.data_latency)], mode="serial")
+        agent = create_financial_agent(llm, lazy=False, scheduler=scheduler)
+        agent.verbose = False
+        router = holder["router"] = FastPathRouter.from_tools(agent.tools, llm)
+        today = date.today().isoformat()
+
+        print(f"LLM 延迟 {args.latency}s，取数延迟 {args.data_latency}s，每题重复 {args.repeat} 次（取中位数）")
+        print(f"{'类型':<4} {'问题':<32} {'智能体(s)':>9} {'调用':>4} {'路由(s)':>8} {'调用':>4} {'加速':>6}")
+        totals = [0.0, 0.0]
+        for kind, question in QUESTIONS:
+            enhanced = f"当前日期是 {today}。用户的请求是：{question}"
+            results = []
+            for run in (lambda: agent.invoke({"input": enhanced, "chat_history": []}), lambda: router.run(enhanced)):
+                timings = []
+                for _ in range(args.repeat):
+                    server.stats.reset()
+                    started = time.perf_counter()
+                    assert run() is not None
+                    timings.append(time.perf_counter() - started)
+                results.append((float(np.median(timings)), server.stats.chat_calls))
+            (agent_s, agent_calls), (router_s, router_calls) = results
+            totals[0] += agent_s
+            totals[1] += router_s
+            print(f"{kind:<4} {question:<32} {agent_s:>9.2f} {agent_calls:>4} {router_s:>8.2f} {router_calls:>4}"
+                  f" {agent_s / router_s:>5.1f}x")
+        print(f"合计：智能体 {totals[0]:.2f}s，快速路由 {totals[1]:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+服务层基准：本地方舟桩服务 + 行情夹具数据源上，模拟多个浏览器会话同时提问。
+
+1. 突发：U 个用户同时各问一题，比较每个会话各开一个线程直连（原先的做法，不限上游并发）与
+   AgentServer（固定工作线程 + 方舟并发上限）的端到端耗时、首字耗时、桩服务同时在处理的请求峰值与拒绝数。
+   桩服务按“超过容量后每多一个并发请求，每次调用多等 penalty 秒”模拟上游过载变慢。
+2. 公平性：一个用户连续提交大量问题后，其他用户各问一题；比较单一 FIFO 队列与按用户轮转时其他用户的耗时。
+
+运行：python -m benchmarks.bench_serving --users 24 --workers 8
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from .harness import FixtureProvider, agent_responder
+from .stub_ark import StubArkServer
+
+QUESTIONS = [
+    "查询 AAPL 最近一个月的股价",
+    "对比 600519 和 000858 近三个月的走势",
+    "600519 的 MACD 和 KDJ",
+    "帮我分析一下最近的市场情绪",
+]
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    return float(np.percentile(values, q)) if values else None
+
+
+def _fmt(seconds: Optional[float]) -> str:
+    return "-" if seconds is None else f"{seconds:.2f}"
+
+
+def _consume(events) -> tuple:
+    """消费一个事件流，返回 (首个可见 token 耗时, 完整回答耗时)。"""
+    started = time.perf_counter()
+    ttft = None
+    for event in events:
+        if ttft is None and event.kind in ("token", "output") and event.data:
+            ttft = time.perf_counter() - started
+    return ttft, time.perf_counter() - started
+
+
+def _burst(make_events: Callable[[str, dict], object], users: int, today: str) -> dict:
+    """users 个会话同时各问一题。"""
+    from financial_agent.core.serving import ServerBusy
+
+    results, rejected, errors = [], [0], [0]
+    lock = threading.Lock()
+    barrier = threading.Barrier(users)
+
+    def user(i: int) -> None:
+        inputs = {"input": f"当前日期是 {today}。用户的请求是：{QUESTIONS[i % len(QUESTIONS)]}", "chat_history": []}
+        barrier.wait()
+        try:
+            result = _consume(make_events(f"user-{i}", inputs))
+        except ServerBusy:
+            with lock:
+                rejected[0] += 1
+            return
+        except Exception:
+            with lock:
+                errors[0] += 1
+            return
+        with lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    totals = [total for _, total in results]
+    ttfts = [ttft for ttft, _ in results if ttft is not None]
+    return {
+        "wall": time.perf_counter() - started,
+        "p50": _percentile(totals, 50), "p95": _percentile(totals, 95), "ttft_p50": _percentile(ttfts, 50),
+        "rejected": rejected[0], "errors": errors[0],
+    }
+
+
+def _fairness(server_factory, heavy_jobs: int, light_users: int, fifo: bool, today: str) -> dict:
+    """一个用户先提交 heavy_jobs 个问题，随后 light_users 个用户各问一题；fifo 时所有请求进同一个队列。"""
+    server = server_factory()
+    latencies = {"heavy": [], "light": []}
+    lock = threading.Lock()
+
+    def ask(kind: str, user_id: str, question: str) -> None:
+        inputs = {"input": f"当前日期是 {today}。用户的请求是：{question}", "chat_history": []}
+        _, total = _consume(server.stream("shared" if fifo else user_id, inputs, metrics=None))
+        with lock:
+            latencies[kind].append(total)
+
+    threads = [threading.Thread(target=ask, args=("heavy", "heavy", QUESTIONS[i % len(QUESTIONS)]))
+               for i in range(heavy_jobs)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    light = [threading.Thread(target=ask, args=("light", f"light-{i}", QUESTIONS[0])) for i in range(light_users)]
+    for thread in light:
+        thread.start()
+    for thread in threads + light:
+        thread.join()
+    server.shutdown()
+    return {kind: (_percentile(values, 50), _percentile(values, 95)) for kind, values in latencies.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="服务层基准")
+    parser.add_argument("--users", type=int, default=24, help="突发阶段同时提问的会话数")
+    parser.add_argument("--workers", type=int, default=8, help="AgentServer 工作线程数")
+    parser.add_argument("--max-queue", type=int, default=32, help="AgentServer 排队上限")
+    parser.add_argument("--ark-limit", type=int, default=8, help="方舟并发上限（服务层场景）")
+    parser.add_argument("--latency", type=float, default=0.3, help="桩服务首个 token 前的延迟（秒）")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="桩服务相邻 token 的间隔（秒）")
+    parser.add_argument("--capacity", type=int, default=8, help="模拟上游的并发容量")
+    parser.add_argument("--penalty", type=float, default=0.1, help="超过容量后每多一个并发请求增加的延迟（秒）")
+    parser.add_argument("--data-latency", type=float, default=0.05, help="夹具数据源每次请求的延迟（秒）")
+    parser.add_argument("--heavy-jobs", type=int, default=12, help="公平性场景中重度用户连续提交的问题数")
+    parser.add_argument("--light-users", type=int, default=3, help="公平性场景中其他用户数")
+    args = parser.parse_args()
+
+    holder: dict = {}
+    answer = "根据数据，区间内整体震荡上行，成交量温和放大。" * 4
+    scripted = agent_responder(holder, answer)
+    stub_holder: dict = {}
+
+    def respond(prompt: str) -> str:
+        # 模拟上游过载：同时在处理的请求超过容量后，每多一个请求，每次调用多等 penalty 秒
+        excess = stub_holder["server"].stats.chat_in_flight - args.capacity
+        if excess > 0:
+            time.sleep(args.penalty * excess)
+        return scripted(prompt)
+
+    with StubArkServer(responder=respond, latency=args.latency, token_delay=args.token_delay) as stub, \
+            tempfile.TemporaryDirectory() as tmp:
+        stub_holder["server"] = stub
+        os.environ.update({
+            "ARK_API_KEY": "stub-key",
+            "ARK_MODEL_ID": "stub-model",
+            "ARK_EMBEDDING_MODEL_ID": "stub-embedding",
+            "ARK_BASE_URL": stub.base_url,
+            "KB_INDEX_DIR": os.path.join(tmp, "kb_index"),
+            "PRICE_CACHE_DIR": os.path.join(tmp, "prices"),
+            "EMBEDDING_CACHE_MAX_ENTRIES": "0",
+            "EMBEDDING_RATE_LIMIT": "0",
+        })
+        from financial_agent.core.agent import create_financial_agent
+        from financial_agent.core.llm_adapter import VolcanoLLM
+        from financial_agent.core.router import FastPathRouter
+        from financial_agent.core.serving import AgentServer
+        from financial_agent.core.streaming import stream_agent_events
+        from financial_agent.core.upstream import set_upstream_limit
+        from financial_agent.data.scheduler import ProviderScheduler
+
+        llm = VolcanoLLM(streaming=True)
+        agent = create_financial_agent(llm, lazy=False,
+                                       scheduler=ProviderScheduler([FixtureProvider(args.data_latency)]))
+        agent.verbose = False
+        holder["router"] = FastPathRouter.from_tools(agent.tools, llm)
+        today = date.today().isoformat()
+
+        print(f"LLM 延迟 {args.latency}s，上游容量 {args.capacity}（超出后每个并发 +{args.penalty}s），"
+              f"取数延迟 {args.data_latency}s")
+        print(f"== 突发：{args.users} 个会话同时提问 ==")
+        print(f"{'':<22} {'p50(s)':>7} {'p95(s)':>7} {'TTFT p50':>9} {'总耗时':>7} {'上游峰值':>8} {'拒绝':>5} {'错误':>5}")
+
+        set_upstream_limit("ark", 0)
+        stub.stats.reset()
+        row = _burst(lambda user_id, inputs: stream_agent_events(agent, inputs, metrics=None), args.users, today)
+        rows = [("每会话一线程（不限）", row, stub.stats.chat_peak_in_flight)]
+
+        set_upstream_limit("ark", args.ark_limit)
+        server = AgentServer(agent, workers=args.workers, max_queue=args.max_queue, max_per_user=2)
+        stub.stats.reset()
+        row = _burst(lambda user_id, inputs: server.stream(user_id, inputs, metrics=None), args.users, today)
+        rows.append((f"AgentServer（{args.workers} 线程）", row, stub.stats.chat_peak_in_flight))
+        serving = server.snapshot()
+        server.shutdown()
+
+        for name, row, peak in rows:
+            print(f"{name:<22} {_fmt(row['p50']):>7} {_fmt(row['p95']):>7} {_fmt(row['ttft_p50']):>9} "
+                  f"{row['wall']:>7.2f} {peak:>8} {row['rejected']:>5} {row['errors']:>5}")
+        print(f"AgentServer 排队耗时 p50 {_fmt(serving['queue_wait_p50'])}s · p95 {_fmt(serving['queue_wait_p95'])}s")
+
+        print(f"== 公平性：1 个用户连续提交 {args.heavy_jobs} 题，随后 {args.light_users} 个用户各问一题 ==")
+        print(f"{'':<12} {'重度用户 p50':>12} {'其他用户 p50':>12} {'其他用户 p95':>12}")
+
+        def factory():
+            return AgentServer(agent, workers=args.workers, max_queue=args.heavy_jobs + args.light_users,
+                               max_per_user=args.heavy_jobs + args.light_users)
+
+        for name, fifo in (("单一 FIFO", True), ("按用户轮转", False)):
+            result = _fairness(factory, args.heavy_jobs, args.light_users, fifo, today)
+            print(f"{name:<12} {_fmt(result['heavy'][0]):>12} {_fmt(result['light'][0]):>12} "
+                  f"{_fmt(result['light'][1]):>12}")
+
+
+if __name__ == "__main__":
+    main()
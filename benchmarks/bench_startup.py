@@ -0,0 +1,130 @@
+"""
+启动耗时基准：
+1. 导入耗时：以 `python -X importtime` 统计导入 financial_agent 各入口模块的累计耗时与最重的依赖；
+2. 冷启动：在全新子进程中对接本地桩服务，测量 create_financial_agent 返回（可回答行情问题）
+   与知识库索引就绪的时间，比较 lazy 与 eager 两种初始化模式、以及索引是否已落盘。
+
+运行：python -m benchmarks.bench_startup
+保存基线：python -m benchmarks.bench_startup --save startup_baseline.json
+回归检查：python -m benchmarks.bench_startup --compare startup_baseline.json --tolerance 0.2（超出容差时退出码为 1）
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+IMPORT_TARGETS = ["financial_agent.core.agent", "financial_agent.core.llm_adapter", "financial_agent.tools.financial_data_tool"]
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+WORKER = r"""
+import json, os, sys, time
+started = time.perf_counter()
+from benchmarks.stub_ark import StubArkServer
+server = StubArkServer(embedding_latency=float(sys.argv[2])).start()
+os.environ["ARK_BASE_URL"] = server.base_url
+t0 = time.perf_counter()
+from financial_agent.core.agent import create_financial_agent
+from financial_agent.core.llm_adapter import VolcanoLLM
+imported = time.perf_counter()
+agent = create_financial_agent(VolcanoLLM(), lazy=sys.argv[1] == "lazy")
+created = time.perf_counter()
+kb_tool = next(t for t in agent.tools if hasattr(t, "ready"))
+kb_tool.ready.wait()
+ready = time.perf_counter()
+server.stop()
+print(json.dumps({"import": imported - t0, "agent_ready": created - t0, "kb_ready": ready - t0,
+                  "embedding_calls": server.stats.embedding_calls}))
+"""
+
+
+def import_times(module: str, top: int) -> dict:
+    """子进程中导入 module，返回累计耗时（秒）与按顶层包汇总自身耗时最大的若干个依赖。"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    total, packages = 0.0, {}
+    for self_us, cumulative_us, _, name in IMPORTTIME_RE.findall(proc.stderr):
+        if name == module:
+            total = int(cumulative_us) / 1e6
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1e6
+    deps = sorted(((seconds, name) for name, seconds in packages.items()), reverse=True)
+    return {"total": total, "top": deps[:top]}
+
+
+def cold_start(mode: str, warm_index: bool, embedding_latency: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "ARK_API_KEY": "stub-key",
+            "ARK_MODEL_ID": "stub-model",
+            "ARK_EMBEDDING_MODEL_ID": "stub-embedding",
+            "KB_INDEX_DIR": os.path.join(tmp, "kb_index"),
+            "EMBEDDING_CACHE_MAX_ENTRIES": "0",
+            "PRICE_CACHE_DIR": os.path.join(tmp, "prices"),
+        }
+        runs = 2 if warm_index else 1
+        for _ in range(runs):
+            proc = subprocess.run(
+                [sys.executable, "-c", WORKER, mode, str(embedding_latency)],
+                cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+            )
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for key, value in results.items():
+        old = baseline.get(key)
+        if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old > 0 and value > old * (1 + tolerance):
+            regressions.append(f"{key}: {old:.3f} -> {value:.3f}（+{(value / old - 1) * 100:.0f}%）")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="启动耗时基准")
+    parser.add_argument("--top", type=int, default=8, help="展示的最重依赖个数")
+    parser.add_argument("--embedding-latency", type=float, default=0.3, help="桩服务 Embedding 延迟（秒），模拟远程接口")
+    parser.add_argument("--save", help="将结果保存为基线 JSON")
+    parser.add_argument("--compare", help="与基线 JSON 比较")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对退化比例")
+    args = parser.parse_args()
+
+    flat = {}
+    print("== 导入耗时（python -X importtime）==")
+    for module in IMPORT_TARGETS:
+        info = import_times(module, args.top)
+        flat[f"import:{module}"] = info["total"]
+        print(f"{module}: {info['total'] * 1000:.0f} ms")
+        for seconds, name in info["top"]:
+            print(f"    {seconds * 1000:7.0f} ms  {name}")
+
+    print("== 冷启动（全新子进程，对接本地桩服务）==")
+    for mode in ("eager", "lazy"):
+        for warm in (False, True):
+            label = f"{mode}/{'索引已落盘' if warm else '无索引'}"
+            result = cold_start(mode, warm, args.embedding_latency)
+            for key in ("import", "agent_ready", "kb_ready"):
+                flat[f"start:{mode}:{'warm' if warm else 'cold'}:{key}"] = result[key]
+            print(f"{label}: 导入 {result['import'] * 1000:.0f} ms，智能体可用 {result['agent_ready'] * 1000:.0f} ms，"
+                  f"知识库就绪 {result['kb_ready'] * 1000:.0f} ms，Embedding 请求 {result['embedding_calls']} 次")
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(flat, indent=2), encoding="utf-8")
+        print(f"基线已保存到 {args.save}")
+    if args.compare:
+        regressions = compare(flat, json.loads(Path(args.compare).read_text(encoding="utf-8")), args.tolerance)
+        if regressions:
+            print("发现退化：\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"与基线 {args.compare} 相比无超过 {args.tolerance:.0%} 的退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+最终回答流式输出基准：桩服务逐 token 返回结构化聊天智能体的 Final Answer JSON，
+比较原先只在智能体结束后拿到整段 output 与按 token 解析 action_input 后的首个可见 token 耗时（TTFT）。
+
+运行：python -m benchmarks.bench_streaming --answer-chars 400 --token-delay 0.01
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from .stub_ark import StubArkServer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="最终回答流式输出基准")
+    parser.add_argument("--answer-chars", type=int, default=400, help="最终回答的字数")
+    parser.add_argument("--latency", type=float, default=0.3, help="桩服务首个 token 前的延迟（秒）")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="相邻 token 的间隔（秒）")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    answer = ("贵州茅台近一个月整体震荡上行，成交量温和放大。\n" * args.answer_chars)[:args.answer_chars]
+
+    def respond(prompt: str) -> str:
+        if "Respond to the human" not in prompt[:100]:
+            return "ok"
+        blob = json.dumps({"action": "Final Answer", "action_input": answer}, ensure_ascii=False, indent=2)
+        return f"Action:\n```\n{blob}\n```"
+
+    with StubArkServer(responder=respond, latency=args.latency, token_delay=args.token_delay) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "ARK_API_KEY": "stub-key",
+            "ARK_MODEL_ID": "stub-model",
+            "ARK_EMBEDDING_MODEL_ID": "stub-embedding",
+            "ARK_BASE_URL": server.base_url,
+            "KB_INDEX_DIR": os.path.join(tmp, "kb_index"),
+            "EMBEDDING_CACHE_MAX_ENTRIES": "0",
+            "EMBEDDING_RATE_LIMIT": "0",
+        })
+        from financial_agent.core.agent import create_financial_agent
+        from financial_agent.core.llm_adapter import VolcanoLLM
+        from financial_agent.core.streaming import StreamingMetrics, stream_agent_events
+
+        agent = create_financial_agent(VolcanoLLM(streaming=True), lazy=False)
+        agent.verbose = False
+        inputs = {"input": "当前日期是 2024-06-01。用户的请求是：总结一下茅台近期的表现", "chat_history": []}
+
+        def whole_output():
+            started = time.perf_counter()
+            for chunk in agent.stream(inputs):
+                if chunk.get("output"):
+                    return time.perf_counter() - started, chunk["output"]
+
+        def token_stream():
+            started, ttft, text = time.perf_counter(), None, ""
+            for event in stream_agent_events(agent, inputs, metrics=StreamingMetrics()):
+                if event.kind == "token":
+                    ttft = ttft if ttft is not None else time.perf_counter() - started
+                    text += event.data
+                elif event.kind == "output":
+                    assert text == event.data, "流式拼接的文本与最终 output 不一致"
+            return ttft, text
+
+        rows = []
+        for name, run in (("整段输出", whole_output), ("逐 token", token_stream)):
+            ttfts, totals = [], []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ttft, text = run()
+                totals.append(time.perf_counter() - started)
+                ttfts.append(ttft)
+                assert text == answer
+            rows.append((name, float(np.median(ttfts)), float(np.median(totals))))
+
+        print(f"回答 {args.answer_chars} 字，首 token 前延迟 {args.latency}s，token 间隔 {args.token_delay}s")
+        print(f"{'':<10} {'TTFT(s)':>8} {'完整回答(s)':>12}")
+        for name, ttft, total in rows:
+            print(f"{name:<10} {ttft:>8.2f} {total:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
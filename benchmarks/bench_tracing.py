@@ -0,0 +1,61 @@
+"""
+追踪开销基准：单个 span 的开销（关闭 / 只记直方图 / 全量导出 JSONL），
+以及在本地桩服务上逐 token 流式调用 LLM 时，关闭与开启追踪的每次调用耗时。
+
+运行：python -m benchmarks.bench_tracing --spans 100000 --calls 50
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from .stub_ark import StubArkServer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="追踪开销基准")
+    parser.add_argument("--spans", type=int, default=100_000)
+    parser.add_argument("--calls", type=int, default=50, help="每种配置下的流式 LLM 调用次数")
+    parser.add_argument("--answer-chars", type=int, default=600)
+    args = parser.parse_args()
+
+    from financial_agent.core.tracing import JsonlExporter, Tracer, set_tracer
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configs = [
+            ("关闭", lambda: Tracer(enabled=False)),
+            ("只记指标", lambda: Tracer(sample_rate=0.0)),
+            ("采样 10% 导出", lambda: Tracer(sample_rate=0.1, exporters=[JsonlExporter(os.path.join(tmp, "a.jsonl"))])),
+            ("全量导出", lambda: Tracer(sample_rate=1.0, exporters=[JsonlExporter(os.path.join(tmp, "b.jsonl"))])),
+        ]
+        print(f"单个 span（{args.spans} 次，含 set 两个属性）：")
+        for name, make in configs:
+            tracer = make()
+            started = time.perf_counter()
+            for _ in range(args.spans):
+                span = tracer.start_span("llm.call", "stub-model")
+                span.set(prompt_tokens=100, completion_tokens=20)
+                span.end()
+            print(f"  {name:<12} {(time.perf_counter() - started) / args.spans * 1e6:>8.2f} µs")
+
+        answer = "贵州茅台近一个月整体震荡上行。" * (args.answer_chars // 15)
+        with StubArkServer(responder=lambda prompt: answer) as server:
+            os.environ.update({"ARK_API_KEY": "stub-key", "ARK_MODEL_ID": "stub-model", "ARK_BASE_URL": server.base_url})
+            from financial_agent.core.llm_adapter import VolcanoLLM
+
+            llm = VolcanoLLM(streaming=True)
+            print(f"流式 LLM 调用（回答 {len(answer)} 字，{args.calls} 次，取中位数）：")
+            for name, make in configs:
+                set_tracer(make())
+                timings = []
+                for _ in range(args.calls):
+                    started = time.perf_counter()
+                    assert "".join(llm.stream("总结一下茅台近期的表现")) == answer
+                    timings.append(time.perf_counter() - started)
+                print(f"  {name:<12} {np.median(timings) * 1000:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+上游限流与重试基准：进程内模拟一个有配额（超出返回 429）且会整体故障（返回 503）的上游，
+多个线程同时调用，比较三种调用方式：
+
+- 直接失败：调用一次，出错即返回（原有的做法）；
+- 立即重试：出错后马上重试，最多 3 次（没有退避与预算）；
+- upstream 层：core/upstream.call_upstream（按配额平滑发出请求、带抖动的指数退避、重试预算与熔断）。
+
+场景一“配额”报告成功率、实际发往上游的请求数与 429 次数；场景二“故障”报告故障期间发往上游的请求数
+与恢复后首个成功请求的延迟。
+
+运行：python -m benchmarks.bench_upstream --quota 20 --users 8
+"""
+import argparse
+import threading
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from financial_agent.core.upstream import (
+    CircuitBreaker, RetryBudget, UpstreamGuard, call_upstream, set_upstream_guard,
+)
+
+
+class Throttled(Exception):
+    status_code = 429
+
+
+class Down(Exception):
+    status_code = 503
+
+
+class SimulatedUpstream:
+    """每秒最多 quota 个请求（允许 quota 个突发，超出返回 429）；[down_from, down_until) 内全部返回 503。"""
+
+    def __init__(self, quota: float, latency: float):
+        self.quota = quota
+        self.latency = latency
+        self.down_from = self.down_until = 0.0
+        self._tokens = quota
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.during_outage = 0
+        self.first_success_after_outage = None
+
+    def call(self) -> str:
+        with self._lock:
+            now = time.monotonic()
+            self.requests += 1
+            if self.down_from <= now < self.down_until:
+                self.during_outage += 1
+                raise Down("503 service unavailable")
+            self._tokens = min(self.quota, self._tokens + (now - self._updated) * self.quota)
+            self._updated = now
+            if self._tokens < 1:
+                self.throttled += 1
+                raise Throttled("429 too many requests")
+            self._tokens -= 1
+            if self.down_until and now >= self.down_until and self.first_success_after_outage is None:
+                self.first_success_after_outage = now - self.down_until
+        time.sleep(self.latency)
+        return "ok"
+
+
+def direct(fn: Callable[[], str]) -> str:
+    return fn()
+
+
+def immediate_retry(fn: Callable[[], str]) -> str:
+    for attempt in range(3):
+        try:
+            return fn()
+        except Exception:
+            if attempt == 2:
+                raise
+
+
+def guarded(fn: Callable[[], str]) -> str:
+    return call_upstream("sim", fn)
+
+
+def _drive(strategy, upstream: SimulatedUpstream, users: int, calls: int, duration: float, think: float) -> dict:
+    """users 个线程各自调用 calls 次（duration>0 时改为持续 duration 秒），返回成功数与耗时分布。"""
+    latencies: List[float] = []
+    outcome = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration if duration else None
+
+    def user() -> None:
+        done = 0
+        while (stop_at is None and done < calls) or (stop_at is not None and time.monotonic() < stop_at):
+            done += 1
+            started = time.perf_counter()
+            try:
+                strategy(upstream.call)
+                ok = True
+            except Exception:
+                ok = False
+            with lock:
+                outcome["ok" if ok else "failed"] += 1
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+            time.sleep(think)
+
+    threads = [threading.Thread(target=user) for _ in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    outcome["wall"] = time.perf_counter() - started
+    outcome["p95"] = float(np.percentile(latencies, 95)) if latencies else None
+    return outcome
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="上游限流与重试基准")
+    parser.add_argument("--quota", type=float, default=20, help="模拟上游每秒允许的请求数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟上游每次请求的耗时（秒）")
+    parser.add_argument("--users", type=int, default=8, help="并发调用的线程数")
+    parser.add_argument("--calls", type=int, default=15, help="配额场景中每个线程的调用次数")
+    parser.add_argument("--outage", type=float, default=1.5, help="故障场景中上游故障的时长（秒）")
+    args = parser.parse_args()
+
+    strategies = (("直接失败", direct), ("立即重试", immediate_retry), ("upstream 层", guarded))
+
+    print(f"== 配额：上游 {args.quota:.0f} 次/秒，{args.users} 个线程各调用 {args.calls} 次 ==")
+    print(f"{'':<12} {'成功':>5} {'失败':>5} {'上游请求':>8} {'429':>5} {'p95(s)':>7} {'总耗时(s)':>9}")
+    for name, strategy in strategies:
+        set_upstream_guard("sim", UpstreamGuard(
+            # 模拟上游按秒限额，令牌桶只允许一秒的突发
+            "sim", rpm=args.quota * 60, tpm=0, burst=1.0, max_attempts=3, backoff_base=0.1, backoff_max=2.0,
+            breaker=CircuitBreaker(5, 1.0), budget=RetryBudget(0.2, 3),
+        ))
+        upstream = SimulatedUpstream(args.quota, args.latency)
+        result = _drive(strategy, upstream, args.users, args.calls, 0, 0.0)
+        p95 = "-" if result["p95"] is None else f"{result['p95']:.2f}"
+        print(f"{name:<12} {result['ok']:>5} {result['failed']:>5} {upstream.requests:>8} {upstream.throttled:>5} "
+              f"{p95:>7} {result['wall']:>9.2f}")
+
+    duration = args.outage + 1.5
+    print(f"== 故障：持续调用 {duration:.1f} 秒，其中第 0.5 秒起上游故障 {args.outage} 秒 ==")
+    print(f"{'':<12} {'成功':>5} {'失败':>5} {'故障期间请求':>12} {'恢复后首次成功(s)':>18}")
+    for name, strategy in strategies:
+        set_upstream_guard("sim", UpstreamGuard(
+            "sim", rpm=0, tpm=0, max_attempts=3, backoff_base=0.1, backoff_max=2.0,
+            breaker=CircuitBreaker(5, 0.5), budget=RetryBudget(0.2, 3),
+        ))
+        upstream = SimulatedUpstream(quota=1e6, latency=args.latency)
+        upstream.down_from = time.monotonic() + 0.5
+        upstream.down_until = upstream.down_from + args.outage
+        result = _drive(strategy, upstream, args.users, 0, duration, 0.02)
+        recovery = upstream.first_success_after_outage
+        print(f"{name:<12} {result['ok']:>5} {result['failed']:>5} {upstream.during_outage:>12} "
+              f"{'-' if recovery is None else f'{recovery:.2f}':>18}")
+    set_upstream_guard("sim", None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+离线端到端基准：create_financial_agent 对接本地方舟桩服务（脚本化回答、可配置延迟、流式与 Embedding）
+和行情夹具数据源，不访问火山方舟、Tushare 与 Yahoo。
+
+1. 单用户逐题：各类问题的端到端耗时、首个可见 token 耗时、LLM 调用次数与 token 数（桩服务统计）；
+2. 并发：N 个模拟用户同时提问，报告 p50/p95 耗时与吞吐量。
+
+结果可保存为 JSON，与其他提交的结果比较（超出容差时退出码为 1）：
+  python -m benchmarks.harness run --users 1,4,8 --save harness_baseline.json
+  python -m benchmarks.harness run --users 1,4,8 --compare harness_baseline.json --tolerance 0.2
+录制真实行情为夹具（需要联网，写入 benchmarks/fixtures/prices）：
+  python -m benchmarks.harness record AAPL 600519.SH 000858.SZ --start 2023-01-01 --end 2024-12-31
+没有录制文件的标的使用按代码确定的合成日K线，结果同样可复现。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from financial_agent.data.providers import MarketDataProvider
+
+from .stub_ark import StubArkServer
+
+ROOT = Path(__file__).resolve().parents[1]
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "prices"
+# 合成日K线覆盖的日期范围（取子区间，同一标的不同区间的数据一致）
+_SYNTHETIC_RANGE = ("2015-01-01", "2030-12-31")
+
+# (类型, 问题)：前四类可由规则直接推出工具参数，开放问题由模型直接回答
+WORKLOAD = [
+    ("行情", "查询 AAPL 最近一个月的股价"),
+    ("行情", "600519 从 2024-01-01 到 2024-03-31 的日K线"),
+    ("对比", "对比 600519 和 000858 近三个月的走势"),
+    ("指标", "600519 的 MACD 和 KDJ"),
+    ("名词", "什么是市盈率？"),
+    ("名词", "解释一下KDJ指标"),
+    ("开放", "为什么最近白酒板块整体走弱？"),
+]
+
+
+def _fixture_path(symbol: str) -> Path:
+    return FIXTURE_DIR / f"{symbol.upper().replace('/', '_')}.csv"
+
+
+class FixtureProvider(MarketDataProvider):
+    """
+    离线行情数据源：优先读取录制的夹具 CSV，没有时按代码生成确定性的随机游走日K线。
+    每次请求（含批量请求）固定耗时 latency 秒，模拟远程接口。
+    """
+    name = "Fixture"
+    prior_latency = 0.05
+
+    def __init__(self, latency: float = 0.05, fixture_dir: Optional[Path] = None):
+        self.latency = latency
+        self.fixture_dir = Path(fixture_dir or FIXTURE_DIR)
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._lock = threading.Lock()
+
+    def _frame(self, symbol: str) -> pd.DataFrame:
+        with self._lock:
+            df = self._frames.get(symbol)
+            if df is None:
+                path = self.fixture_dir / _fixture_path(symbol).name
+                if path.exists():
+                    df = pd.read_csv(path, index_col="Date", parse_dates=True)
+                else:
+                    df = synthetic_frame(symbol, *_SYNTHETIC_RANGE)
+                df = self._frames[symbol] = df
+            return df
+
+    def fetch(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame | None:
+        time.sleep(self.latency)
+        df = self._frame(symbol).loc[start_date:end_date]
+        return df.copy() if not df.empty else None
+
+    def fetch_many(self, symbols: List[str], start_date: str, end_date: str) -> Dict[str, pd.DataFrame]:
+        time.sleep(self.latency)
+        result = {}
+        for symbol in symbols:
+            df = self._frame(symbol).loc[start_date:end_date]
+            if not df.empty:
+                result[symbol] = df.copy()
+        return result
+
+
+def synthetic_frame(symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """按代码（crc32 作为随机种子，与进程无关）生成确定性的随机游走日K线。"""
+    index = pd.bdate_range(start_date, end_date, name="Date")
+    rng = np.random.default_rng(zlib.crc32(symbol.upper().encode("utf-8")))
+    close = 20 + 180 * rng.random() * np.exp(np.cumsum(rng.normal(0, 0.015, len(index))))
+    spread = np.abs(rng.normal(0, 0.01, len(index)))
+    return pd.DataFrame({
+        "Open": close * (1 + rng.normal(0, 0.005, len(index))),
+        "High": close * (1 + spread),
+        "Low": close * (1 - spread),
+        "Close": close,
+        "Volume": rng.integers(100_000, 5_000_000, len(index)),
+    }, index=index).round(2)
+
+
+def record_fixtures(symbols: List[str], start_date: str, end_date: str) -> None:
+    """用默认数据源（Tushare / yfinance / Stooq）取数并写入夹具目录。"""
+    from financial_agent.data.scheduler import ProviderScheduler
+
+    FIXTURE_DIR.mkdir(parents=True, exist_ok=True)
+    scheduler = ProviderScheduler()
+    for symbol in symbols:
+        df, source = scheduler.fetch(symbol, start_date, end_date)
+        if df is None:
+            print(f"{symbol}: 获取失败：{source}")
+            continue
+        df.to_csv(_fixture_path(symbol), index_label="Date")
+        print(f"{symbol}: {len(df)} 行（{source}）-> {_fixture_path(symbol)}")
+
+
+def agent_responder(router_holder: dict, answer: str):
+    """
+    桩模型的脚本：智能体第一步按路由规则给出工具动作（相当于一次完美的 JSON 动作），
+    拿到 Observation 后给出最终回答；规则无法识别的问题直接回答。其他调用（知识库、路由组织回答）返回 answer。
+    """
+    tool_inputs = {
+        "quote": lambda r: {"symbol": r.symbols[0], "start_date": r.start_date, "end_date": r.end_date},
+        "batch": lambda r: {"symbols": list(r.symbols), "start_date": r.start_date, "end_date": r.end_date},
+        "indicator": lambda r: {"symbols": list(r.symbols), "start_date": r.start_date, "end_date": r.end_date,
+                                "indicators": list(r.indicators)},
+        "glossary": lambda r: r.term,
+    }
+
+    def respond(prompt: str) -> str:
+        if "Respond to the human" not in prompt[:100]:
+            return answer
+        question = prompt.rsplit("用户的请求是：", 1)[-1]
+        router = router_holder["router"]
+        route = None if "Observation:" in question else router.match(question.split("\n", 1)[0])
+        if route is None:
+            blob = {"action": "Final Answer", "action_input": answer}
+        else:
+            blob = {"action": router.tool_name(route), "action_input": tool_inputs[route.kind](route)}
+        return f"Action:\n```\n{json.dumps(blob, ensure_ascii=False, indent=2)}\n```"
+
+    return respond
+
+
+def _ask(agent, router, question: str, today: str) -> tuple:
+    """回答一个问题，返回 (耗时, 首个可见 token 耗时)。router 不为 None 时先尝试快速路由（与界面一致）。"""
+    from financial_agent.core.streaming import stream_agent_events
+
+    enhanced = f"当前日期是 {today}。用户的请求是：{question}"
+    started = time.perf_counter()
+    ttft = None
+    route = router.match(question) if router is not None else None
+    if route is not None:
+        pieces = router.stream(route, enhanced)
+    else:
+        pieces = (e.data for e in stream_agent_events(agent, {"input": enhanced, "chat_history": []}, metrics=None)
+                  if e.kind == "token")
+    for piece in pieces:
+        if ttft is None and piece:
+            ttft = time.perf_counter() - started
+    return time.perf_counter() - started, ttft
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    values = [v for v in values if v is not None]
+    return float(np.percentile(values, q)) if values else None
+
+
+def _fmt(seconds: Optional[float]) -> str:
+    return "-" if seconds is None else f"{seconds:.2f}"
+
+
+def run_sequential(agent, router, server: StubArkServer, repeat: int, today: str) -> Dict[str, float]:
+    """单用户逐题执行；同一时刻只有一个请求，桩服务统计可按题归属。"""
+    per_kind: Dict[str, dict] = {}
+    for _ in range(repeat):
+        for kind, question in WORKLOAD:
+            server.stats.reset()
+            latency, ttft = _ask(agent, router, question, today)
+            stats = server.stats.snapshot()
+            row = per_kind.setdefault(kind, {"latency": [], "ttft": [], "llm_calls": [], "tokens": []})
+            row["latency"].append(latency)
+            row["ttft"].append(ttft)
+            row["llm_calls"].append(stats["chat_calls"])
+            row["tokens"].append(stats["prompt_tokens"] + stats["completion_tokens"])
+
+    flat = {}
+    print(f"{'类型':<4} {'p50(s)':>8} {'p95(s)':>8} {'TTFT(s)':>8} {'LLM 调用':>8} {'tokens':>8}")
+    for kind, row in per_kind.items():
+        metrics = {
+            "latency_p50": _percentile(row["latency"], 50),
+            "latency_p95": _percentile(row["latency"], 95),
+            "ttft_p50": _percentile(row["ttft"], 50),
+            "llm_calls": float(np.mean(row["llm_calls"])),
+            "tokens": float(np.mean(row["tokens"])),
+        }
+        flat.update({f"seq:{kind}:{k}": v for k, v in metrics.items() if v is not None})
+        print(f"{kind:<4} {_fmt(metrics['latency_p50']):>8} {_fmt(metrics['latency_p95']):>8} "
+              f"{_fmt(metrics['ttft_p50']):>8} {metrics['llm_calls']:>8.1f} {metrics['tokens']:>8.0f}")
+    return flat
+
+
+def run_concurrent(agent, router, users: int, rounds: int, seed: int, today: str) -> Dict[str, float]:
+    """users 个模拟用户同时开始，各自按不同的随机顺序把全部问题问 rounds 遍。"""
+    latencies: List[float] = []
+    ttfts: List[Optional[float]] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(users)
+
+    def user(index: int) -> None:
+        rng = np.random.default_rng(seed + index)
+        order = [WORKLOAD[i] for _ in range(rounds) for i in rng.permutation(len(WORKLOAD))]
+        barrier.wait()
+        for _, question in order:
+            try:
+                latency, ttft = _ask(agent, router, question, today)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{question}: {e}")
+                continue
+            with lock:
+                latencies.append(latency)
+                ttfts.append(ttft)
+
+    threads = [threading.Thread(target=user, args=(i,), name=f"sim-user-{i}") for i in range(users)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    metrics = {
+        "latency_p50": _percentile(latencies, 50),
+        "latency_p95": _percentile(latencies, 95),
+        "ttft_p50": _percentile(ttfts, 50),
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "errors": float(len(errors)),
+    }
+    print(f"{users:>4} {len(latencies):>6} {_fmt(metrics['latency_p50']):>8} {_fmt(metrics['latency_p95']):>8} "
+          f"{_fmt(metrics['ttft_p50']):>8} {metrics['throughput']:>10.2f} {len(errors):>6}")
+    for error in errors[:3]:
+        print(f"    {error}")
+    return {f"load:{users}:{k}": v for k, v in metrics.items() if v is not None}
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """吞吐量下降或其余指标（耗时、调用次数、token 数、错误数）上升超过容差即视为退化。"""
+    regressions = []
+    for key, value in results.items():
+        old = baseline.get(key)
+        if not isinstance(old, (int, float)):
+            continue
+        if key.endswith(":throughput"):
+            if old > 0 and value < old * (1 - tolerance):
+                regressions.append(f"{key}: {old:.3f} -> {value:.3f}（{(value / old - 1) * 100:.0f}%）")
+        elif value > old * (1 + tolerance) and value - old > 1e-9:
+            change = f"+{(value / old - 1) * 100:.0f}%" if old > 0 else f"+{value - old:.3f}"
+            regressions.append(f"{key}: {old:.3f} -> {value:.3f}（{change}）")
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(args: argparse.Namespace) -> None:
+    users = [int(u) for u in args.users.split(",") if u.strip()]
+    answer = ("根据数据，区间内整体震荡上行，成交量温和放大。" * (args.answer_chars // 20 + 1))[:args.answer_chars]
+    holder: dict = {}
+    with StubArkServer(responder=agent_responder(holder, answer), latency=args.latency,
+                       token_delay=args.token_delay, embedding_latency=args.embedding_latency) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "ARK_API_KEY": "stub-key",
+            "ARK_MODEL_ID": "stub-model",
+            "ARK_EMBEDDING_MODEL_ID": "stub-embedding",
+            "ARK_BASE_URL": server.base_url,
+            "KB_INDEX_DIR": os.path.join(tmp, "kb_index"),
+            "PRICE_CACHE_DIR": os.path.join(tmp, "prices"),
+            "EMBEDDING_CACHE_PATH": os.path.join(tmp, "embeddings.sqlite3"),
+            "EMBEDDING_RATE_LIMIT": "0",
+        })
+        from financial_agent.core.agent import create_financial_agent
+        from financial_agent.core.llm_adapter import VolcanoLLM
+        from financial_agent.core.router import FastPathRouter
+        from financial_agent.data.scheduler import ProviderScheduler
+
+        llm = VolcanoLLM(streaming=True)
+        agent = create_financial_agent(llm, lazy=False,
+                                       scheduler=ProviderScheduler([FixtureProvider(args.data_latency)]))
+        holder["router"] = FastPathRouter.from_tools(agent.tools, llm)
+        router = holder["router"] if args.router else None
+        today = args.today or date.today().isoformat()
+
+        print(f"LLM 延迟 {args.latency}s，token 间隔 {args.token_delay}s，取数延迟 {args.data_latency}s，"
+              f"快速路由{'开启' if router else '关闭'}，当前日期 {today}")
+        print("== 单用户逐题 ==")
+        flat = run_sequential(agent, router, server, args.repeat, today)
+        print("== 并发用户 ==")
+        print(f"{'用户':>4} {'问题数':>6} {'p50(s)':>8} {'p95(s)':>8} {'TTFT(s)':>8} {'吞吐(题/s)':>10} {'错误':>6}")
+        for n in users:
+            flat.update(run_concurrent(agent, router, n, args.rounds, args.seed, today))
+
+    if args.save:
+        meta = {"commit": _git_commit(), "python": sys.version.split()[0],
+                **{k: v for k, v in vars(args).items() if k not in ("save", "compare", "command")}}
+        Path(args.save).write_text(json.dumps({"meta": meta, "metrics": flat}, ensure_ascii=False, indent=2),
+                                   encoding="utf-8")
+        print(f"结果已保存到 {args.save}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(flat, baseline.get("metrics", baseline), args.tolerance)
+        if regressions:
+            print(f"与基线（提交 {baseline.get('meta', {}).get('commit')}）相比发现退化：\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"与基线 {args.compare} 相比无超过 {args.tolerance:.0%} 的退化")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="离线端到端基准")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="运行基准")
+    run_parser.add_argument("--users", default="1,4,8", help="逗号分隔的并发用户数")
+    run_parser.add_argument("--rounds", type=int, default=1, help="并发阶段每个用户把全部问题问几遍")
+    run_parser.add_argument("--repeat", type=int, default=3, help="单用户阶段每题重复次数")
+    run_parser.add_argument("--latency", type=float, default=0.3, help="桩服务首个 token 前的延迟（秒）")
+    run_parser.add_argument("--token-delay", type=float, default=0.005, help="桩服务相邻 token 的间隔（秒）")
+    run_parser.add_argument("--embedding-latency", type=float, default=0.05, help="桩服务 Embedding 请求延迟（秒）")
+    run_parser.add_argument("--data-latency", type=float, default=0.1, help="夹具数据源每次请求的延迟（秒）")
+    run_parser.add_argument("--answer-chars", type=int, default=200, help="脚本化最终回答的字数")
+    run_parser.add_argument("--router", action="store_true", help="先尝试快速路由（与界面一致）")
+    run_parser.add_argument("--today", help="固定“当前日期”（YYYY-MM-DD），使相对日期的问题可复现")
+    run_parser.add_argument("--seed", type=int, default=7)
+    run_parser.add_argument("--save", help="将结果保存为 JSON")
+    run_parser.add_argument("--compare", help="与保存的 JSON 结果比较")
+    run_parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对退化比例")
+
+    record_parser = commands.add_parser("record", help="录制行情夹具（需要联网）")
+    record_parser.add_argument("symbols", nargs="+")
+    record_parser.add_argument("--start", required=True)
+    record_parser.add_argument("--end", required=True)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record_fixtures(args.symbols, args.start, args.end)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+本地方舟（Ark）桩服务：兼容 OpenAI 风格的 /chat/completions（含 SSE 流式）与 /embeddings，
+用于离线基准与验证。统计 TCP 连接数、各接口请求数与 token 数，延迟可配置。
+
+单独运行：python -m benchmarks.stub_ark --port 8900
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from financial_agent.core.tokens import estimate_tokens
+
+Responder = Callable[[str], str]
+
+
+def default_responder(prompt: str) -> str:
+    return "这是桩服务返回的回答。"
+
+
+def split_tokens(text: str, size: int = 2) -> List[str]:
+    """把回答切成小片段，模拟逐 token 输出。"""
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def stub_embedding(text: str, dim: int) -> List[float]:
+    """确定性的单位向量：字符一元与二元组哈希到 dim 维后归一化，字面相近的文本向量也相近。"""
+    vec = np.zeros(dim)
+    grams = list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+    for gram in grams:
+        h = zlib.crc32(gram.encode("utf-8"))
+        vec[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = np.linalg.norm(vec)
+    if not norm:
+        vec[0], norm = 1.0, 1.0
+    return (vec / norm).tolist()
+
+
+class StubStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.connections = 0
+            self.chat_calls = 0
+            self.stream_calls = 0
+            self.embedding_calls = 0
+            self.embedded_texts = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.embedding_tokens = 0
+            # 同时在处理的对话请求数及其峰值
+            self.chat_in_flight = 0
+            self.chat_peak_in_flight = 0
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def enter_chat(self) -> None:
+        with self._lock:
+            self.chat_in_flight += 1
+            self.chat_peak_in_flight = max(self.chat_peak_in_flight, self.chat_in_flight)
+
+    def exit_chat(self) -> None:
+        with self._lock:
+            self.chat_in_flight -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {k: v for k, v in vars(self).items() if not k.startswith("_")}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # 默认积压队列只有 5，高并发建连时会触发 SYN 重传，扭曲延迟统计
+    request_queue_size = 1024
+
+    def process_request(self, request, client_address):
+        # 每个被接受的套接字即一条 TCP 连接
+        self.stub.stats.add(connections=1)
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        # 客户端超时断开属于预期情况，不打印堆栈
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # noqa: A002 - 覆盖基类签名
+        pass
+
+    def do_POST(self):
+        stub: "StubArkServer" = self.server.stub
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.endswith("/chat/completions"):
+            stub.stats.enter_chat()
+            try:
+                self._chat(stub, body)
+            finally:
+                stub.stats.exit_chat()
+        elif self.path.endswith("/embeddings"):
+            self._embeddings(stub, body)
+        else:
+            self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def _json(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chat(self, stub: "StubArkServer", body: dict) -> None:
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        answer = stub.responder(prompt)
+        prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(answer)
+        stub.stats.add(chat_calls=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        time.sleep(stub.latency)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        if not body.get("stream"):
+            self._json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        stub.stats.add(stream_calls=1)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, piece in enumerate(split_tokens(answer)):
+            if i and stub.token_delay:
+                time.sleep(stub.token_delay)
+            self._event({
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"role": "assistant", "content": piece}, "finish_reason": None}],
+            })
+        self._event({
+            "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage,
+        })
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+    def _event(self, payload: dict) -> None:
+        self._chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _embeddings(self, stub: "StubArkServer", body: dict) -> None:
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        tokens = sum(estimate_tokens(t) for t in texts)
+        stub.stats.add(embedding_calls=1, embedded_texts=len(texts), embedding_tokens=tokens)
+        time.sleep(stub.embedding_latency + stub.embedding_latency_per_text * len(texts))
+        self._json(200, {
+            "object": "list",
+            "model": body.get("model", "stub"),
+            "data": [{"object": "embedding", "index": i, "embedding": stub_embedding(t, stub.embedding_dim)}
+                     for i, t in enumerate(texts)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+
+class StubArkServer:
+    """在后台线程运行的桩服务，可作为上下文管理器使用。base_url 可直接赋给 ARK_BASE_URL。"""
+
+    def __init__(
+        self,
+        responder: Optional[Responder] = None,
+        latency: float = 0.0,
+        token_delay: float = 0.0,
+        embedding_latency: float = 0.0,
+        embedding_latency_per_text: float = 0.0,
+        embedding_dim: int = 64,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.responder = responder or default_responder
+        self.latency = latency
+        self.token_delay = token_delay
+        self.embedding_latency = embedding_latency
+        self.embedding_latency_per_text = embedding_latency_per_text
+        self.embedding_dim = embedding_dim
+        self.stats = StubStats()
+        self._server = _Server((host, port), _Handler)
+        self._server.stub = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v3"
+
+    def start(self) -> "StubArkServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubArkServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地方舟桩服务")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    args = parser.parse_args()
+    server = StubArkServer(latency=args.latency, token_delay=args.token_delay, port=args.port).start()
+    print(f"桩服务已启动：ARK_BASE_URL={server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,52 @@
-from langchain.agents import create_structured_chat_agent, AgentExecutor
-from langchain import hub
+import os
 
-from ..tools.financial_data_tool import FinancialDataTool
+from .prompts import structured_chat_prompt
+from ..tools.financial_data_tool import BatchFinancialDataTool, FinancialDataTool, FrameLookupTool
+from ..tools.indicator_tool import TechnicalIndicatorTool
 from ..tools.knowledge_base_tool import KnowledgeBaseTool
 
 
-def create_financial_agent(llm):
-    """创建并初始化金融智能体"""
-
-    tools = [FinancialDataTool(), KnowledgeBaseTool(llm=llm)]
-
-    # 使用 LangChain Hub 提示模板（结构化聊天）
-    prompt = hub.pull("hwchase17/structured-chat-agent")
-
-    # 创建结构化聊天 Agent
-    agent = create_structured_chat_agent(llm, tools, prompt)
-
-    # 包装为 AgentExecutor 执行器
-    agent_executor = AgentExecutor(
+def create_financial_agent(llm, lazy: bool | None = None, scheduler=None, parallel: bool | None = None):
+    """创建并初始化金融智能体。
+    lazy 模式（默认开启，AGENT_LAZY_INIT=0 关闭）下知识库索引在后台加载，行情类问题无需等待。
+    scheduler 为自定义的数据源调度器（如离线基准中的合成数据源），默认使用 Tushare / yfinance / Stooq。
+    parallel 模式（默认开启，AGENT_PARALLEL_TOOLS=0 关闭）下模型可以在一步中给出多个互不依赖的工具调用，并发执行。
+    """
+    # langchain.agents 会连带导入大量 agent_toolkits，放到真正创建智能体时再导入
+    from langchain.agents import create_structured_chat_agent, AgentExecutor
+
+    if lazy is None:
+        lazy = os.getenv("AGENT_LAZY_INIT", "1") != "0"
+    if parallel is None:
+        parallel = os.getenv("AGENT_PARALLEL_TOOLS", "1") != "0"
+
+    data_tool = FinancialDataTool(scheduler=scheduler)
+    # 批量工具与单标的工具共用同一个本地缓存与数据源调度器
+    batch_tool = BatchFinancialDataTool(
+        price_cache=data_tool.price_cache,
+        scheduler=data_tool.scheduler,
+        frame_store=data_tool.frame_store,
+    )
+    indicator_tool = TechnicalIndicatorTool(data_tool=batch_tool)
+    # 摘要与对话记忆中给出的数据句柄通过该工具取回完整数据
+    frame_tool = FrameLookupTool(data_tool=data_tool)
+    tools = [data_tool, batch_tool, indicator_tool, frame_tool, KnowledgeBaseTool(llm=llm, background=lazy)]
+
+    # 结构化聊天提示模板（内置 LangChain Hub 版本，无需联网）
+    prompt = structured_chat_prompt(parallel=parallel)
+
+    # 创建结构化聊天 Agent；并发模式下同一步的多个工具调用在线程池中执行
+    if parallel:
+        from .parallel_agent import ParallelAgentExecutor, create_parallel_agent
+        agent, executor_cls = create_parallel_agent(llm, tools, prompt), ParallelAgentExecutor
+    else:
+        agent, executor_cls = create_structured_chat_agent(llm, tools, prompt), AgentExecutor
+
+    # 包装为执行器；逐步打印到标准输出仅用于调试（AGENT_VERBOSE=1），耗时与调用明细见 core/tracing
+    agent_executor = executor_cls(
         agent=agent,
         tools=tools,
-        verbose=True,
+        verbose=os.getenv("AGENT_VERBOSE", "0") == "1",
         handle_parsing_errors=True,
     )
 
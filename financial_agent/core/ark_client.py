@@ -0,0 +1,120 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Dict, Tuple
+
+import httpx
+
+try:
+    from volcenginesdkarkruntime import Ark, AsyncArk
+except ImportError:
+    raise ImportError(
+        "Could not import volcenginesdkarkruntime python package. "
+        "Please install it with `pip install 'volcengine-python-sdk[ark]'`."
+    )
+
+DEFAULT_BASE_URL = "https://ark.cn-beijing.volces.com/api/v3"
+
+# 进程级共享的 HTTP 连接池，按 (api_key, base_url) 区分
+_pools: Dict[Tuple[str, str], httpx.Client] = {}
+_pools_lock = threading.Lock()
+# Ark SDK 声明客户端对象本身非线程安全，因此每个线程持有自己的轻量 Ark 实例，底层共用同一个连接池
+_local = threading.local()
+# httpx.AsyncClient 的连接绑定在创建它的事件循环上，异步客户端按事件循环分别缓存
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], AsyncArk]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def default_base_url() -> str:
+    return os.getenv("ARK_BASE_URL") or DEFAULT_BASE_URL
+
+
+def _pool_limits() -> httpx.Limits:
+    size = int(os.getenv("ARK_POOL_SIZE", "20"))
+    return httpx.Limits(
+        max_connections=size,
+        max_keepalive_connections=size,
+        keepalive_expiry=float(os.getenv("ARK_KEEPALIVE_EXPIRY", "60")),
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        float(os.getenv("ARK_READ_TIMEOUT", "120")),
+        connect=float(os.getenv("ARK_CONNECT_TIMEOUT", "10")),
+    )
+
+
+def _max_retries() -> int:
+    # 重试由 core/upstream 统一负责（退避、重试预算、熔断），SDK 默认不再自行重试，避免重试次数相乘
+    return int(os.getenv("ARK_MAX_RETRIES", "0"))
+
+
+def get_http_pool(api_key: str, base_url: str | None = None) -> httpx.Client:
+    """获取（必要时创建）共享的 keep-alive 连接池，httpx.Client 可在线程间安全共用。"""
+    key = (api_key, base_url or default_base_url())
+    pool = _pools.get(key)
+    if pool is None or pool.is_closed:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None or pool.is_closed:
+                pool = httpx.Client(limits=_pool_limits(), timeout=_timeout())
+                _pools[key] = pool
+    return pool
+
+
+def get_ark_client(api_key: str, base_url: str | None = None) -> Ark:
+    """获取当前线程的 Ark 客户端；同一 (api_key, base_url) 的所有线程共用一个连接池，避免每次调用重新握手。"""
+    base_url = base_url or default_base_url()
+    clients = getattr(_local, "clients", None)
+    if clients is None:
+        clients = _local.clients = {}
+    pool = get_http_pool(api_key, base_url)
+    client = clients.get((api_key, base_url))
+    if client is None or client._client is not pool:
+        client = Ark(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=_timeout(),
+            max_retries=_max_retries(),
+            http_client=pool,
+        )
+        clients[(api_key, base_url)] = client
+    return client
+
+
+def get_async_ark_client(api_key: str, base_url: str | None = None) -> AsyncArk:
+    """获取当前事件循环共享的 AsyncArk 客户端，同一循环内的所有协程复用一个异步连接池。必须在协程中调用。"""
+    base_url = base_url or default_base_url()
+    loop = asyncio.get_running_loop()
+    with _pools_lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get((api_key, base_url))
+        if client is None or client._client.is_closed:
+            client = AsyncArk(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=_timeout(),
+                max_retries=_max_retries(),
+                http_client=httpx.AsyncClient(limits=_pool_limits(), timeout=_timeout()),
+            )
+            clients[(api_key, base_url)] = client
+    return client
+
+
+async def aclose_ark_clients() -> None:
+    """关闭当前事件循环上的异步连接池。"""
+    with _pools_lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client._client.aclose()
+
+
+def close_ark_clients() -> None:
+    """关闭所有共享连接池（进程退出或测试结束时调用）。"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parents[1] / "cache" / "embeddings.sqlite3"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingMetrics:
+    """缓存命中率与每批 Embedding 请求的耗时（保留最近 1000 批）。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.failures = 0
+        self.rate_limited_seconds = 0.0
+        self.batch_latencies: deque = deque(maxlen=1000)
+
+    def record_lookup(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def record_batch(self, latency: float, ok: bool = True, waited: float = 0.0) -> None:
+        with self._lock:
+            self.batches += 1
+            self.failures += 0 if ok else 1
+            self.rate_limited_seconds += waited
+            if ok:
+                self.batch_latencies.append(latency)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            latencies = np.array(self.batch_latencies) if self.batch_latencies else None
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "batches": self.batches,
+                "failures": self.failures,
+                "rate_limited_seconds": round(self.rate_limited_seconds, 3),
+                "batch_latency_p50": float(np.percentile(latencies, 50)) if latencies is not None else None,
+                "batch_latency_p95": float(np.percentile(latencies, 95)) if latencies is not None else None,
+            }
+
+
+class EmbeddingCache:
+    """
+    以 (模型 ID, 文本 SHA-256) 为键的持久化向量缓存（SQLite，向量以 float32 存储）。
+    条目数超过 max_entries 时按最近使用时间淘汰（max_entries<=0 表示不限）。可在多线程间共用。
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_entries: Optional[int] = None):
+        self.path = Path(path or os.getenv("EMBEDDING_CACHE_PATH") or DEFAULT_CACHE_PATH)
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+
+    def get_many(self, model: str, hashes: Iterable[str]) -> Dict[str, List[float]]:
+        """批量查询，返回命中的 {文本哈希: 向量}，并刷新命中条目的最近使用时间。"""
+        hashes = list(dict.fromkeys(hashes))
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # SQLite 单条语句的参数个数有限，分段查询
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({marks})", [model, *part]
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+                if rows:
+                    hit = [h for h, _ in rows]
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE model = ? AND hash IN ({','.join('?' * len(hit))})",
+                        [time.time(), model, *hit],
+                    )
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = [(model, h, np.asarray(v, dtype=np.float32).tobytes(), now) for h, v in items.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.execute("COMMIT")
+            self._evict()
+
+    def _evict(self) -> None:
+        if self.max_entries <= 0:
+            return
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# 进程级的 Embedding 指标，所有 VolcanoEmbeddings 实例共用
+embedding_metrics = EmbeddingMetrics()
+
+_default_cache: Optional[EmbeddingCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[EmbeddingCache]:
+    """进程级共享的缓存；EMBEDDING_CACHE_MAX_ENTRIES=0 时关闭缓存。"""
+    global _default_cache
+    if int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000")) == 0:
+        return None
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = EmbeddingCache()
+    return _default_cache
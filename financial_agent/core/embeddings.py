@@ -0,0 +1,91 @@
+import os
+import re
+import unicodedata
+import zlib
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_BACKENDS = ("ark", "local")
+_PIECE_RE = re.compile(r"[㐀-䶿一-鿿]+|[a-z0-9]+")
+
+
+@lru_cache(maxsize=1 << 16)
+def _bucket(feature: str, dim: int) -> Tuple[int, float]:
+    """特征哈希到 (维度, 符号)；带符号的哈希让冲突在期望上相互抵消。"""
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % dim, 1.0 if h & 0x80000000 else -1.0
+
+
+class HashEmbeddings(Embeddings):
+    """
+    本地 CPU 嵌入，无需联网：中文取 1..ngram 字的字符 n-gram，英文与数字取整词及词内 3-gram，
+    特征哈希到 dim 维（带符号），词频取对数后做 L2 单位化。向量只由文本决定、与语料无关，
+    因此持久化的知识库索引与回答缓存中的向量在知识库变化后仍然有效。
+    """
+
+    def __init__(self, dim: int | None = None, ngram: int | None = None):
+        self.dim = dim or int(os.getenv("LOCAL_EMBEDDING_DIM", "512"))
+        self.ngram = ngram or int(os.getenv("LOCAL_EMBEDDING_NGRAM", "3"))
+        # 作为知识库索引与回答缓存的模型标识，维度或 n-gram 变化时二者都会重建
+        self.model = f"local-hash-d{self.dim}-n{self.ngram}"
+
+    def _features(self, text: str) -> List[str]:
+        text = unicodedata.normalize("NFKC", text).lower()
+        features = []
+        for piece in _PIECE_RE.findall(text):
+            if piece.isascii():
+                features.append(f"w:{piece}")
+                padded = f"<{piece}>"
+                features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+            else:
+                for n in range(1, self.ngram + 1):
+                    features.extend(piece[i:i + n] for i in range(len(piece) - n + 1))
+        return features
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """整批嵌入为 float32 矩阵（每行一条文本）。"""
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                col, sign = _bucket(feature, self.dim)
+                rows.append(row)
+                cols.append(col)
+                signs.append(sign)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)),
+                  np.asarray(signs, dtype=np.float32))
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # 纯本地计算且耗时在毫秒级，直接在事件循环中执行
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.embed_query(text)
+
+
+def create_embeddings(backend: str | None = None, **kwargs) -> Embeddings:
+    """
+    按 EMBEDDING_BACKEND 创建 Embedding 后端：ark（默认，方舟远程接口，见 VolcanoEmbeddings）
+    或 local（本地哈希 n-gram 嵌入，无需联网）。kwargs 传给对应的构造函数。
+    """
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "ark")).strip().lower()
+    if backend == "ark":
+        from .llm_adapter import VolcanoEmbeddings
+        return VolcanoEmbeddings(**kwargs)
+    if backend == "local":
+        return HashEmbeddings(**kwargs)
+    raise ValueError(f"未知的 EMBEDDING_BACKEND: {backend}（可选 {' / '.join(EMBEDDING_BACKENDS)}）")
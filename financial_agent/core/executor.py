@@ -0,0 +1,33 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# 阻塞型 SDK（yfinance / tushare / FAISS 等）在异步路径中统一交给这个有界线程池执行，
+# 避免默认执行器随并发会话数无限扩张
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_blocking_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("BLOCKING_EXECUTOR_WORKERS", "16")),
+                    thread_name_prefix="blocking-io",
+                )
+    return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在有界线程池中执行阻塞调用并等待结果，保留调用方的 contextvars 上下文。"""
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(get_blocking_executor(), call)
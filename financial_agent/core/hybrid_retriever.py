@@ -0,0 +1,220 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .kb_index import document_id
+
+_CJK = r"㐀-䶿一-鿿"
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[a-z0-9]+")
+_ACRONYM_RE = re.compile(r"\b[A-Z][A-Z/]*[A-Z]\b")
+# 术语名称常见的后缀，去掉后也作为别名（"KDJ指标" -> "KDJ"）
+_TERM_SUFFIXES = ("指标", "比率")
+# 提问用语：查询去掉命中的别名后只剩这些时，视为别名覆盖了整个查询
+_QUESTION_RE = re.compile(
+    r"什么是|什么叫|是什么|什么|是指|指的是|请问|解释|介绍|一下|含义|意思|定义|概念|怎么|如何|怎样|计算|公式"
+    r"|\bwhat is\b|\bwhat's\b|\bexplain\b|\bdefine\b|\bmeaning\b|\bof\b|请|的|是|吗|呢|啊"
+    r"|[\s?？!！,，.。、:：]+"
+)
+
+
+def normalize(text: str) -> str:
+    """全角转半角、转小写，连字符与空白统一为单个空格。"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return re.sub(r"[\s\-_]+", " ", text).strip()
+
+
+def tokenize(text: str) -> List[str]:
+    """中文按字二元组切分（单字片段保留单字），英文与数字按词切分。"""
+    tokens = []
+    for piece in _TOKEN_RE.findall(normalize(text)):
+        if piece[0].isascii():
+            tokens.append(piece)
+        elif len(piece) == 1:
+            tokens.append(piece)
+        else:
+            tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+    return tokens
+
+
+def term_aliases(term: str) -> List[str]:
+    """
+    由知识库 term 列解析出名称与别名：括号前为中文名称，括号内逗号分隔的为英文名称，
+    另外收录其中的大写缩写（"P/E" 及去掉斜杠的 "PE"）和去掉常见后缀的名称。
+    """
+    name, _, rest = term.partition("(")
+    aliases = [name] + rest.rstrip(") ").split(",")
+    for alias in list(aliases):
+        for acronym in _ACRONYM_RE.findall(alias):
+            aliases += [acronym, acronym.replace("/", "")]
+        for suffix in _TERM_SUFFIXES:
+            if alias.strip().endswith(suffix) and len(alias.strip()) > len(suffix):
+                aliases.append(alias.strip()[: -len(suffix)])
+    seen = []
+    for alias in map(normalize, aliases):
+        if alias and alias not in seen:
+            seen.append(alias)
+    return seen
+
+
+class BM25Index:
+    """内存倒排索引上的 Okapi BM25。"""
+
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.lengths = []
+        for i, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.lengths.append(sum(counts.values()))
+            for token, tf in counts.items():
+                self.postings[token][i] = tf
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        n = len(self.lengths)
+        self.idf = {token: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                    for token, docs in self.postings.items()}
+
+    def search(self, query: str, k: int) -> Tuple[List[Tuple[int, float]], float]:
+        """返回得分最高的 k 个 (文档序号, 得分)，以及查询词元在第一名文档中出现的比例。"""
+        tokens = tokenize(query)
+        scores: Dict[int, float] = defaultdict(float)
+        for token in tokens:
+            for i, tf in self.postings.get(token, {}).items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_length or 1))
+                scores[i] += self.idf[token] * tf * (self.k1 + 1) / norm
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        if not ranked or not tokens:
+            return ranked, 0.0
+        top = ranked[0][0]
+        return ranked, sum(1 for token in tokens if top in self.postings.get(token, {})) / len(tokens)
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60, weights: List[float] | None = None) -> List[str]:
+    """RRF：各路排序中名次 r 的文档得 w/(k+r)（w 为该路的权重，默认 1），按总分排序。"""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking, weight in zip(rankings, weights or [1.0] * len(rankings)):
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += weight / (k + rank)
+    return sorted(scores, key=lambda doc_id: -scores[doc_id])
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    知识库的混合检索：查询只是在问某个术语（去掉术语名称或别名后只剩提问用语）时直接返回对应条目；
+    否则走 BM25，第一名覆盖了足够多的查询词元且明显领先时直接返回，不调用 Embedding；
+    其余查询才做向量检索，与 BM25 排序做 RRF 融合，查询中命中的术语条目作为加权的一路参与融合。
+    """
+
+    documents: List[Document]
+    vector_retriever: Any = None
+    k: int = 3
+    # BM25 直接作答的条件：第一名覆盖的查询词元比例，以及相对第二名的得分倍数
+    min_coverage: float = 0.8
+    min_margin: float = 1.5
+    # 命中术语的条目在 RRF 融合中的权重
+    alias_weight: float = 2.0
+    # 各路径命中次数：alias / lexical / hybrid
+    stats: Dict[str, int] = {}
+
+    _bm25: BM25Index
+    _ids: List[str]
+    _aliases: List[Tuple[str, List[int]]]
+    _lock: Any
+
+    class Config:
+        arbitrary_types_allowed = True
+        underscore_attrs_are_private = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = {"alias": 0, "lexical": 0, "hybrid": 0}
+        self._lock = threading.Lock()
+        self._ids = [document_id(doc) for doc in self.documents]
+        self._bm25 = BM25Index([doc.page_content for doc in self.documents])
+        # 同一行被切成多块时共用 term，别名对应该行的全部块
+        rows: Dict[Any, List[int]] = defaultdict(list)
+        terms: Dict[Any, str] = {}
+        for i, doc in enumerate(self.documents):
+            row = doc.metadata.get("row", self._ids[i])
+            rows[row].append(i)
+            head = doc.page_content.split("\n", 1)[0]
+            if head.startswith("term:"):
+                terms[row] = head[len("term:"):].strip()
+        aliases: Dict[str, List[int]] = defaultdict(list)
+        for row, term in terms.items():
+            for alias in term_aliases(term):
+                aliases[alias].extend(rows[row])
+        # 长别名优先匹配，避免 "MA" 之类的短缩写抢先命中
+        self._aliases = sorted(aliases.items(), key=lambda item: -len(item[0]))
+
+    @classmethod
+    def from_vectorstore(cls, store, **kwargs) -> "HybridRetriever":
+        """由知识库 FAISS 向量库构建：文档取自其文档存储，向量检索复用该向量库。"""
+        documents = [store.docstore.search(store.index_to_docstore_id[i]) for i in range(len(store.index_to_docstore_id))]
+        k = kwargs.get("k", cls.__fields__["k"].default)
+        return cls(documents=documents, vector_retriever=store.as_retriever(search_kwargs={"k": k}), **kwargs)
+
+    def _match_aliases(self, query: str) -> Tuple[List[int], str]:
+        """返回 (命中的文档序号, 去掉命中部分后的查询)。"""
+        text = normalize(query)
+        matched: List[int] = []
+        for alias, indices in self._aliases:
+            # 英文别名要求词边界（"MA" 不命中 "MACD"）；命中的部分从查询中移除，不再参与更短别名的匹配
+            pattern = rf"(?<![a-z0-9]){re.escape(alias)}(?![a-z0-9])" if alias.isascii() else re.escape(alias)
+            text, found = re.subn(pattern, " ", text)
+            if found:
+                matched.extend(i for i in indices if i not in matched)
+        return matched, text
+
+    def _lexical(self, query: str) -> Tuple[List[int] | None, List[int], List[int]]:
+        """返回 (可直接作答的文档序号或 None, 命中术语的文档序号, BM25 排序)。"""
+        matched, rest = self._match_aliases(query)
+        if matched and not _QUESTION_RE.sub("", rest):
+            # 只是在问这些术语：只返回对应条目，不再用其他条目填充上下文
+            self._record("alias")
+            return matched, matched, []
+        ranked, coverage = self._bm25.search(query, self.k)
+        order = [i for i, _ in ranked]
+        # 查询中还有术语以外的内容（如 "MACD 和 MA 的区别"）时，术语条目只参与融合
+        if not matched and ranked and coverage >= self.min_coverage and (
+                len(ranked) == 1 or ranked[0][1] >= self.min_margin * ranked[1][1]):
+            self._record("lexical")
+            return order, matched, order
+        self._record("hybrid")
+        return None, matched, order
+
+    def _fuse(self, matched: List[int], lexical: List[int], vector_docs: List[Document]) -> List[Document]:
+        by_id = {self._ids[i]: self.documents[i] for i in matched + lexical}
+        for doc in vector_docs:
+            by_id.setdefault(document_id(doc), doc)
+        fused = reciprocal_rank_fusion(
+            [[self._ids[i] for i in matched], [self._ids[i] for i in lexical], [document_id(d) for d in vector_docs]],
+            weights=[self.alias_weight, 1.0, 1.0],
+        )
+        return [by_id[doc_id] for doc_id in fused[: self.k]]
+
+    def _record(self, route: str) -> None:
+        with self._lock:
+            self.stats[route] += 1
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        direct, matched, order = self._lexical(query)
+        if direct is not None:
+            return [self.documents[i] for i in direct]
+        vector_docs = self.vector_retriever.get_relevant_documents(query, callbacks=run_manager.get_child())
+        return self._fuse(matched, order, vector_docs)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        direct, matched, order = self._lexical(query)
+        if direct is not None:
+            return [self.documents[i] for i in direct]
+        vector_docs = await self.vector_retriever.aget_relevant_documents(query, callbacks=run_manager.get_child())
+        return self._fuse(matched, order, vector_docs)
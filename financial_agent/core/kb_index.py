@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from .vector_index import IndexConfig, TunableFAISS, apply_search_defaults, build_index, factory_string
+
+DEFAULT_INDEX_DIR = Path(__file__).resolve().parents[1] / "cache" / "kb_index"
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.json"
+# 非 Flat 索引（IVF / PQ 有损、HNSW 不支持删除）另存一份原始向量，增量同步与重建索引时使用
+VECTORS_FILE = "vectors.npy"
+MANIFEST_FILE = "manifest.json"
+
+
+def document_id(doc: Document) -> str:
+    """文档块正文的内容哈希，作为增量更新的依据。
+    不含行号等元数据，插入或移动行不会导致其后所有块重新嵌入。
+    """
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()[:32]
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def embedding_model_name(embeddings: Embeddings) -> str:
+    return str(getattr(embeddings, "model", None) or type(embeddings).__name__)
+
+
+class KnowledgeBaseIndex:
+    """
+    持久化的知识库 FAISS 索引。向量存放在 index.faiss，文档块按行序存放在 docstore.json（不使用 pickle），
+    manifest.json 记录 Embedding 模型、源文件摘要、索引类型与各文档块的内容哈希。
+    源文件未变化时直接以内存映射方式加载；变化时只对新增/修改的文档块调用 Embedding，删除已不存在的块。
+    索引类型由 config（默认取 KB_INDEX_* 环境变量）决定：同步始终在精确的 Flat 索引上进行，
+    配置为 IVF-Flat / IVF-PQ / HNSW 且规模足够时，再由全部向量训练并构建对应的索引用于检索。
+    """
+
+    def __init__(self, embeddings: Embeddings, index_dir: Optional[Path] = None, config: Optional[IndexConfig] = None):
+        self.embeddings = embeddings
+        self.index_dir = Path(index_dir or os.getenv("KB_INDEX_DIR") or DEFAULT_INDEX_DIR)
+        self.config = config or IndexConfig.from_env()
+        # 最近一次加载的统计：总块数、新嵌入块数、删除块数、是否内存映射加载、索引类型
+        self.stats: Dict[str, int | bool | str] = {
+            "documents": 0, "embedded": 0, "removed": 0, "mmap": False, "index": "Flat",
+        }
+
+    def load_or_build(self, source: Path, load_documents, signature: str = "") -> FAISS:
+        """
+        返回与 source 内容一致的向量库。load_documents() 负责读取并切分源文件，仅在源文件变化时调用；
+        signature 描述切分参数等影响文档块的配置，变化时同样触发同步。
+        """
+        source_digest = f"{file_digest(source)}:{signature}"
+        manifest = self._load_manifest()
+        model = embedding_model_name(self.embeddings)
+        if manifest and manifest.get("model") == model and manifest.get("source_digest") == source_digest \
+                and self._spec_unchanged(manifest):
+            store = self._load(mmap=True)
+            if store is not None:
+                self.stats.update(documents=len(store.index_to_docstore_id), embedded=0, removed=0,
+                                  index=manifest.get("index_spec", "Flat"))
+                return store
+
+        documents = load_documents()
+        store = self._load_exact(manifest) if manifest and manifest.get("model") == model else None
+        store, embedded, removed = self._sync(store, documents)
+        spec = factory_string(self.config, len(store.index_to_docstore_id), store.index.d)
+        vectors = None
+        if spec != "Flat":
+            vectors = store.index.reconstruct_n(0, store.index.ntotal)
+            trained = self._load_trained() if manifest and manifest.get("index_spec") == spec else None
+            store = TunableFAISS(self.embeddings, build_index(vectors, spec, self.config, trained=trained),
+                                 store.docstore, store.index_to_docstore_id)
+        self._save(store, {"model": model, "source_digest": source_digest, "index_spec": spec}, vectors)
+        self.stats.update(documents=len(store.index_to_docstore_id), embedded=embedded, removed=removed, mmap=False,
+                          index=spec)
+        return store
+
+    def _spec_unchanged(self, manifest: dict) -> bool:
+        """manifest 记录的索引类型与当前配置一致。旧版 manifest 没有记录维度，按不一致处理（重建一次，无需重新嵌入）。"""
+        dim = manifest.get("dim")
+        if not dim:
+            return False
+        return manifest.get("index_spec", "Flat") == factory_string(self.config, len(manifest.get("documents", [])), dim)
+
+    def _sync(self, store: Optional[FAISS], documents: List[Document]) -> Tuple[FAISS, int, int]:
+        """按内容哈希比对：删除不再存在的块，嵌入并追加新增块，已有块只刷新元数据（如行号）。"""
+        wanted = {}
+        for doc in documents:
+            wanted.setdefault(document_id(doc), doc)
+        existing = set(store.index_to_docstore_id.values()) if store is not None else set()
+        stale = [doc_id for doc_id in existing if doc_id not in wanted]
+        fresh = [(doc_id, doc) for doc_id, doc in wanted.items() if doc_id not in existing]
+
+        if store is not None:
+            if stale:
+                store.delete(stale)
+            kept = [doc_id for doc_id in existing if doc_id in wanted]
+            store.docstore.delete(kept)
+            store.docstore.add({doc_id: wanted[doc_id] for doc_id in kept})
+        vectors = self.embeddings.embed_documents([doc.page_content for _, doc in fresh])
+        if store is None:
+            if not fresh:
+                raise ValueError("知识库为空，无法建立索引。")
+            index = faiss.IndexFlatL2(len(vectors[0]))
+            store = TunableFAISS(self.embeddings, index, InMemoryDocstore(), {})
+        if fresh:
+            store.add_embeddings(
+                [(doc.page_content, vector) for (_, doc), vector in zip(fresh, vectors)],
+                metadatas=[doc.metadata for _, doc in fresh],
+                ids=[doc_id for doc_id, _ in fresh],
+            )
+        return store, len(fresh), len(stale)
+
+    def _load_manifest(self) -> Optional[dict]:
+        try:
+            return json.loads((self.index_dir / MANIFEST_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _load_exact(self, manifest: dict) -> Optional[FAISS]:
+        """读取用于增量同步的 Flat 向量库：Flat 索引直接读取，其他索引由另存的原始向量重建。"""
+        if manifest.get("index_spec", "Flat") == "Flat":
+            return self._load(mmap=False)
+        try:
+            rows = json.loads((self.index_dir / DOCSTORE_FILE).read_text(encoding="utf-8"))
+            vectors = np.load(self.index_dir / VECTORS_FILE)
+        except (OSError, ValueError):
+            return None
+        if len(vectors) != len(rows):
+            return None
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+        return self._store(index, rows)
+
+    def _load_trained(self) -> Optional[faiss.Index]:
+        """读取上次保存的索引，供同一索引类型下沿用训练结果；失败时返回 None（重新训练）。"""
+        try:
+            return faiss.read_index(str(self.index_dir / INDEX_FILE))
+        except RuntimeError:
+            return None
+
+    def _store(self, index: faiss.Index, rows: List[dict]) -> FAISS:
+        docstore = InMemoryDocstore({
+            row["id"]: Document(page_content=row["page_content"], metadata=row["metadata"]) for row in rows
+        })
+        return TunableFAISS(self.embeddings, index, docstore, {i: row["id"] for i, row in enumerate(rows)})
+
+    def _load(self, mmap: bool) -> Optional[FAISS]:
+        """读取索引与文档；mmap=True 时以只读内存映射方式打开，失败则退回常规读取。文件缺失或损坏时返回 None。"""
+        index_path = self.index_dir / INDEX_FILE
+        try:
+            rows = json.loads((self.index_dir / DOCSTORE_FILE).read_text(encoding="utf-8"))
+            index = None
+            self.stats["mmap"] = False
+            if mmap:
+                flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+                try:
+                    index = faiss.read_index(str(index_path), flag)
+                    self.stats["mmap"] = True
+                except RuntimeError:
+                    index = None
+            if index is None:
+                index = faiss.read_index(str(index_path))
+        except (OSError, ValueError, RuntimeError):
+            return None
+        if index.ntotal != len(rows):
+            return None
+        # 默认查询参数以当前配置为准（nprobe / efSearch 不需要重建索引）
+        apply_search_defaults(index, self.config)
+        return self._store(index, rows)
+
+    def _save(self, store: FAISS, manifest: dict, vectors: Optional[np.ndarray] = None) -> None:
+        """先写临时文件再替换；manifest 最后写入，中途失败时下次启动会按内容哈希重新同步。"""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        rows = []
+        for i in range(len(store.index_to_docstore_id)):
+            doc_id = store.index_to_docstore_id[i]
+            doc = store.docstore.search(doc_id)
+            rows.append({"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata})
+        manifest = {**manifest, "dim": store.index.d, "documents": [row["id"] for row in rows]}
+
+        tmp = self.index_dir / (INDEX_FILE + ".tmp")
+        faiss.write_index(store.index, str(tmp))
+        os.replace(tmp, self.index_dir / INDEX_FILE)
+        if vectors is not None:
+            tmp = self.index_dir / (VECTORS_FILE + ".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, vectors)
+            os.replace(tmp, self.index_dir / VECTORS_FILE)
+        else:
+            (self.index_dir / VECTORS_FILE).unlink(missing_ok=True)
+        for name, payload in ((DOCSTORE_FILE, rows), (MANIFEST_FILE, manifest)):
+            tmp = self.index_dir / (name + ".tmp")
+            tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.index_dir / name)
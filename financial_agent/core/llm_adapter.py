@@ -1,22 +1,25 @@
+import asyncio
 import os
-from typing import Any, List, Optional, Mapping, Iterator
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, List, Optional, Mapping, Iterator
 from dotenv import load_dotenv
 
 from langchain.llms.base import LLM
 from langchain.embeddings.base import Embeddings
-from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
 from langchain.schema.output import GenerationChunk
 
 # 加载 .env 文件中的环境变量
 load_dotenv("financial_agent/configs/.env")
 
-try:
-    from volcenginesdkarkruntime import Ark
-except ImportError:
-    raise ImportError(
-        "Could not import volcenginesdkarkruntime python package. "
-        "Please install it with `pip install 'volcengine-python-sdk[ark]'`."
-    )
+from .ark_client import default_base_url, get_ark_client, get_async_ark_client
+from .embedding_cache import embedding_metrics, get_default_cache, text_hash
+from .executor import run_blocking
+from .ratelimit import shared_bucket
+from .tokens import TokenCounter, estimate_tokens
+from .tracing import get_tracer
+from .upstream import UpstreamBusy, acall_upstream, aopen_upstream, call_upstream, open_upstream, release
 
 class VolcanoLLM(LLM):
     """
@@ -25,7 +28,7 @@ class VolcanoLLM(LLM):
     """
     api_key: str = None
     model_id: str = None
-    base_url: str = "https://ark.cn-beijing.volces.com/api/v3"
+    base_url: str = None
     streaming: bool = False
 
     def __init__(self, streaming: bool = False, model_id: str = None, **kwargs: Any):
@@ -34,6 +37,7 @@ class VolcanoLLM(LLM):
         self.api_key = os.getenv("ARK_API_KEY")
         # 优先使用传入的 model_id，否则从环境变量中获取
         self.model_id = model_id or os.getenv("ARK_MODEL_ID")
+        self.base_url = self.base_url or default_base_url()
         if not self.api_key or not self.model_id:
             raise ValueError("ARK_API_KEY 和 ARK_MODEL_ID 环境变量未设置，请在 .env 文件中配置。")
 
@@ -52,27 +56,24 @@ class VolcanoLLM(LLM):
         """
         同步调用模型。
         """
-        print(f"\n[LLM_ADAPTER_LOG] >>>>>>>> 同步调用开始 >>>>>>>>")
-        print(f"[LLM_ADAPTER_LOG] Model ID: {self.model_id}")
-        client = Ark(
-            api_key=self.api_key,
-            base_url=self.base_url,
-        )
+        span = get_tracer().start_span("llm.call", self.model_id, mode="sync")
+        client = get_ark_client(self.api_key, self.base_url)
         try:
-            completion = client.chat.completions.create(
+            completion = call_upstream("ark", lambda: client.chat.completions.create(
                 model=self.model_id,
                 messages=[{"role": "user", "content": prompt}],
                 stream=False,
                 **kwargs
-            )
+            ), tokens=estimate_tokens(prompt))
             response_content = completion.choices[0].message.content
-            print(f"[LLM_ADAPTER_LOG] Model Response: {response_content}")
-            print(f"[LLM_ADAPTER_LOG] <<<<<<<< 同步调用结束 <<<<<<<<\n")
-            return response_content
+        except UpstreamBusy as e:
+            span.end(e)
+            raise
         except Exception as e:
-            print(f"[LLM_ADAPTER_LOG] Error: {e}")
-            print(f"[LLM_ADAPTER_LOG] <<<<<<<< 同步调用异常结束 <<<<<<<<\n")
+            span.end(e)
             raise RuntimeError(f"调用火山方舟模型时出错: {e}")
+        self._end_span(span, prompt, completion, response_content)
+        return response_content
 
     def _stream(
         self,
@@ -82,40 +83,135 @@ class VolcanoLLM(LLM):
         **kwargs: Any,
     ) -> Iterator[GenerationChunk]:
         """流式调用模型。"""
-        print(f"\n[LLM_ADAPTER_LOG] >>>>>>>> 流式调用开始 >>>>>>>>")
-        print(f"[LLM_ADAPTER_LOG] Model ID: {self.model_id}")
-        client = Ark(
-            api_key=self.api_key,
-            base_url=self.base_url,
-        )
+        span = get_tracer().start_span("llm.call", self.model_id, mode="stream")
+        client = get_ark_client(self.api_key, self.base_url)
+        # 并发名额占用到流式输出结束；建立连接失败时按退避重试，已开始输出后不再重试
         try:
-            stream = client.chat.completions.create(
+            stream, held = open_upstream("ark", lambda: client.chat.completions.create(
                 model=self.model_id,
                 messages=[{"role": "user", "content": prompt}],
                 stream=True,
                 **kwargs
-            )
+            ), tokens=estimate_tokens(prompt))
+        except UpstreamBusy as e:
+            span.end(e)
+            raise
+        except Exception as e:
+            span.end(e)
+            raise RuntimeError(f"调用火山方舟流式模型时出错: {e}")
 
-            def logging_iterator(stream_iterator):
-                full_response = []
-                try:
-                    for chunk in stream_iterator:
-                        if chunk.choices and chunk.choices[0].delta.content is not None:
-                            content = chunk.choices[0].delta.content
-                            full_response.append(content)
-                            yield GenerationChunk(text=content)
-                            if run_manager:
-                                run_manager.on_llm_new_token(content)
-                finally:
-                    print(f"[LLM_ADAPTER_LOG] Model Response: {''.join(full_response)}")
-                    print(f"[LLM_ADAPTER_LOG] <<<<<<<< 流式调用结束 <<<<<<<<\n")
-
-            return logging_iterator(stream)
+        def traced_iterator(stream_iterator):
+            # 只累计 token 数与首 token 耗时，不缓存整段回答
+            counter = TokenCounter() if span.recording else None
+            error = None
+            try:
+                for chunk in stream_iterator:
+                    if chunk.choices and chunk.choices[0].delta.content is not None:
+                        content = chunk.choices[0].delta.content
+                        if counter is not None:
+                            if not counter.chars:
+                                span.set(ttft=span.elapsed())
+                            counter.add(content)
+                        yield GenerationChunk(text=content)
+                        if run_manager:
+                            run_manager.on_llm_new_token(content)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                if held is not None:
+                    release("ark", held)
+                if counter is not None:
+                    span.set(prompt_tokens=estimate_tokens(prompt), completion_tokens=counter.tokens)
+                span.end(error)
 
+        return traced_iterator(stream)
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        """
+        异步调用模型，使用当前事件循环共享的 AsyncArk 客户端，不占用线程。
+        """
+        span = get_tracer().start_span("llm.call", self.model_id, mode="async")
+        client = get_async_ark_client(self.api_key, self.base_url)
+        try:
+            completion = await acall_upstream("ark", lambda: client.chat.completions.create(
+                model=self.model_id,
+                messages=[{"role": "user", "content": prompt}],
+                stream=False,
+                **kwargs
+            ), tokens=estimate_tokens(prompt))
+            response_content = completion.choices[0].message.content
+        except UpstreamBusy as e:
+            span.end(e)
+            raise
         except Exception as e:
-            print(f"[LLM_ADAPTER_LOG] Error: {e}")
-            print(f"[LLM_ADAPTER_LOG] <<<<<<<< 流式调用异常结束 <<<<<<<<\n")
-            raise RuntimeError(f"调用火山方舟流式模型时出错: {e}")
+            span.end(e)
+            raise RuntimeError(f"调用火山方舟模型时出错: {e}")
+        self._end_span(span, prompt, completion, response_content)
+        return response_content
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        """异步流式调用模型。"""
+        span = get_tracer().start_span("llm.call", self.model_id, mode="astream")
+        client = get_async_ark_client(self.api_key, self.base_url)
+        counter = TokenCounter() if span.recording else None
+        error = None
+        held = None
+        try:
+            # 并发名额占用到流式输出结束
+            try:
+                stream, held = await aopen_upstream("ark", lambda: client.chat.completions.create(
+                    model=self.model_id,
+                    messages=[{"role": "user", "content": prompt}],
+                    stream=True,
+                    **kwargs
+                ), tokens=estimate_tokens(prompt))
+            except UpstreamBusy:
+                raise
+            except Exception as e:
+                raise RuntimeError(f"调用火山方舟流式模型时出错: {e}")
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    content = chunk.choices[0].delta.content
+                    if counter is not None:
+                        if not counter.chars:
+                            span.set(ttft=span.elapsed())
+                        counter.add(content)
+                    yield GenerationChunk(text=content)
+                    if run_manager:
+                        await run_manager.on_llm_new_token(content)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if held is not None:
+                release("ark", held)
+            if counter is not None:
+                span.set(prompt_tokens=estimate_tokens(prompt), completion_tokens=counter.tokens)
+            span.end(error)
+
+    @staticmethod
+    def _end_span(span, prompt: str, completion: Any, response_content: Optional[str]) -> None:
+        """非流式调用结束：优先使用接口返回的 usage，缺失时按文本估算 token 数。"""
+        if span.recording:
+            usage = getattr(completion, "usage", None)
+            span.set(
+                prompt_tokens=getattr(usage, "prompt_tokens", None) or estimate_tokens(prompt),
+                completion_tokens=getattr(usage, "completion_tokens", None) or estimate_tokens(response_content or ""),
+            )
+        span.end()
 
     @property
     def _identifying_params(self) -> Mapping[str, Any]:
@@ -126,28 +222,135 @@ class VolcanoLLM(LLM):
 class VolcanoEmbeddings(Embeddings):
     """
     封装火山引擎方舟 Embedding 模型的 LangChain 适配器。
+    向量按 (模型 ID, 文本哈希) 缓存；未命中的文本按条数与 token 数分批，在限流下并发请求。
     """
-    def __init__(self, model: str = None, ark_api_key: str = None):
-        self.client = Ark(
-            api_key=ark_api_key or os.getenv("ARK_API_KEY"),
-            base_url="https://ark.cn-beijing.volces.com/api/v3"
-        )
+    def __init__(self, model: str = None, ark_api_key: str = None, use_cache: bool = True):
+        self.api_key = ark_api_key or os.getenv("ARK_API_KEY")
+        self.base_url = default_base_url()
         self.model = os.getenv("ARK_EMBEDDING_MODEL_ID")
         if not self.model:
             raise ValueError("ARK_EMBEDDING_MODEL_ID 环境变量未设置，请在 .env 文件中配置。")
+        self.cache = get_default_cache() if use_cache else None
+        self.batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+        self.batch_tokens = int(os.getenv("EMBEDDING_BATCH_TOKENS", "8000"))
+        self.max_concurrency = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+        # 同一 API Key 的所有实例共用一个限流配额（每秒请求数，0 为不限）
+        self.rate_limiter = shared_bucket(
+            f"ark-embeddings:{self.api_key}", float(os.getenv("EMBEDDING_RATE_LIMIT", "20"))
+        )
+
+    @property
+    def client(self):
+        """当前线程的 Ark 客户端，与 VolcanoLLM 共用同一个连接池。"""
+        return get_ark_client(self.api_key, self.base_url)
+
+    @property
+    def metrics(self) -> dict:
+        """缓存命中率、批次数与每批请求耗时（进程级汇总）。"""
+        return embedding_metrics.snapshot()
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """嵌入一批文档"""
+        """嵌入一批文档：先查缓存，未命中的分批并发请求后写回缓存。"""
+        if not texts:
+            return []
+        hashes = [text_hash(t) for t in texts]
+        vectors = self._lookup(hashes)
+        missing = self._missing(texts, hashes, vectors)
+        if missing:
+            batches = self._batches(missing)
+            if len(batches) == 1:
+                results = [self._request_batch(batches[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                    results = list(pool.map(self._request_batch, batches))
+            fresh = {h: v for part in results for h, v in part.items()}
+            if self.cache is not None:
+                self.cache.put_many(self.model, fresh)
+            vectors.update(fresh)
+        return [vectors[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        """嵌入单个查询"""
+        embeddings = self.embed_documents([text])
+        return embeddings[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """异步嵌入一批文档，缓存读写交给有界线程池，各批请求以信号量限制并发。"""
+        if not texts:
+            return []
+        hashes = [text_hash(t) for t in texts]
+        vectors = await run_blocking(self._lookup, hashes)
+        missing = self._missing(texts, hashes, vectors)
+        if missing:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def request(batch):
+                async with semaphore:
+                    return await self._arequest_batch(batch)
+
+            results = await asyncio.gather(*(request(b) for b in self._batches(missing)))
+            fresh = {h: v for part in results for h, v in part.items()}
+            if self.cache is not None:
+                await run_blocking(self.cache.put_many, self.model, fresh)
+            vectors.update(fresh)
+        return [vectors[h] for h in hashes]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """异步嵌入单个查询"""
+        embeddings = await self.aembed_documents([text])
+        return embeddings[0]
+
+    def _lookup(self, hashes: List[str]) -> dict:
+        return self.cache.get_many(self.model, hashes) if self.cache is not None else {}
+
+    def _missing(self, texts: List[str], hashes: List[str], vectors: dict) -> List[tuple]:
+        """未命中缓存的 (哈希, 文本)，重复文本只请求一次；同时记录命中率。"""
+        missing = {h: t for h, t in zip(hashes, texts) if h not in vectors}
+        embedding_metrics.record_lookup(hits=sum(h in vectors for h in hashes), misses=len(missing))
+        return list(missing.items())
+
+    def _batches(self, items: List[tuple]) -> List[List[tuple]]:
+        """按条数上限与估算 token 上限切分，单条超限的文本单独成批。"""
+        batches, current, tokens = [], [], 0
+        for item in items:
+            cost = estimate_tokens(item[1])
+            if current and (len(current) >= self.batch_size or tokens + cost > self.batch_tokens):
+                batches.append(current)
+                current, tokens = [], 0
+            current.append(item)
+            tokens += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def _request_batch(self, batch: List[tuple]) -> dict:
+        waited = self.rate_limiter.acquire()
+        started = time.perf_counter()
         try:
-            embeddings = self.client.embeddings.create(
-                model=self.model,
-                input=texts
+            response = call_upstream(
+                "ark", lambda: self.client.embeddings.create(model=self.model, input=[t for _, t in batch])
             )
-            return [item.embedding for item in embeddings.data]
         except Exception as e:
+            embedding_metrics.record_batch(time.perf_counter() - started, ok=False, waited=waited)
             raise RuntimeError(f"调用火山方舟 Embedding 模型时出错: {e}")
+        embedding_metrics.record_batch(time.perf_counter() - started, waited=waited)
+        return self._to_vectors(batch, response)
 
-    def embed_query(self, text: str) -> List[float]:
-        """嵌入单个查询"""
-        embeddings = self.embed_documents([text])
-        return embeddings[0]
\ No newline at end of file
+    async def _arequest_batch(self, batch: List[tuple]) -> dict:
+        waited = await self.rate_limiter.acquire_async()
+        started = time.perf_counter()
+        client = get_async_ark_client(self.api_key, self.base_url)
+        try:
+            response = await acall_upstream(
+                "ark", lambda: client.embeddings.create(model=self.model, input=[t for _, t in batch])
+            )
+        except Exception as e:
+            embedding_metrics.record_batch(time.perf_counter() - started, ok=False, waited=waited)
+            raise RuntimeError(f"调用火山方舟 Embedding 模型时出错: {e}")
+        embedding_metrics.record_batch(time.perf_counter() - started, waited=waited)
+        return self._to_vectors(batch, response)
+
+    @staticmethod
+    def _to_vectors(batch: List[tuple], response) -> dict:
+        data = sorted(response.data, key=lambda item: item.index)
+        return {h: item.embedding for (h, _), item in zip(batch, data)}
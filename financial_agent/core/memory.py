@@ -0,0 +1,217 @@
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+import numpy as np
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from .executor import get_blocking_executor
+from .tokens import estimate_tokens
+
+_TABLE_LINE_RE = re.compile(r"^\s*\|.*\|\s*$")
+_CODE_BLOCK_RE = re.compile(r"```.*?```", re.S)
+_HANDLE_RE = re.compile(r"数据句柄\s*([^\s，。；）)]+@[^\s，。；）)]+)")
+
+# (已有摘要, 需要并入摘要的消息) -> 新摘要
+Summarizer = Callable[[str, List[dict]], str]
+
+
+class MemoryMetrics:
+    """每轮送入智能体的 prompt token 数（历史 + 本轮输入，估算值），以及不做裁剪时的对照值。"""
+
+    def __init__(self, maxlen: int = 1000):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.summaries = 0
+        self.summary_failures = 0
+        self.prompt_tokens: deque = deque(maxlen=maxlen)
+        self.full_tokens: deque = deque(maxlen=maxlen)
+
+    def record_turn(self, prompt_tokens: int, full_tokens: int) -> None:
+        with self._lock:
+            self.turns += 1
+            self.prompt_tokens.append(prompt_tokens)
+            self.full_tokens.append(full_tokens)
+
+    def record_summary(self, ok: bool) -> None:
+        with self._lock:
+            self.summaries += 1
+            self.summary_failures += 0 if ok else 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            tokens = np.array(self.prompt_tokens) if self.prompt_tokens else None
+            return {
+                "turns": self.turns,
+                "summaries": self.summaries,
+                "summary_failures": self.summary_failures,
+                "last_prompt_tokens": int(tokens[-1]) if tokens is not None else None,
+                "prompt_tokens_p50": float(np.percentile(tokens, 50)) if tokens is not None else None,
+                "prompt_tokens_p95": float(np.percentile(tokens, 95)) if tokens is not None else None,
+                "saved_tokens": int(sum(self.full_tokens) - sum(self.prompt_tokens)),
+            }
+
+
+# 进程级的记忆指标，所有会话共用
+memory_metrics = MemoryMetrics()
+
+
+def compact_message(content: str, max_table_rows: int = 3, max_block_tokens: int = 200) -> str:
+    """把回答中的大块工具输出换成简短引用：超过 max_table_rows 行的 Markdown 表格、过长的代码块。
+    回答中出现数据句柄时在引用中保留句柄，后续可据此取回完整数据。"""
+    handles = list(dict.fromkeys(_HANDLE_RE.findall(content)))
+    ref = f"，完整数据见数据句柄 {'、'.join(handles)}" if handles else ""
+
+    def replace_block(match: re.Match) -> str:
+        block = match.group(0)
+        return block if estimate_tokens(block) <= max_block_tokens else f"[代码块已省略{ref}]"
+
+    content = _CODE_BLOCK_RE.sub(replace_block, content)
+    lines, table = [], []
+    for line in content.split("\n") + [""]:
+        if _TABLE_LINE_RE.match(line):
+            table.append(line)
+            continue
+        if table:
+            # 表头与分隔行不计入数据行
+            rows = len(table) - 2
+            lines.extend(table if rows <= max_table_rows else [f"[表格（{rows} 行）已省略{ref}]"])
+            table = []
+        lines.append(line)
+    return "\n".join(lines[:-1])
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # 按字符粗略截断（中文约 1 字 1 token）
+    return text[:max(1, max_tokens)] + "…（已截断）"
+
+
+def _default_summarize(summary: str, messages: List[dict]) -> str:
+    """用轻量模型把较早的对话并入滚动摘要。"""
+    from .llm_adapter import VolcanoLLM
+
+    model_id = os.getenv("MEMORY_SUMMARY_MODEL_ID") or os.getenv("ARK_TITLE_MODEL_ID") or None
+    convo = "\n".join(f"{m.get('role', '')}: {m.get('content', '')}" for m in messages)
+    prompt = (
+        "请将“已有摘要”与“新增对话”合并为一段简洁的中文摘要（不超过200字），保留用户关注的标的、区间、"
+        "结论与待办，不要复述表格数据：\n"
+        f"已有摘要：{summary or '（无）'}\n新增对话：\n{convo}\n只输出摘要本身。"
+    )
+    return VolcanoLLM(streaming=False, model_id=model_id).invoke(prompt).strip()
+
+
+class ConversationMemory:
+    """
+    单个会话的智能体记忆：最近 max_turns 轮在 token 预算内原样保留（大块工具输出换成引用），
+    更早的对话由后台线程增量并入滚动摘要。摘要尚未追上时，用较早几轮的用户问题作为临时提要，不阻塞本轮。
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[Summarizer] = None,
+        max_turns: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        summary_tokens: Optional[int] = None,
+    ):
+        self._summarize = summarize or _default_summarize
+        self.max_turns = max_turns or int(os.getenv("MEMORY_MAX_TURNS", "4"))
+        self.token_budget = token_budget or int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))
+        self.summary_tokens = summary_tokens or int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+        self._lock = threading.Lock()
+        self._summary = ""
+        # 已并入摘要的消息数（从会话开头算起）
+        self._summarized = 0
+        self._pending: Optional[Future] = None
+        self.last_stats: dict = {}
+
+    @property
+    def summary(self) -> str:
+        with self._lock:
+            return self._summary
+
+    def build(self, messages: List[dict], user_input: str = "") -> List[BaseMessage]:
+        """把会话的历史消息（不含本轮输入）转换为送入智能体的 chat_history。"""
+        compacted = [{"role": m.get("role"), "content": compact_message(str(m.get("content", "")))} for m in messages]
+        start = self._window_start(compacted)
+        with self._lock:
+            summary, summarized = self._summary, self._summarized
+        start = max(start, min(summarized, len(compacted)))
+        if summarized < start:
+            self._schedule(messages[summarized:start], start)
+            # 摘要尚未覆盖的较早轮次：临时只保留用户问题
+            gap = [m["content"] for m in compacted[summarized:start] if m["role"] == "user"]
+            if gap:
+                note = "更早的提问：" + "；".join(_truncate(q, 40) for q in gap)
+                summary = f"{summary}\n{note}" if summary else note
+
+        history: List[BaseMessage] = []
+        if summary:
+            history.append(SystemMessage(content=f"此前对话摘要：{_truncate(summary, self.summary_tokens)}"))
+        for m in compacted[start:]:
+            cls = HumanMessage if m["role"] == "user" else AIMessage
+            history.append(cls(content=m["content"]))
+
+        prompt_tokens = sum(estimate_tokens(h.content) for h in history) + estimate_tokens(user_input)
+        full_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages) + estimate_tokens(user_input)
+        self.last_stats = {
+            "prompt_tokens": prompt_tokens,
+            "full_tokens": full_tokens,
+            "verbatim_messages": len(compacted) - start,
+            "summarized_messages": summarized,
+        }
+        memory_metrics.record_turn(prompt_tokens, full_tokens)
+        return history
+
+    def _window_start(self, compacted: List[dict]) -> int:
+        """从末尾向前按“轮”（以用户消息开始）收集，不超过 max_turns 轮与 token 预算；最近一轮总是保留。"""
+        start, turns, tokens = len(compacted), 0, 0
+        i = len(compacted)
+        while i > 0 and turns < self.max_turns:
+            j = i - 1
+            while j > 0 and compacted[j]["role"] != "user":
+                j -= 1
+            turn_tokens = sum(estimate_tokens(m["content"]) for m in compacted[j:i])
+            if turns and tokens + turn_tokens > self.token_budget:
+                break
+            start, i, turns, tokens = j, j, turns + 1, tokens + turn_tokens
+        # 单轮就超出预算时，截断该轮中的长消息
+        if tokens > self.token_budget:
+            per_message = max(50, self.token_budget // max(1, len(compacted) - start))
+            for m in compacted[start:]:
+                m["content"] = _truncate(m["content"], per_message)
+        return start
+
+    def _schedule(self, messages: List[dict], upto: int) -> None:
+        """后台把 messages 并入摘要；同一时间只有一个摘要任务，未覆盖的部分留给下一轮。"""
+        with self._lock:
+            if self._pending is not None and not self._pending.done():
+                return
+            summary = self._summary
+            self._pending = get_blocking_executor().submit(self._update_summary, summary, messages, upto)
+
+    def _update_summary(self, summary: str, messages: List[dict], upto: int) -> None:
+        compacted = [{"role": m.get("role"), "content": compact_message(str(m.get("content", "")))} for m in messages]
+        try:
+            new_summary = self._summarize(summary, compacted)
+            ok = bool(new_summary)
+        except Exception:
+            new_summary, ok = "", False
+        if not ok:
+            # 摘要模型不可用时退回为用户问题的拼接，保证窗口外的对话不会完全丢失
+            questions = "；".join(_truncate(m["content"], 40) for m in compacted if m["role"] == "user")
+            new_summary = "；".join(s for s in (summary, questions) if s)
+        memory_metrics.record_summary(ok)
+        with self._lock:
+            self._summary = _truncate(new_summary, self.summary_tokens * 2)
+            self._summarized = max(self._summarized, upto)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """等待进行中的摘要任务完成（用于测试与基准）。"""
+        pending = self._pending
+        if pending is not None:
+            pending.result(timeout)
@@ -0,0 +1,161 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from langchain.agents import AgentExecutor
+from langchain.agents.agent import ExceptionTool, RunnableMultiActionAgent
+from langchain.agents.output_parsers import JSONAgentOutputParser
+from langchain.tools.render import render_text_description_and_args
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.callbacks import CallbackManagerForChainRun
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers.json import parse_json_markdown
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.tools import BaseTool
+
+# 同一步内多个工具调用共用的线程池（工具本身是阻塞 I/O：取数、Embedding、LLM）
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _tool_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("AGENT_TOOL_WORKERS", "8")), thread_name_prefix="agent-tool"
+                )
+    return _pool
+
+
+class MultiActionOutputParser(JSONAgentOutputParser):
+    """
+    在结构化聊天 JSON 动作的基础上接受动作列表：列表中的工具调用在同一步中并发执行，
+    第一个动作携带 LLM 原文作为 log，其余为空（见 format_parallel_scratchpad）。单个动作与最终回答的解析不变。
+    """
+
+    def parse(self, text: str) -> Union[List[AgentAction], AgentAction, AgentFinish]:
+        try:
+            response = parse_json_markdown(text)
+        except Exception:
+            response = None
+        if isinstance(response, list):
+            try:
+                items = [item for item in response if item["action"] != "Final Answer"]
+                actions = [
+                    AgentAction(item["action"], item.get("action_input", {}), text if i == 0 else "")
+                    for i, item in enumerate(items)
+                ]
+            except Exception as e:
+                raise OutputParserException(f"Could not parse LLM output: {text}") from e
+            if actions:
+                return actions
+        return super().parse(text)
+
+    @property
+    def _type(self) -> str:
+        return "json-multi-action-agent"
+
+
+def format_parallel_scratchpad(intermediate_steps: List[Tuple[AgentAction, str]]) -> str:
+    """
+    与 format_log_to_str 相同的 Thought/Action/Observation 格式；同一步的多个工具调用只写一次 LLM 原文，
+    各自的结果依次写成 "Observation: [工具名] ..."，最后统一接一个 Thought。
+    """
+    thoughts = ""
+    for i, (action, observation) in enumerate(intermediate_steps):
+        batched = not action.log or (i + 1 < len(intermediate_steps) and not intermediate_steps[i + 1][0].log)
+        if action.log:
+            if i:
+                thoughts += "\nThought: "
+            thoughts += action.log
+        thoughts += f"\nObservation: [{action.tool}] {observation}" if batched else f"\nObservation: {observation}"
+    return thoughts + "\nThought: " if intermediate_steps else thoughts
+
+
+def create_parallel_agent(llm, tools: List[BaseTool], prompt) -> RunnableMultiActionAgent:
+    """与 create_structured_chat_agent 相同的链路，换用多动作解析与合并的 scratchpad。"""
+    prompt = prompt.partial(
+        tools=render_text_description_and_args(list(tools)),
+        tool_names=", ".join(t.name for t in tools),
+    )
+    runnable = (
+        RunnablePassthrough.assign(agent_scratchpad=lambda x: format_parallel_scratchpad(x["intermediate_steps"]))
+        | prompt
+        | llm.bind(stop=["Observation"])
+        | MultiActionOutputParser()
+    )
+    return RunnableMultiActionAgent(runnable=runnable, stream_runnable=True)
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """
+    同一步的多个工具调用在线程池中并发执行，结果按动作顺序返回（异步路径 LangChain 已用 asyncio.gather 并发）。
+    规划与输出解析失败的处理与 AgentExecutor 相同。
+    """
+
+    def _iter_next_step(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Iterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        try:
+            intermediate_steps = self._prepare_intermediate_steps(intermediate_steps)
+            output = self.agent.plan(
+                intermediate_steps,
+                callbacks=run_manager.get_child() if run_manager else None,
+                **inputs,
+            )
+        except OutputParserException as e:
+            if self.handle_parsing_errors is False:
+                raise ValueError(
+                    "An output parsing error occurred. "
+                    "In order to pass this error back to the agent and have it try "
+                    "again, pass `handle_parsing_errors=True` to the AgentExecutor. "
+                    f"This is the error: {str(e)}"
+                )
+            text = str(e)
+            if self.handle_parsing_errors is True:
+                if e.send_to_llm:
+                    observation, text = str(e.observation), str(e.llm_output)
+                else:
+                    observation = "Invalid or incomplete response"
+            elif isinstance(self.handle_parsing_errors, str):
+                observation = self.handle_parsing_errors
+            else:
+                observation = self.handle_parsing_errors(e)
+            output = AgentAction("_Exception", observation, text)
+            if run_manager:
+                run_manager.on_agent_action(output, color="green")
+            observation = ExceptionTool().run(
+                output.tool_input,
+                verbose=self.verbose,
+                color=None,
+                callbacks=run_manager.get_child() if run_manager else None,
+                **self.agent.tool_run_logging_kwargs(),
+            )
+            yield AgentStep(action=output, observation=observation)
+            return
+
+        if isinstance(output, AgentFinish):
+            yield output
+            return
+        actions = [output] if isinstance(output, AgentAction) else output
+        yield from actions
+        if len(actions) == 1:
+            yield self._perform_agent_action(name_to_tool_map, color_mapping, actions[0], run_manager)
+            return
+        # 每个工具在调用方的上下文中执行，追踪的 span 都挂在当前智能体步骤下
+        futures = [
+            _tool_pool().submit(contextvars.copy_context().run, self._perform_agent_action,
+                                name_to_tool_map, color_mapping, action, run_manager)
+            for action in actions
+        ]
+        for future in futures:
+            yield future.result()
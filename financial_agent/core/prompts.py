@@ -0,0 +1,88 @@
+import os
+
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+# 内置的 LangChain Hub 提示模板 hwchase17/structured-chat-agent，启动时无需联网拉取
+STRUCTURED_CHAT_SYSTEM = '''Respond to the human as helpfully and accurately as possible. You have access to the following tools:
+
+{tools}
+
+Use a json blob to specify a tool by providing an action key (tool name) and an action_input key (tool input).
+
+Valid "action" values: "Final Answer" or {tool_names}
+
+Provide only ONE action per $JSON_BLOB, as shown:
+
+```
+{{
+  "action": $TOOL_NAME,
+  "action_input": $INPUT
+}}
+```
+
+Follow this format:
+
+Question: input question to answer
+Thought: consider previous and subsequent steps
+Action:
+```
+$JSON_BLOB
+```
+Observation: action result
+... (repeat Thought/Action/Observation N times)
+Thought: I know what to respond
+Action:
+```
+{{
+  "action": "Final Answer",
+  "action_input": "Final response to human"
+}}
+
+Begin! Reminder to ALWAYS respond with a valid json blob of a single action. Use tools if necessary. Respond directly if appropriate. Format is Action:```$JSON_BLOB```then Observation'''
+
+# 并发工具调用模式：允许在一步中以 JSON 列表给出多个互不依赖的工具调用
+STRUCTURED_CHAT_PARALLEL_SYSTEM = STRUCTURED_CHAT_SYSTEM.replace(
+    '''Follow this format:''',
+    '''When the question needs several tool calls that do not depend on each other's results (for example price data for a stock and the definition of a term), request them together as a JSON list of actions. They run at the same time and their results come back in the same order, each as "Observation: [tool name] result":
+
+```
+[
+  {{
+    "action": $TOOL_NAME,
+    "action_input": $INPUT
+  }},
+  {{
+    "action": $TOOL_NAME,
+    "action_input": $INPUT
+  }}
+]
+```
+
+Follow this format:''',
+).replace(
+    "respond with a valid json blob of a single action.",
+    "respond with a valid json blob of a single action, or a json list of independent tool actions.",
+)
+
+STRUCTURED_CHAT_HUMAN = '''{input}
+
+{agent_scratchpad}
+
+ (reminder to respond in a JSON blob no matter what)'''
+
+
+def structured_chat_prompt(parallel: bool = False) -> ChatPromptTemplate:
+    """结构化聊天 Agent 的提示模板；parallel 为 True 时允许一步给出多个工具调用。
+    设置 AGENT_PROMPT_FROM_HUB=1 时改为从 Hub 拉取（失败则回退到内置版本，Hub 版本不含并发调用说明）。
+    """
+    if os.getenv("AGENT_PROMPT_FROM_HUB") == "1":
+        try:
+            from langchain import hub
+            return hub.pull("hwchase17/structured-chat-agent")
+        except Exception:
+            pass
+    return ChatPromptTemplate.from_messages([
+        ("system", STRUCTURED_CHAT_PARALLEL_SYSTEM if parallel else STRUCTURED_CHAT_SYSTEM),
+        MessagesPlaceholder("chat_history", optional=True),
+        ("human", STRUCTURED_CHAT_HUMAN),
+    ])
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """令牌桶限流：平均每秒 rate 个请求，允许 capacity 个突发。rate<=0 表示不限流。
+    同步与异步调用方共用同一个桶。
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float) -> float:
+        """预扣令牌，返回需要等待的秒数（令牌允许透支，等待期间由后续补充抵消）。"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """阻塞直到取得令牌，返回实际等待时间。"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+_buckets: dict = {}
+_buckets_lock = threading.Lock()
+
+
+def shared_bucket(name: str, rate: float, capacity: float | None = None) -> TokenBucket:
+    """按名称获取进程级共享的令牌桶，使同一上游的所有调用方共用一个配额。"""
+    with _buckets_lock:
+        bucket = _buckets.get(name)
+        if bucket is None or bucket.rate != rate or (capacity is not None and bucket.capacity != capacity):
+            bucket = _buckets[name] = TokenBucket(rate, capacity)
+        return bucket
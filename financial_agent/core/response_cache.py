@@ -0,0 +1,300 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import deque
+from datetime import date
+from pathlib import Path
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from .router import extract_symbols, parse_date_range
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parents[1] / "cache" / "responses.sqlite3"
+
+# UI 注入的日期前缀不属于问题本身
+_DATE_PREFIX_RE = re.compile(r"^当前日期是\s*\S+?。用户的请求是：")
+_PUNCT_RE = re.compile(r"[\s\W_]+", re.U)
+# 依赖上下文的追问（指代前文）不走缓存
+_CONTEXT_RE = re.compile(r"(它|他们|这只|这个|那个|该股|上面|上述|刚才|之前|继续|再来)")
+# 行情、价格类问题的答案随时间变化
+_TIME_SENSITIVE_RE = re.compile(
+    r"(\d{6}|\.HK|行情|股价|价格|报价|涨跌|收盘|开盘|日K|K线|走势|最新|今天|今日|现在|目前|近期|最近|本周|本月)"
+)
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def normalize_question(text: str) -> str:
+    """缓存键用的规范化问题：去掉日期前缀、全角转半角、小写、去除空白与标点。"""
+    text = _DATE_PREFIX_RE.sub("", text.strip())
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _PUNCT_RE.sub("", text)
+
+
+def question_signature(question: str, today: Optional[date] = None) -> str:
+    """
+    问题中的标的代码、日期区间与数字（沿用快速路由的解析）。语义命中要求两个问题的签名相同：
+    只差日期或代码的问题向量几乎一样，答案却不同。
+    """
+    text = unicodedata.normalize("NFKC", _DATE_PREFIX_RE.sub("", question.strip()))
+    return json.dumps({
+        "symbols": sorted(extract_symbols(text)),
+        "dates": parse_date_range(text, today or date.today()),
+        "numbers": sorted(set(_NUMBER_RE.findall(text))),
+    }, ensure_ascii=False)
+
+
+def is_context_dependent(question: str) -> bool:
+    return bool(_CONTEXT_RE.search(question))
+
+
+def is_time_sensitive(question: str, tools_used: Iterable[str] = (), static_tools: Iterable[str] = ()) -> bool:
+    """调用过知识库以外的工具（取数、指标）或问题本身涉及行情时，答案视为时效性内容。"""
+    static_tools = set(static_tools)
+    if any(tool not in static_tools for tool in tools_used):
+        return True
+    return bool(_TIME_SENSITIVE_RE.search(_DATE_PREFIX_RE.sub("", question)))
+
+
+class CachedResponse(NamedTuple):
+    answer: str
+    similarity: float
+    time_sensitive: bool
+    age: float
+
+
+class ResponseCacheMetrics:
+    """命中率（精确命中 / 语义命中）与查询耗时（保留最近 1000 次）。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.invalidated = 0
+        self.lookup_latencies: deque = deque(maxlen=1000)
+
+    def record_lookup(self, latency: float, kind: Optional[str]) -> None:
+        with self._lock:
+            if kind == "exact":
+                self.exact_hits += 1
+            elif kind == "semantic":
+                self.semantic_hits += 1
+            else:
+                self.misses += 1
+            self.lookup_latencies.append(latency)
+
+    def record(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + count)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            latencies = np.array(self.lookup_latencies) if self.lookup_latencies else None
+            return {
+                "lookups": lookups,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "bypassed": self.bypassed,
+                "stores": self.stores,
+                "invalidated": self.invalidated,
+                "lookup_latency_p50": float(np.percentile(latencies, 50)) if latencies is not None else None,
+                "lookup_latency_p95": float(np.percentile(latencies, 95)) if latencies is not None else None,
+            }
+
+
+class ResponseCache:
+    """
+    智能体前置的语义回答缓存（SQLite 持久化，向量常驻内存）。规范化问题完全相同时直接命中，
+    否则按问题向量的余弦相似度查找，不低于 threshold 且标的、日期与数字一致（见 question_signature）才命中。行情类答案与知识类答案分别使用
+    quote_ttl / static_ttl；知识库指纹变化时清空基于旧知识库的条目。可在多线程间共用。
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        kb_fingerprint: Optional[Callable[[], Optional[str]]] = None,
+        path: Optional[Path] = None,
+        threshold: Optional[float] = None,
+        quote_ttl: Optional[float] = None,
+        static_ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.embeddings = embeddings
+        self.kb_fingerprint = kb_fingerprint or (lambda: None)
+        self.path = Path(path or os.getenv("RESPONSE_CACHE_PATH") or DEFAULT_CACHE_PATH)
+        self.threshold = threshold if threshold is not None else float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92"))
+        self.quote_ttl = quote_ttl if quote_ttl is not None else float(os.getenv("RESPONSE_CACHE_QUOTE_TTL", "300"))
+        self.static_ttl = static_ttl if static_ttl is not None else float(os.getenv("RESPONSE_CACHE_STATIC_TTL", "604800"))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+        self.metrics = ResponseCacheMetrics()
+        self._model = str(getattr(embeddings, "model", None) or type(embeddings).__name__)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " question TEXT PRIMARY KEY, answer TEXT NOT NULL, time_sensitive INTEGER NOT NULL,"
+            " kb TEXT, model TEXT NOT NULL, vector BLOB, created REAL NOT NULL, expires REAL NOT NULL,"
+            " signature TEXT)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(responses)")}
+        if "signature" not in columns:
+            # 旧库的条目没有签名，只能精确命中
+            self._conn.execute("ALTER TABLE responses ADD COLUMN signature TEXT")
+        self._kb: Optional[str] = None
+        self._load()
+
+    def _load(self) -> None:
+        """把未过期、同一 Embedding 模型的条目载入内存（问题 -> 行号，及单位化的向量矩阵）。"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE expires <= ? OR model != ?", (now, self._model))
+            rows = self._conn.execute(
+                "SELECT question, answer, time_sensitive, kb, vector, created, expires, signature FROM responses"
+                " ORDER BY created DESC LIMIT ?", (self.max_entries,)
+            ).fetchall()
+            self._entries: List[dict] = []
+            self._by_question = {}
+            vectors = []
+            for question, answer, time_sensitive, kb, blob, created, expires, signature in rows:
+                self._by_question[question] = len(self._entries)
+                self._entries.append({"question": question, "answer": answer, "time_sensitive": bool(time_sensitive),
+                                      "kb": kb, "created": created, "expires": expires, "signature": signature})
+                vectors.append(np.frombuffer(blob, dtype=np.float32) if blob else None)
+            dim = next((len(v) for v in vectors if v is not None), 0)
+            self._matrix = np.zeros((len(vectors), dim), dtype=np.float32)
+            for i, v in enumerate(vectors):
+                if v is not None and len(v) == dim:
+                    self._matrix[i] = v
+
+    def _check_kb(self) -> None:
+        """知识库指纹变化时，清除基于旧知识库生成的条目。"""
+        kb = self.kb_fingerprint()
+        if kb is None or kb == self._kb:
+            return
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM responses WHERE kb IS NOT ?", (kb,))
+        self._kb = kb
+        if cursor.rowcount:
+            self.metrics.record("invalidated", cursor.rowcount)
+            self._load()
+
+    def lookup(self, question: str) -> Optional[CachedResponse]:
+        """查找可复用的回答；依赖上下文的追问直接返回 None。"""
+        if is_context_dependent(question):
+            self.metrics.record("bypassed")
+            return None
+        started = time.perf_counter()
+        self._check_kb()
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            index = self._by_question.get(key)
+        similarity, kind = 1.0, "exact"
+        if index is None:
+            index, similarity, kind = self._nearest(question)
+        if index is not None:
+            with self._lock:
+                entry = self._entries[index] if index < len(self._entries) else None
+            if entry is None or entry["expires"] <= now:
+                index = None
+        self.metrics.record_lookup(time.perf_counter() - started, kind if index is not None else None)
+        if index is None:
+            return None
+        return CachedResponse(entry["answer"], similarity, entry["time_sensitive"], now - entry["created"])
+
+    def _nearest(self, question: str):
+        """相似度不低于 threshold、且签名相同的最相似条目。"""
+        with self._lock:
+            matrix = self._matrix
+            signatures = [entry.get("signature") for entry in self._entries]
+        if not len(matrix):
+            return None, 0.0, None
+        query = self._embed(question)
+        if query is None or len(query) != matrix.shape[1]:
+            return None, 0.0, None
+        scores = matrix @ query
+        signature = question_signature(question)
+        for best in np.argsort(-scores):
+            if scores[best] < self.threshold:
+                break
+            if best < len(signatures) and signatures[best] == signature:
+                return int(best), float(scores[best]), "semantic"
+        return None, float(scores.max()), None
+
+    def store(self, question: str, answer: str, time_sensitive: bool) -> None:
+        """缓存一条回答；空回答与依赖上下文的追问不缓存。"""
+        if not answer or not answer.strip() or is_context_dependent(question):
+            return
+        self._check_kb()
+        key = normalize_question(question)
+        vector = self._embed(question)
+        now = time.time()
+        entry = {"question": key, "answer": answer, "time_sensitive": time_sensitive, "kb": self._kb,
+                 "created": now, "expires": now + (self.quote_ttl if time_sensitive else self.static_ttl),
+                 "signature": question_signature(question)}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (question, answer, time_sensitive, kb, model, vector, created, expires, signature)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, answer, int(time_sensitive), self._kb, self._model,
+                 vector.tobytes() if vector is not None else None, now, entry["expires"], entry["signature"]),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            evict = self.max_entries > 0 and count > self.max_entries
+            if evict:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE rowid IN (SELECT rowid FROM responses ORDER BY expires LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            elif vector is None or not self._matrix.shape[1] or len(vector) == self._matrix.shape[1]:
+                # 增量更新内存中的条目与向量矩阵
+                row = vector if vector is not None else np.zeros(self._matrix.shape[1], dtype=np.float32)
+                index = self._by_question.get(key)
+                if index is None:
+                    self._by_question[key] = len(self._entries)
+                    self._entries.append(entry)
+                    matrix = self._matrix if self._matrix.shape[1] else np.zeros((len(self._matrix), len(row)), np.float32)
+                    self._matrix = np.vstack([matrix, row[None, :]])
+                else:
+                    self._entries[index] = entry
+                    self._matrix = self._matrix.copy()
+                    self._matrix[index] = row
+                evict = False
+            else:
+                evict = True
+        self.metrics.record("stores")
+        if evict:
+            self._load()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+        self._load()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        """问题的单位向量；Embedding 调用失败时返回 None（只做精确匹配，不影响回答）。"""
+        try:
+            v = np.asarray(self.embeddings.embed_query(_DATE_PREFIX_RE.sub("", question)), dtype=np.float32)
+        except Exception:
+            return None
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else None
@@ -0,0 +1,226 @@
+import re
+from datetime import date, timedelta
+from typing import Any, Iterator, List, NamedTuple, Optional, Tuple
+
+from ..data.providers import is_china_equity, to_ts_code
+from .tracing import get_tracer
+
+# A 股（可带交易所后缀）、港股、美股代码
+_CN_SYMBOL_RE = re.compile(r"(?<![\d.])(\d{6}(?:\.(?:SH|SZ|SS|BJ))?)(?![\d])", re.I)
+_HK_SYMBOL_RE = re.compile(r"(?<![\d.])(\d{4,5}\.HK)(?![A-Za-z])", re.I)
+_US_SYMBOL_RE = re.compile(r"(?<![A-Za-z.$])(\$?)([A-Z]{1,5}(?:\.[A-Z])?)(?![A-Za-z])")
+# 大写英文词只有带 $ 前缀、属于常见美股代码，或问题中明确提到股票时才当作代码
+_US_CONTEXT_RE = re.compile(r"(股价|股票|美股|个股|代码|ticker|NASDAQ|NYSE|纳斯达克|纽交所)", re.I)
+_KNOWN_US_TICKERS = {"AAPL", "MSFT", "GOOGL", "GOOG", "AMZN", "META", "NVDA", "TSLA", "NFLX", "AMD", "INTC", "BABA",
+                     "JD", "PDD", "BIDU", "NIO", "TSM", "BRK.B", "JPM", "KO", "DIS", "NKE"}
+_DATE = r"(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})日?"
+_RANGE_RE = re.compile(_DATE + r"\s*(?:到|至|~|-|—|－)\s*" + _DATE)
+_RECENT_RE = re.compile(r"(?:最近|近|过去)\s*([一二两三四五六七八九十\d]+|半)?\s*(?:个)?(天|日|周|星期|月|季度|年)")
+# 像是相对区间、但 _RECENT_RE 解析不了的说法（如“近几个月”“前一段时间”），交给智能体
+_RELATIVE_RE = re.compile(r"(?:最近|近|过去|前)\s*\S{0,3}?(?:天|日|周|星期|月|季|年)")
+_CN_NUMBERS = {"一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9, "十": 10}
+
+_QUOTE_RE = re.compile(r"(股价|行情|日K|K线|走势|收盘价?|开盘价?|价格|涨跌|成交量|表现)", re.I)
+_COMPARE_RE = re.compile(r"(对比|比较|相比|谁更|哪个)")
+_INDICATOR_RE = re.compile(r"(?<![A-Za-z])(?:MACD|KDJ|RSI|BOLL|MA|EMA|ATR)(?![A-Za-z])|布林|均线", re.I)
+_GLOSSARY_RE = re.compile(
+    r"^(?:请问)?(?:什么是|何为|解释一下|解释)\s*(?P<a>.+?)[？?。!！]*$"
+    r"|^(?:请问)?(?P<b>.+?)(?:是什么意思|是什么|指什么|的定义|的含义|的意思)[？?。!！]*$"
+)
+# 需要推理、建议或依赖上下文的问题交给完整的智能体
+_AGENT_ONLY_RE = re.compile(r"(为什么|原因|建议|推荐|预测|能不能买|值得|怎么看|分析一下|策略|它|这只|该股|上面|刚才|继续)")
+# 形似美股代码、实为指标或术语的大写词
+_NOT_TICKERS = {"MACD", "KDJ", "RSI", "BOLL", "MA", "EMA", "ATR", "PE", "PB", "ROE", "ROA", "EPS", "ETF", "IPO",
+                "K", "A", "H", "GDP", "CPI", "PPI", "AI", "OK", "VS", "USD", "CNY", "RMB", "HKD", "CEO", "CFO", "ESG"}
+_INDICATOR_ALIASES = {"布林": "BOLL", "均线": "MA"}
+
+_DATE_PREFIX_RE = re.compile(r"^当前日期是\s*\S+?。用户的请求是：")
+
+
+class Route(NamedTuple):
+    """快速路径：kind 为 quote / batch / indicator / glossary。"""
+    kind: str
+    symbols: Tuple[str, ...] = ()
+    start_date: str = ""
+    end_date: str = ""
+    indicators: Tuple[str, ...] = ()
+    term: str = ""
+
+
+def _cn_number(text: Optional[str]) -> float:
+    if not text:
+        return 1
+    if text == "半":
+        return 0.5
+    if text.isdigit():
+        return int(text)
+    if text.startswith("十"):
+        return 10 + _CN_NUMBERS.get(text[1:], 0)
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        return _CN_NUMBERS.get(tens, 1) * 10 + _CN_NUMBERS.get(ones, 0)
+    return _CN_NUMBERS.get(text, 1)
+
+
+def parse_date_range(text: str, today: date, default_days: int = 30) -> Optional[Tuple[str, str]]:
+    """
+    解析显式区间（2024-01-01 到 2024-03-31）或相对区间（最近三个月、最近半年、今年以来）；都没有时取最近 default_days 天。
+    日期不合法（如 2024-02-30）或相对区间无法解析时返回 None。
+    """
+    m = _RANGE_RE.search(text)
+    if m:
+        y1, m1, d1, y2, m2, d2 = (int(g) for g in m.groups())
+        try:
+            return date(y1, m1, d1).isoformat(), date(y2, m2, d2).isoformat()
+        except ValueError:
+            return None
+    m = _RECENT_RE.search(text)
+    if m:
+        n, unit = _cn_number(m.group(1)), m.group(2)
+        days = int({"天": 1, "日": 1, "周": 7, "星期": 7, "月": 30, "季度": 91, "年": 365}[unit] * n)
+        return (today - timedelta(days=max(1, days))).isoformat(), today.isoformat()
+    if _RELATIVE_RE.search(text):
+        return None
+    if "今年" in text:
+        return date(today.year, 1, 1).isoformat(), today.isoformat()
+    if "本月" in text or "这个月" in text:
+        return today.replace(day=1).isoformat(), today.isoformat()
+    return (today - timedelta(days=default_days)).isoformat(), today.isoformat()
+
+
+def extract_symbols(text: str) -> List[str]:
+    """
+    按出现顺序提取标的代码：A 股须能换算为 ts_code；大写英文词须带 $ 前缀、属于常见美股代码，
+    或问题中明确提到股票且不是常见指标与术语。
+    """
+    found = []
+    for m in _HK_SYMBOL_RE.finditer(text):
+        found.append((m.start(), m.group(1).upper()))
+    for m in _CN_SYMBOL_RE.finditer(_RANGE_RE.sub(" ", text)):
+        symbol = m.group(1).upper()
+        if is_china_equity(symbol) and to_ts_code(symbol):
+            found.append((m.start(), symbol))
+    us_context = bool(_US_CONTEXT_RE.search(text))
+    for m in _US_SYMBOL_RE.finditer(text):
+        symbol = m.group(2)
+        if m.group(1) or symbol in _KNOWN_US_TICKERS or (us_context and symbol not in _NOT_TICKERS):
+            found.append((m.start(), symbol))
+    symbols = []
+    for _, symbol in sorted(found):
+        if symbol not in symbols:
+            symbols.append(symbol)
+    return symbols
+
+
+class FastPathRouter:
+    """
+    规则路由：行情、指标与名词解释类的明确问题直接调用对应工具，再用一次模型调用组织回答
+    （名词解释由知识库工具自身的一次调用完成），不经过结构化聊天智能体的多轮 JSON 动作循环。
+    无法确定的问题返回 None，交给完整智能体处理。
+    """
+
+    def __init__(self, llm, data_tool=None, batch_tool=None, indicator_tool=None, kb_tool=None, default_days: int = 30):
+        self.llm = llm
+        self.data_tool = data_tool
+        self.batch_tool = batch_tool
+        self.indicator_tool = indicator_tool
+        self.kb_tool = kb_tool
+        self.default_days = default_days
+
+    @classmethod
+    def from_tools(cls, tools: List[Any], llm, **kwargs: Any) -> "FastPathRouter":
+        """从智能体的工具列表中按类型取出各工具（与智能体共用缓存与数据源调度）。"""
+        from ..tools.financial_data_tool import BatchFinancialDataTool, FinancialDataTool
+        from ..tools.indicator_tool import TechnicalIndicatorTool
+        from ..tools.knowledge_base_tool import KnowledgeBaseTool
+
+        by_type = {type(t): t for t in tools}
+        return cls(
+            llm,
+            data_tool=by_type.get(FinancialDataTool),
+            batch_tool=by_type.get(BatchFinancialDataTool),
+            indicator_tool=by_type.get(TechnicalIndicatorTool),
+            kb_tool=by_type.get(KnowledgeBaseTool),
+            **kwargs,
+        )
+
+    def match(self, question: str, today: Optional[date] = None) -> Optional[Route]:
+        text = _DATE_PREFIX_RE.sub("", question).strip()
+        if not text or _AGENT_ONLY_RE.search(text):
+            return None
+        today = today or date.today()
+        symbols = extract_symbols(text)
+        if symbols:
+            dates = parse_date_range(text, today, self.default_days)
+            if dates is None:
+                return None
+            start_date, end_date = dates
+            indicators = tuple(dict.fromkeys(
+                _INDICATOR_ALIASES.get(m.group(0), m.group(0).upper()) for m in _INDICATOR_RE.finditer(text)
+            ))
+            if indicators and self.indicator_tool is not None:
+                return Route("indicator", tuple(symbols), start_date, end_date, indicators=indicators)
+            if not _QUOTE_RE.search(text) and not _RANGE_RE.search(text):
+                return None
+            if len(symbols) > 1 or _COMPARE_RE.search(text):
+                if len(symbols) > 1 and self.batch_tool is not None:
+                    return Route("batch", tuple(symbols), start_date, end_date)
+                return None
+            if self.data_tool is not None:
+                return Route("quote", tuple(symbols), start_date, end_date)
+            return None
+        m = _GLOSSARY_RE.match(text)
+        if m and self.kb_tool is not None:
+            term = (m.group("a") or m.group("b") or "").strip()
+            # 只接受短小的术语，排除句子与关于对话本身的问题
+            if term and len(term) <= 15 and not re.search(r"[，,；;你我]", term) and not _QUOTE_RE.search(term):
+                return Route("glossary", term=term)
+        return None
+
+    def tool_name(self, route: Route) -> str:
+        return self._tool(route).name
+
+    def _tool(self, route: Route):
+        return {"quote": self.data_tool, "batch": self.batch_tool,
+                "indicator": self.indicator_tool, "glossary": self.kb_tool}[route.kind]
+
+    def call_tool(self, route: Route, question: str) -> str:
+        """直接调用路由到的工具，返回工具输出。"""
+        with get_tracer().span("tool.call", self.tool_name(route), path="fast"):
+            return self._call_tool(route, question)
+
+    def _call_tool(self, route: Route, question: str) -> str:
+        if route.kind == "quote":
+            return self.data_tool.run({"symbol": route.symbols[0], "start_date": route.start_date,
+                                       "end_date": route.end_date})
+        if route.kind == "batch":
+            return self.batch_tool.run({"symbols": list(route.symbols), "start_date": route.start_date,
+                                        "end_date": route.end_date})
+        if route.kind == "indicator":
+            return self.indicator_tool.run({"symbols": list(route.symbols), "start_date": route.start_date,
+                                            "end_date": route.end_date, "indicators": list(route.indicators)})
+        return self.kb_tool.run(_DATE_PREFIX_RE.sub("", question).strip())
+
+    def answer_prompt(self, question: str, observation: str) -> str:
+        return (
+            "请根据以下工具返回的数据，用中文简洁地回答用户的问题。只使用给出的数据，不要编造；"
+            "数据获取失败时如实说明。\n"
+            f"数据：\n{observation}\n"
+            f"问题：{_DATE_PREFIX_RE.sub('', question).strip()}\n"
+            "回答："
+        )
+
+    def stream(self, route: Route, question: str) -> Iterator[str]:
+        """执行快速路径并流式输出回答：名词解释直接返回知识库工具的回答，其余调用一次模型组织数据。"""
+        observation = self.call_tool(route, question)
+        if route.kind == "glossary":
+            yield observation
+            return
+        yield from self.llm.stream(self.answer_prompt(question, observation))
+
+    def run(self, question: str, today: Optional[date] = None) -> Optional[str]:
+        """可走快速路径时返回完整回答，否则返回 None。"""
+        route = self.match(question, today)
+        if route is None:
+            return None
+        return "".join(self.stream(route, question))
@@ -0,0 +1,190 @@
+import contextvars
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterator, Optional
+
+import numpy as np
+
+from .streaming import _DONE, AgentStreamEvent, StreamingMetrics, iter_agent_events, run_agent, streaming_metrics
+
+
+class ServerBusy(RuntimeError):
+    """排队已满或该用户已有请求在处理，拒绝新的请求。"""
+
+
+class ServingMetrics:
+    """请求数、拒绝数、排队耗时与执行耗时（保留最近 1000 次）。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.completed = 0
+        self.failed = 0
+        self.queue_waits: deque = deque(maxlen=1000)
+        self.run_times: deque = deque(maxlen=1000)
+
+    def record(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + count)
+
+    def record_run(self, waited: float, elapsed: float, ok: bool) -> None:
+        with self._lock:
+            self.queue_waits.append(waited)
+            self.run_times.append(elapsed)
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            waits = np.array(self.queue_waits) if self.queue_waits else None
+            runs = np.array(self.run_times) if self.run_times else None
+            return {
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+                "completed": self.completed,
+                "failed": self.failed,
+                "queue_wait_p50": float(np.percentile(waits, 50)) if waits is not None else None,
+                "queue_wait_p95": float(np.percentile(waits, 95)) if waits is not None else None,
+                "run_time_p50": float(np.percentile(runs, 50)) if runs is not None else None,
+                "run_time_p95": float(np.percentile(runs, 95)) if runs is not None else None,
+            }
+
+
+class AgentJob:
+    """一次排队中的智能体调用；事件由工作线程放入 events，调用方通过 AgentServer.stream 消费。"""
+
+    def __init__(self, user_id: str, inputs: dict):
+        self.user_id = user_id
+        self.inputs = inputs
+        self.events: queue.Queue = queue.Queue()
+        self.submitted = time.perf_counter()
+        self.cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """放弃尚未开始的请求；已在执行的请求会跑完，但结果无人消费。"""
+        self.cancelled.set()
+
+
+class AgentServer:
+    """
+    多用户服务层：固定数量的工作线程执行智能体调用，每个用户一个队列，工作线程在有请求的用户之间轮转取活，
+    单个用户连续提问不会挤占其他用户。排队总数超过 max_queue 或单个用户未完成的请求达到 max_per_user 时，
+    submit 抛出 ServerBusy，界面给出“稍后再试”的提示。对方舟、Tushare、Yahoo 的并发另由 core/upstream 限制。
+    """
+
+    def __init__(self, agent, workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 max_per_user: Optional[int] = None):
+        self.agent = agent
+        self.workers = workers if workers is not None else int(os.getenv("AGENT_WORKERS", "8"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("AGENT_MAX_QUEUE", "32"))
+        self.max_per_user = max_per_user if max_per_user is not None else int(os.getenv("AGENT_MAX_PER_USER", "2"))
+        self.metrics = ServingMetrics()
+        self._cond = threading.Condition()
+        # 用户 -> 待处理请求；顺序即轮转顺序
+        self._queues: "OrderedDict[str, Deque[AgentJob]]" = OrderedDict()
+        self._queued = 0
+        self._running: Dict[str, int] = {}
+        self._stopped = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"agent-worker-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, user_id: str, inputs: dict) -> AgentJob:
+        job = AgentJob(user_id, inputs)
+        with self._cond:
+            if self._stopped:
+                raise ServerBusy("服务正在关闭")
+            pending = len(self._queues.get(user_id, ())) + self._running.get(user_id, 0)
+            if pending >= self.max_per_user:
+                self.metrics.record("rejected")
+                raise ServerBusy("您还有请求正在处理，请等待回答完成后再提问。")
+            if self._queued >= self.max_queue:
+                self.metrics.record("rejected")
+                raise ServerBusy("当前咨询人数较多，请稍后再试。")
+            idle = self.workers - sum(self._running.values()) - self._queued
+            # 没有空闲工作线程时告知排在前面的请求数
+            ahead = None if idle > 0 else self._queued
+            self._queues.setdefault(user_id, deque()).append(job)
+            self._queued += 1
+            self.metrics.record("submitted")
+            self._cond.notify()
+        if ahead is not None:
+            job.events.put(AgentStreamEvent("queued", ahead))
+        return job
+
+    def stream(self, user_id: str, inputs: dict, metrics: Optional[StreamingMetrics] = streaming_metrics
+               ) -> Iterator[AgentStreamEvent]:
+        """提交并按到达顺序产出事件（首字耗时含排队时间）；调用方中途放弃时撤销尚未开始的请求。"""
+        job = self.submit(user_id, inputs)
+        try:
+            yield from iter_agent_events(job.events, job.submitted, metrics)
+        finally:
+            job.cancel()
+
+    def _next_job(self) -> AgentJob:
+        """轮转：取队首用户的第一个请求，该用户还有请求时排到队尾。调用方持有锁。"""
+        user_id, jobs = next(iter(self._queues.items()))
+        job = jobs.popleft()
+        if jobs:
+            self._queues.move_to_end(user_id)
+        else:
+            del self._queues[user_id]
+        self._queued -= 1
+        return job
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queues and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                job = self._next_job()
+                self._running[job.user_id] = self._running.get(job.user_id, 0) + 1
+            try:
+                if job.cancelled.is_set():
+                    self.metrics.record("cancelled")
+                    continue
+                started = time.perf_counter()
+                job.events.put(AgentStreamEvent("started"))
+                # 每个请求在独立的上下文中执行，追踪的当前 span 不会串到下一个请求
+                ok = contextvars.Context().run(run_agent, self.agent, job.inputs, job.events)
+                self.metrics.record_run(started - job.submitted, time.perf_counter() - started, ok)
+            finally:
+                with self._cond:
+                    self._running[job.user_id] -= 1
+                    if not self._running[job.user_id]:
+                        del self._running[job.user_id]
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            state = {
+                "workers": self.workers,
+                "queue_depth": self._queued,
+                "running": sum(self._running.values()),
+                "waiting_users": len(self._queues),
+            }
+        return {**state, **self.metrics.snapshot()}
+
+    def shutdown(self) -> None:
+        """停止接收请求；排队中的请求被丢弃，执行中的请求跑完后工作线程退出。"""
+        with self._cond:
+            self._stopped = True
+            for jobs in self._queues.values():
+                for job in jobs:
+                    job.events.put(ServerBusy("服务正在关闭"))
+                    job.events.put(_DONE)
+            self._queues.clear()
+            self._queued = 0
+            self._cond.notify_all()
+
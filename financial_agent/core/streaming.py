@@ -0,0 +1,240 @@
+import json
+import queue
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, NamedTuple, Optional
+from uuid import UUID
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .tracing import get_tracer
+
+FINAL_ANSWER = "Final Answer"
+
+_ACTION_RE = re.compile(r'"action"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_ACTION_INPUT_RE = re.compile(r'"action_input"\s*:\s*"')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class FinalAnswerParser:
+    """
+    增量解析结构化聊天智能体的 JSON 动作：action 为 "Final Answer" 时，
+    随 token 到达逐段解码 action_input 字符串并返回新增的可见文本（转义序列跨 token 时等待补全）。
+    """
+
+    def __init__(self):
+        self._raw = ""
+        self._action: Optional[str] = None
+        self._pos: Optional[int] = None
+        self.done = False
+
+    @property
+    def is_final(self) -> bool:
+        return self._action == FINAL_ANSWER
+
+    def feed(self, token: str) -> str:
+        if self.done:
+            return ""
+        self._raw += token
+        if self._action is None:
+            m = _ACTION_RE.search(self._raw)
+            if m:
+                self._action = _decode_complete(m.group(1))
+        if self._pos is None:
+            m = _ACTION_INPUT_RE.search(self._raw)
+            if m:
+                self._pos = m.end()
+        if not self.is_final or self._pos is None:
+            return ""
+        return self._decode()
+
+    def _decode(self) -> str:
+        raw, pos, out = self._raw, self._pos, []
+        while pos < len(raw):
+            c = raw[pos]
+            if c == '"':
+                self.done = True
+                pos += 1
+                break
+            if c != "\\":
+                out.append(c)
+                pos += 1
+                continue
+            if pos + 1 >= len(raw):
+                break
+            esc = raw[pos + 1]
+            if esc != "u":
+                out.append(_ESCAPES.get(esc, esc))
+                pos += 2
+                continue
+            code = _hex(raw[pos + 2:pos + 6])
+            if code is None:
+                if pos + 6 > len(raw):
+                    break
+                out.append(raw[pos:pos + 6])
+                pos += 6
+                continue
+            if 0xD800 <= code < 0xDC00:
+                # 代理对需要等到低位部分到达
+                if pos + 12 > len(raw):
+                    break
+                low = _hex(raw[pos + 8:pos + 12]) if raw[pos + 6:pos + 8] == "\\u" else None
+                if low is not None and 0xDC00 <= low < 0xE000:
+                    out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                    pos += 12
+                    continue
+            out.append(chr(code))
+            pos += 6
+        self._pos = pos
+        return "".join(out)
+
+
+def _hex(text: str) -> Optional[int]:
+    if len(text) != 4:
+        return None
+    try:
+        return int(text, 16)
+    except ValueError:
+        return None
+
+
+def _decode_complete(value: str) -> str:
+    try:
+        return json.loads(f'"{value}"')
+    except ValueError:
+        return value
+
+
+class StreamingMetrics:
+    """首个可见 token 耗时（TTFT）与整段回答耗时，按路径（agent / fast）保留最近 1000 次。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: deque = deque(maxlen=1000)
+
+    def record(self, path: str, ttft: Optional[float], total: float) -> None:
+        with self._lock:
+            self.samples.append((path, ttft, total))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = list(self.samples)
+        result = {"responses": len(samples)}
+        for path in ("", *sorted({s[0] for s in samples})):
+            rows = [s for s in samples if not path or s[0] == path]
+            ttfts = np.array([s[1] for s in rows if s[1] is not None])
+            totals = np.array([s[2] for s in rows])
+            prefix = f"{path}_" if path else ""
+            result.update({
+                f"{prefix}ttft_p50": float(np.percentile(ttfts, 50)) if len(ttfts) else None,
+                f"{prefix}ttft_p95": float(np.percentile(ttfts, 95)) if len(ttfts) else None,
+                f"{prefix}total_p50": float(np.percentile(totals, 50)) if len(totals) else None,
+            })
+        return result
+
+
+streaming_metrics = StreamingMetrics()
+
+
+class AgentStreamEvent(NamedTuple):
+    """
+    kind：action（调用工具）/ step（工具返回）/ token（最终回答的新增文本）/ output（完整最终回答）；
+    经服务层排队时还有 queued（data 为前面的请求数）与 started。
+    """
+    kind: str
+    data: Any = None
+
+
+class FinalAnswerStreamHandler(BaseCallbackHandler):
+    """把每次 LLM 调用中最终回答的 token 解析出来放入队列（回调在智能体线程中执行，不直接操作界面）。"""
+
+    def __init__(self, events: queue.Queue):
+        self.events = events
+        self._parsers: Dict[UUID, FinalAnswerParser] = {}
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._parsers[run_id] = FinalAnswerParser()
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        parser = self._parsers.setdefault(run_id, FinalAnswerParser())
+        text = parser.feed(token)
+        if text:
+            self.events.put(AgentStreamEvent("token", text))
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._parsers.pop(run_id, None)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._parsers.pop(run_id, None)
+
+
+_DONE = object()
+
+
+def run_agent(agent, inputs: dict, events: queue.Queue) -> bool:
+    """
+    执行智能体，把事件、异常与结束标记依次放入 events（在工作线程中调用，由 iter_agent_events 消费）。
+    返回是否正常结束。
+    """
+    handler = FinalAnswerStreamHandler(events)
+    try:
+        for chunk in agent.stream(inputs, config={"callbacks": [handler, *get_tracer().callbacks()]}):
+            for action in chunk.get("actions", ()):
+                events.put(AgentStreamEvent("action", action.tool))
+            if "steps" in chunk:
+                events.put(AgentStreamEvent("step"))
+            if "output" in chunk:
+                events.put(AgentStreamEvent("output", chunk["output"]))
+        return True
+    except BaseException as e:
+        events.put(e)
+        return False
+    finally:
+        events.put(_DONE)
+
+
+def iter_agent_events(events: queue.Queue, started: float, metrics: Optional[StreamingMetrics] = streaming_metrics
+                      ) -> Iterator[AgentStreamEvent]:
+    """
+    按到达顺序产出 run_agent 放入的事件；最终回答逐 token 产出（相邻的 token 合并），最后产出完整的 output。
+    智能体出错时在调用方线程重新抛出。首个可见 token 耗时从 started（time.perf_counter）起算。
+    """
+    first_visible: Optional[float] = None
+    pending = None
+    while True:
+        item, pending = (pending, None) if pending is not None else (events.get(), None)
+        if item is _DONE:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        if item.kind == "token":
+            # 界面刷新比 token 到达慢时，一次取出已到达的全部 token
+            pieces = [item.data]
+            while True:
+                try:
+                    nxt = events.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(nxt, AgentStreamEvent) and nxt.kind == "token":
+                    pieces.append(nxt.data)
+                    continue
+                pending = nxt
+                break
+            item = AgentStreamEvent("token", "".join(pieces))
+        if item.kind in ("token", "output") and item.data and first_visible is None:
+            first_visible = time.perf_counter() - started
+        yield item
+    if metrics is not None:
+        metrics.record("agent", first_visible, time.perf_counter() - started)
+
+
+def stream_agent_events(agent, inputs: dict, metrics: Optional[StreamingMetrics] = streaming_metrics
+                        ) -> Iterator[AgentStreamEvent]:
+    """在新的后台线程运行智能体，按到达顺序产出事件（见 iter_agent_events）。"""
+    events: queue.Queue = queue.Queue()
+    started = time.perf_counter()
+    threading.Thread(target=run_agent, args=(agent, inputs, events), name="agent-stream", daemon=True).start()
+    yield from iter_agent_events(events, started, metrics)
@@ -0,0 +1,33 @@
+import re
+
+# 中日韩统一表意文字与全角标点
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数：中文约 1 字 1 token，其余字符约 4 个 1 token。
+    仅用于预算控制，不追求与具体模型分词器完全一致。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class TokenCounter:
+    """流式输出时逐段累计 token 估算值（与对整段文本调用 estimate_tokens 一致），无需缓存全文。"""
+    __slots__ = ("chars", "cjk")
+
+    def __init__(self):
+        self.chars = 0
+        self.cjk = 0
+
+    def add(self, text: str) -> None:
+        self.chars += len(text)
+        self.cjk += len(_CJK_RE.findall(text))
+
+    @property
+    def tokens(self) -> int:
+        if not self.chars:
+            return 0
+        return self.cjk + (self.chars - self.cjk + 3) // 4
@@ -0,0 +1,372 @@
+import bisect
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+DEFAULT_TRACE_PATH = Path(__file__).resolve().parents[1] / "cache" / "traces.jsonl"
+# 耗时直方图的桶上界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("financial_agent_span", default=None)
+
+
+class Histogram:
+    """累计分桶直方图（Prometheus 语义），由所属的 MetricsRegistry 加锁。"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            self.counts[i] += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶线性插值估算分位数。"""
+        if not self.count:
+            return None
+        rank, seen, lower = q * self.count, 0, 0.0
+        for bound, n in zip(self.buckets, self.counts):
+            if n and seen + n >= rank:
+                return lower + (bound - lower) * (rank - seen) / n
+            seen += n
+            lower = bound
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """进程内的直方图与计数器，按 (名称, 标签) 聚合，可渲染为 Prometheus 文本格式。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._observe(key, value)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def record_span(self, name: str, target: str, status: str, duration: float, attrs: dict) -> None:
+        """一次加锁记录 span 的耗时、首 token 耗时与 token 数（标签按字母序，与 observe / inc 的键一致）。"""
+        ttft = attrs.get("ttft")
+        prompt_tokens = attrs.get("prompt_tokens")
+        completion_tokens = attrs.get("completion_tokens")
+        with self._lock:
+            self._observe(("span_duration_seconds", (("span", name), ("status", status), ("target", target))), duration)
+            if ttft is not None:
+                self._observe(("ttft_seconds", (("span", name), ("target", target))), ttft)
+            if prompt_tokens:
+                key = ("tokens_total", (("kind", "prompt_tokens"), ("span", name), ("target", target)))
+                self.counters[key] = self.counters.get(key, 0) + prompt_tokens
+            if completion_tokens:
+                key = ("tokens_total", (("kind", "completion_tokens"), ("span", name), ("target", target)))
+                self.counters[key] = self.counters.get(key, 0) + completion_tokens
+
+    def _observe(self, key, value: float) -> None:
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram()
+        hist.observe(value)
+
+    def snapshot(self) -> dict:
+        """{名称{标签}: {count, sum, p50, p95}} 与计数器的当前值。"""
+        with self._lock:
+            histograms = {
+                _series(name, labels): {"count": h.count, "sum": round(h.sum, 6),
+                                        "p50": h.quantile(0.5), "p95": h.quantile(0.95)}
+                for (name, labels), h in self.histograms.items()
+            }
+            counters = {_series(name, labels): value for (name, labels), value in self.counters.items()}
+        return {"histograms": histograms, "counters": counters}
+
+    def render_prometheus(self, prefix: str = "financial_agent_") -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted({n for n, _ in self.histograms}):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for (n, labels), h in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(h.buckets, h.counts):
+                        cumulative += count
+                        lines.append(f"{prefix}{name}_bucket{_labels(labels, le=repr(bound))} {cumulative}")
+                    lines.append(f"{prefix}{name}_bucket{_labels(labels, le='+Inf')} {h.count}")
+                    lines.append(f"{prefix}{name}_sum{_labels(labels)} {h.sum}")
+                    lines.append(f"{prefix}{name}_count{_labels(labels)} {h.count}")
+            for name in sorted({n for n, _ in self.counters}):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{prefix}{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _series(name: str, labels: Tuple[Tuple[str, str], ...]) -> str:
+    return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...], **extra: str) -> str:
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+class Span:
+    """
+    一次计时操作。结束时耗时计入 span_duration_seconds{span, target, status} 直方图；
+    约定属性 ttft 计入 ttft_seconds 直方图，prompt_tokens / completion_tokens 计入 tokens_total 计数器。
+    被采样的 span 交给导出器。
+    """
+    __slots__ = ("tracer", "name", "target", "trace_id", "span_id", "parent", "sampled", "attrs", "start", "_token")
+    recording = True
+
+    def __init__(self, tracer: "Tracer", name: str, target: str, parent: Optional["Span"], attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.target = target or ""
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.sampled = parent.sampled if parent else tracer.sample_rate > 0 and random.random() < tracer.sample_rate
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self._token = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def end(self, error: Optional[BaseException | str] = None) -> None:
+        """结束 span；error 为异常或错误说明。"""
+        duration = self.elapsed()
+        status = "error" if error is not None else "ok"
+        self.tracer.metrics.record_span(self.name, self.target, status, duration, self.attrs)
+        if self.sampled and self.tracer.exporters:
+            record = {
+                "trace_id": self.trace_id, "span_id": self.span_id,
+                "parent_id": self.parent.span_id if self.parent else None,
+                "name": self.name, "target": self.target, "start": round(time.time() - duration, 6),
+                "duration": round(duration, 6), "status": status, **self.attrs,
+            }
+            if error is not None:
+                record["error"] = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+            for exporter in self.tracer.exporters:
+                exporter.export(record)
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current.reset(self._token)
+        self.end(exc)
+
+
+class _NoopSpan:
+    """关闭追踪时返回的空 span，所有操作都是空操作。"""
+    recording = False
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def elapsed(self) -> float:
+        return 0.0
+
+    def end(self, error: Optional[BaseException | str] = None) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JsonlExporter:
+    """把被采样的 span 逐行追加到本地 JSONL 文件。"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or os.getenv("TRACE_JSONL_PATH") or DEFAULT_TRACE_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+
+    def export(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusServer:
+    """进程内的 /metrics 端点（后台线程），返回 Prometheus 文本格式的指标。"""
+
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = "127.0.0.1"):
+        registry_ = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry_.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # noqa: A002 - 覆盖基类签名
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Tracer:
+    """
+    结构化追踪：智能体步骤、LLM 调用、工具调用与数据源取数各记录一个 span。
+    enabled=False 时 start_span / span 直接返回空 span，几乎没有开销。
+    """
+
+    def __init__(self, enabled: bool = True, sample_rate: float = 0.1, exporters: Optional[list] = None):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.exporters = list(exporters or [])
+        self.metrics = MetricsRegistry()
+
+    def start_span(self, name: str, target: str = "", parent: Optional[Span] = None, **attrs: Any):
+        """开始一个 span（不改变当前 span）；parent 默认为当前上下文中的 span。"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, target, parent if parent is not None else _current.get(), attrs)
+
+    def span(self, name: str, target: str = "", **attrs: Any):
+        """with 语句使用：期间成为当前 span，子 span 自动挂在其下。"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, target, _current.get(), attrs)
+
+    def callbacks(self) -> list:
+        """传给 LangChain 调用（config={"callbacks": ...}）的回调：记录智能体步骤与工具调用。"""
+        return [TracingCallbackHandler(self)] if self.enabled else []
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    把 LangChain 回调转换为 span：顶层链为 agent.run，其直接子链（每一步的规划）为 agent.step，
+    工具调用为 tool.call。期间把当前 span 设为对应 span，LLM 与取数的 span 自动挂在其下。
+    """
+    run_inline = True
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._spans: Dict[UUID, Span] = {}
+
+    def _start(self, run_id: UUID, name: str, target: str, parent_run_id: Optional[UUID], **attrs: Any) -> None:
+        parent = self._spans.get(parent_run_id) if parent_run_id else None
+        span = self.tracer.start_span(name, target, parent=parent, **attrs)
+        self._spans[run_id] = span
+        _current.set(span)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **attrs: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        span.set(**attrs)
+        span.end(error)
+        _current.set(span.parent)
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Any, *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        if parent_run_id is None:
+            self._start(run_id, "agent.run", kwargs.get("name") or (serialized or {}).get("id", [""])[-1], None)
+        elif parent_run_id in self._spans and self._spans[parent_run_id].name == "agent.run":
+            self._start(run_id, "agent.step", "", parent_run_id)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID,
+                      parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        # 工具的父链是 AgentExecutor，挂到 agent.run 下
+        self._start(run_id, "tool.call", (serialized or {}).get("name", ""), parent_run_id)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, output_chars=len(str(output)))
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+_prometheus: Optional[PrometheusServer] = None
+
+
+def get_tracer() -> Tracer:
+    """
+    进程级共享的追踪器，由环境变量配置：TRACING=0 关闭；TRACE_SAMPLE_RATE 为导出 span 的采样率；
+    TRACE_EXPORTER 为逗号分隔的 jsonl / prometheus（端口 TRACE_PROMETHEUS_PORT）。
+    """
+    global _tracer, _prometheus
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                enabled = os.getenv("TRACING", "1") != "0"
+                kinds = {k.strip() for k in os.getenv("TRACE_EXPORTER", "").split(",") if k.strip()}
+                exporters = [JsonlExporter()] if enabled and "jsonl" in kinds else []
+                tracer = Tracer(enabled, float(os.getenv("TRACE_SAMPLE_RATE", "0.1")), exporters)
+                if enabled and "prometheus" in kinds:
+                    _prometheus = PrometheusServer(tracer.metrics, int(os.getenv("TRACE_PROMETHEUS_PORT", "9464")))
+                _tracer = tracer
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> Optional[Tracer]:
+    """替换进程级追踪器（基准与压测中切换开关或导出器），返回原追踪器。"""
+    global _tracer
+    with _tracer_lock:
+        previous, _tracer = _tracer, tracer
+    return previous
@@ -0,0 +1,518 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from .ratelimit import shared_bucket
+
+# 各上游的默认并发上限，可用 UPSTREAM_LIMIT_<NAME> 覆盖（0 为不限）
+DEFAULT_LIMITS = {"ark": 8, "tushare": 2, "yahoo": 4, "stooq": 2}
+# 各上游的默认每分钟请求数，可用 UPSTREAM_RPM_<NAME> 覆盖（0 为不限）；方舟的 RPM/TPM 随账号而定，默认不限
+DEFAULT_RPM = {"tushare": 200, "yahoo": 60, "stooq": 30}
+
+# 错误信息中表示限流、超时或连接问题的片段（yfinance、pandas-datareader 不抛带状态码的异常）
+_TRANSIENT_MARKERS = ("429", "too many requests", "rate limit", "timed out", "timeout",
+                      "temporarily unavailable", "connection")
+
+
+class UpstreamBusy(RuntimeError):
+    """等待上游并发名额超时。"""
+
+
+class UpstreamUnavailable(UpstreamBusy):
+    """上游近期连续失败、处于熔断中，本次请求未发出。"""
+
+
+class UpstreamMetrics:
+    """每个上游的在途请求数、等待名额的耗时（保留最近 1000 次）、超时、限流等待、重试与熔断次数。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight: Dict[str, int] = {}
+        self.peak: Dict[str, int] = {}
+        self.acquired: Dict[str, int] = {}
+        self.timeouts: Dict[str, int] = {}
+        self.waits: Dict[str, deque] = {}
+        self.throttled: Dict[str, int] = {}
+        self.retries: Dict[str, int] = {}
+        self.short_circuits: Dict[str, int] = {}
+        self.states: Dict[str, str] = {}
+
+    def record_acquire(self, name: str, waited: float) -> None:
+        with self._lock:
+            self.in_flight[name] = self.in_flight.get(name, 0) + 1
+            self.peak[name] = max(self.peak.get(name, 0), self.in_flight[name])
+            self.acquired[name] = self.acquired.get(name, 0) + 1
+            self.waits.setdefault(name, deque(maxlen=1000)).append(waited)
+
+    def record_release(self, name: str) -> None:
+        with self._lock:
+            self.in_flight[name] -= 1
+
+    def record_timeout(self, name: str) -> None:
+        self.record(name, self.timeouts)
+
+    def record(self, name: str, counter: Dict[str, int]) -> None:
+        with self._lock:
+            counter[name] = counter.get(name, 0) + 1
+
+    def record_state(self, name: str, state: str) -> None:
+        with self._lock:
+            self.states[name] = state
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {}
+            names = (self.acquired.keys() | self.timeouts.keys() | self.throttled.keys()
+                     | self.retries.keys() | self.short_circuits.keys() | self.states.keys())
+            for name in names:
+                waits = np.array(self.waits.get(name) or [0.0])
+                result[name] = {
+                    "in_flight": self.in_flight.get(name, 0),
+                    "peak": self.peak.get(name, 0),
+                    "acquired": self.acquired.get(name, 0),
+                    "timeouts": self.timeouts.get(name, 0),
+                    "wait_p50": float(np.percentile(waits, 50)),
+                    "wait_p95": float(np.percentile(waits, 95)),
+                    "throttled": self.throttled.get(name, 0),
+                    "retries": self.retries.get(name, 0),
+                    "short_circuits": self.short_circuits.get(name, 0),
+                    "state": self.states.get(name, "closed"),
+                }
+            return result
+
+
+upstream_metrics = UpstreamMetrics()
+
+_semaphores: Dict[str, Optional[threading.BoundedSemaphore]] = {}
+_semaphores_lock = threading.Lock()
+
+
+def upstream_limit(name: str) -> int:
+    return int(os.getenv(f"UPSTREAM_LIMIT_{name.upper()}", str(DEFAULT_LIMITS.get(name, 0))))
+
+
+def _setting(name: str, key: str, default: float) -> float:
+    """依次读取 UPSTREAM_<KEY>_<NAME>、UPSTREAM_<KEY>，都未设置时取默认值。"""
+    value = os.getenv(f"UPSTREAM_{key}_{name.upper()}") or os.getenv(f"UPSTREAM_{key}")
+    return float(value) if value else default
+
+
+def _semaphore(name: str) -> Optional[threading.BoundedSemaphore]:
+    if name not in _semaphores:
+        with _semaphores_lock:
+            if name not in _semaphores:
+                limit = upstream_limit(name)
+                _semaphores[name] = threading.BoundedSemaphore(limit) if limit > 0 else None
+    return _semaphores[name]
+
+
+def _acquire_timeout() -> float:
+    return float(os.getenv("UPSTREAM_ACQUIRE_TIMEOUT", "60"))
+
+
+def set_upstream_limit(name: str, limit: int) -> None:
+    """运行时调整某个上游的并发上限（0 为不限）；已占用的名额仍归还给原来的信号量。"""
+    with _semaphores_lock:
+        _semaphores[name] = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+
+def acquire(name: str) -> Optional[threading.BoundedSemaphore]:
+    """占用一个名额，返回需要交给 release 的信号量（不限并发的上游返回 None）；超时抛出 UpstreamBusy。"""
+    semaphore = _semaphore(name)
+    if semaphore is None:
+        return None
+    started = time.perf_counter()
+    if not semaphore.acquire(timeout=_acquire_timeout()):
+        upstream_metrics.record_timeout(name)
+        raise UpstreamBusy(f"{name} 请求过多，等待并发名额超时")
+    upstream_metrics.record_acquire(name, time.perf_counter() - started)
+    return semaphore
+
+
+async def async_acquire(name: str) -> Optional[threading.BoundedSemaphore]:
+    """acquire 的异步版本：名额不足时以短间隔轮询等待，不阻塞事件循环，也不占用线程。"""
+    semaphore = _semaphore(name)
+    if semaphore is None:
+        return None
+    started = time.perf_counter()
+    deadline = started + _acquire_timeout()
+    delay = 0.005
+    while not semaphore.acquire(blocking=False):
+        if time.perf_counter() >= deadline:
+            upstream_metrics.record_timeout(name)
+            raise UpstreamBusy(f"{name} 请求过多，等待并发名额超时")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.1)
+    upstream_metrics.record_acquire(name, time.perf_counter() - started)
+    return semaphore
+
+
+def release(name: str, semaphore: threading.BoundedSemaphore) -> None:
+    upstream_metrics.record_release(name)
+    semaphore.release()
+
+
+@contextmanager
+def upstream_slot(name: Optional[str]):
+    """
+    进程内对同一上游（方舟、Tushare、Yahoo 等）的并发上限，所有会话共享；
+    名额用完时排队等待，超过 UPSTREAM_ACQUIRE_TIMEOUT 秒抛出 UpstreamBusy。name 为 None 时不限制。
+    """
+    semaphore = acquire(name) if name else None
+    try:
+        yield
+    finally:
+        if semaphore is not None:
+            release(name, semaphore)
+
+
+@asynccontextmanager
+async def async_upstream_slot(name: Optional[str]):
+    """upstream_slot 的异步版本。"""
+    semaphore = await async_acquire(name) if name else None
+    try:
+        yield
+    finally:
+        if semaphore is not None:
+            release(name, semaphore)
+
+
+class CircuitBreaker:
+    """
+    连续 failure_threshold 次暂时性失败后熔断 reset_timeout 秒，期间请求直接失败、不发往上游；
+    到期后放行一个探测请求（半开），成功则恢复，失败则重新熔断。failure_threshold<=0 表示不熔断。
+    状态变化时调用 listener(新状态)，用于导出到监控。
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 listener: Optional[Callable[[str], None]] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.listener = listener
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._reported = "closed"
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str) -> None:
+        """在持有锁时调用：状态与上次通知的不同时通知 listener。"""
+        if state != self._reported:
+            self._reported = state
+            if self.listener is not None:
+                self.listener(state)
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "open" if now - self._opened_at < self.reset_timeout else "half_open"
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            state = self._state(time.monotonic())
+            # 冷却期满即为半开，不必等到下一个请求
+            if state == "half_open":
+                self._transition(state)
+            return state
+
+    def retry_in(self) -> float:
+        """距离下一次探测的秒数。"""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                self._transition(state)
+                return True
+            return False
+
+    def abandon_probe(self) -> None:
+        """放行的探测请求最终没有发出（如等待并发名额超时）时调用，下一个请求可以重新探测。"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+            self._transition("closed")
+
+    def record_failure(self) -> bool:
+        """记录一次失败，返回是否因此进入熔断。"""
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and 0 < self.failure_threshold <= self._failures):
+                self._opened_at = time.monotonic()
+                self._probing = False
+                self._transition("open")
+                return True
+            return False
+
+
+class RetryBudget:
+    """
+    重试预算：最近 window 秒内的重试次数不超过请求数的 ratio 倍（另有 min_retries 次保底），
+    上游故障时重试最多把流量放大 ratio 倍，不会形成重试风暴。
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 3, window: float = 10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            self._requests.append(now)
+
+    def try_retry(self) -> bool:
+        """预算充足时记下一次重试并返回 True。"""
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+
+def _status(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient(error: BaseException) -> bool:
+    """限流（429）、5xx、超时与连接错误属于暂时性错误，可以重试并计入熔断；参数、鉴权等错误重试无益。"""
+    if isinstance(error, UpstreamBusy):
+        return False
+    status = _status(error)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    kind = type(error).__name__
+    if "Timeout" in kind or "Connection" in kind:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in _TRANSIENT_MARKERS)
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """429/503 响应的 Retry-After 头（秒）。"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        value = headers.get("retry-after") if headers is not None else None
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class UpstreamGuard:
+    """
+    单个上游的调用策略，进程内所有线程与会话共享：请求数与 token 数限流（令牌桶，按配额平滑发出请求）、
+    熔断器、重试预算，以及暂时性错误的带抖动指数退避。参数为 None 时从 UPSTREAM_<KEY>_<NAME> 读取。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rpm: float | None = None,
+        tpm: float | None = None,
+        burst: float | None = None,
+        max_attempts: int | None = None,
+        backoff_base: float | None = None,
+        backoff_max: float | None = None,
+        breaker: CircuitBreaker | None = None,
+        budget: RetryBudget | None = None,
+    ):
+        self.name = name
+        rpm = rpm if rpm is not None else _setting(name, "RPM", DEFAULT_RPM.get(name, 0))
+        tpm = tpm if tpm is not None else _setting(name, "TPM", 0)
+        # 桶容量为 burst 秒的配额，默认一分钟：按分钟计的配额可以集中用完，而不是被压成每秒的均匀速率
+        burst = burst if burst is not None else _setting(name, "BURST", 60.0)
+        self.requests = shared_bucket(f"upstream:{name}", rpm / 60, capacity=max(1.0, rpm * burst / 60))
+        self.tokens = shared_bucket(f"upstream-tokens:{name}", tpm / 60, capacity=max(1.0, tpm * burst / 60))
+        self.max_attempts = int(max_attempts if max_attempts is not None else _setting(name, "MAX_ATTEMPTS", 3))
+        self.backoff_base = backoff_base if backoff_base is not None else _setting(name, "BACKOFF_BASE", 0.5)
+        self.backoff_max = backoff_max if backoff_max is not None else _setting(name, "BACKOFF_MAX", 8.0)
+        self.breaker = breaker or CircuitBreaker(
+            int(_setting(name, "BREAKER_FAILURES", 5)), _setting(name, "BREAKER_RESET", 30.0)
+        )
+        self.budget = budget or RetryBudget(_setting(name, "RETRY_RATIO", 0.2), int(_setting(name, "RETRY_MIN", 3)))
+        self.breaker.listener = lambda state: upstream_metrics.record_state(name, state)
+
+    def throttle(self, tokens: int = 0) -> None:
+        """按请求数与 token 数配额等待。"""
+        waited = self.requests.acquire()
+        if tokens:
+            waited += self.tokens.acquire(tokens)
+        if waited > 0:
+            upstream_metrics.record(self.name, upstream_metrics.throttled)
+
+    async def athrottle(self, tokens: int = 0) -> None:
+        waited = await self.requests.acquire_async()
+        if tokens:
+            waited += await self.tokens.acquire_async(tokens)
+        if waited > 0:
+            upstream_metrics.record(self.name, upstream_metrics.throttled)
+
+    def admit(self) -> None:
+        """熔断中时抛出 UpstreamUnavailable。"""
+        if not self.breaker.allow():
+            upstream_metrics.record(self.name, upstream_metrics.short_circuits)
+            raise UpstreamUnavailable(
+                f"{self.name} 暂时不可用（连续失败后熔断，约 {self.breaker.retry_in():.0f} 秒后重试）"
+            )
+
+    def on_success(self) -> None:
+        self.breaker.record_success()
+
+    def on_error(self, error: BaseException, attempt: int) -> Optional[float]:
+        """记录一次失败；应当重试时返回退避秒数，否则返回 None。"""
+        if not is_transient(error):
+            # 上游有响应（参数错误、无数据等），说明服务本身可用
+            self.breaker.record_success()
+            return None
+        if self.breaker.record_failure():
+            # 刚刚熔断，重试也会被拒绝
+            return None
+        if attempt + 1 >= self.max_attempts or not self.budget.try_retry():
+            return None
+        # 全抖动：在 [0, base·2^attempt] 内随机，避免多个调用方同时重试
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            if retry_after > self.backoff_max:
+                return None
+            delay = retry_after + random.uniform(0, self.backoff_base)
+        upstream_metrics.record(self.name, upstream_metrics.retries)
+        return delay
+
+
+_guards: Dict[str, UpstreamGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(name: str) -> UpstreamGuard:
+    if name not in _guards:
+        with _guards_lock:
+            if name not in _guards:
+                _guards[name] = UpstreamGuard(name)
+    return _guards[name]
+
+
+def set_upstream_guard(name: str, guard: UpstreamGuard | None) -> None:
+    """替换某个上游的调用策略；None 为恢复按环境变量重新创建。"""
+    with _guards_lock:
+        if guard is None:
+            _guards.pop(name, None)
+        else:
+            _guards[name] = guard
+
+
+def open_upstream(name: Optional[str], fn: Callable[[], Any], tokens: int = 0
+                  ) -> Tuple[Any, Optional[threading.BoundedSemaphore]]:
+    """
+    经熔断、限流与并发名额调用 fn()，暂时性错误在重试预算内按退避重试。
+    返回 (结果, 并发名额)：流式响应需要占用名额到读完为止，由调用方交给 release。name 为 None 时直接调用。
+    """
+    if not name:
+        return fn(), None
+    guard = get_guard(name)
+    guard.budget.record_request()
+    attempt = 0
+    while True:
+        # 先检查熔断：熔断中的请求不占用限流配额与并发名额，直接失败
+        guard.admit()
+        try:
+            guard.throttle(tokens)
+            held = acquire(name)
+        except BaseException:
+            guard.breaker.abandon_probe()
+            raise
+        try:
+            result = fn()
+        except Exception as e:
+            if held is not None:
+                release(name, held)
+            delay = None if isinstance(e, UpstreamBusy) else guard.on_error(e, attempt)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        guard.on_success()
+        return result, held
+
+
+def call_upstream(name: Optional[str], fn: Callable[[], Any], tokens: int = 0) -> Any:
+    """open_upstream 的非流式版本：拿到结果即归还并发名额。"""
+    result, held = open_upstream(name, fn, tokens)
+    if held is not None:
+        release(name, held)
+    return result
+
+
+async def aopen_upstream(name: Optional[str], fn: Callable[[], Awaitable[Any]], tokens: int = 0
+                         ) -> Tuple[Any, Optional[threading.BoundedSemaphore]]:
+    """open_upstream 的异步版本，fn 返回 awaitable。"""
+    if not name:
+        return await fn(), None
+    guard = get_guard(name)
+    guard.budget.record_request()
+    attempt = 0
+    while True:
+        guard.admit()
+        try:
+            await guard.athrottle(tokens)
+            held = await async_acquire(name)
+        except BaseException:
+            guard.breaker.abandon_probe()
+            raise
+        try:
+            result = await fn()
+        except Exception as e:
+            if held is not None:
+                release(name, held)
+            delay = None if isinstance(e, UpstreamBusy) else guard.on_error(e, attempt)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        guard.on_success()
+        return result, held
+
+
+async def acall_upstream(name: Optional[str], fn: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+    result, held = await aopen_upstream(name, fn, tokens)
+    if held is not None:
+        release(name, held)
+    return result
@@ -0,0 +1,152 @@
+import math
+import os
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_community.vectorstores import FAISS
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+
+@dataclass
+class IndexConfig:
+    """向量索引类型与参数；默认值来自 KB_INDEX_* 环境变量。"""
+    kind: str = "flat"
+    # 文档块少于该数量时总是用精确的 Flat 索引（IVF / PQ 的训练需要足够多的样本）
+    min_vectors: int = 10000
+    # IVF 的聚类数，0 为按 4·√n 自动选择（取 2 的幂）；训练只用随机抽取的 train_sample 个向量
+    nlist: int = 0
+    train_sample: int = 100000
+    # PQ 的子空间数（取不超过它、且能整除维度的最大值）与每个子空间的编码位数
+    pq_m: int = 32
+    pq_bits: int = 8
+    hnsw_m: int = 32
+    ef_construction: int = 80
+    # 查询参数的默认值，可在单次查询中覆盖（见 TunableFAISS）
+    nprobe: int = 16
+    ef_search: int = 64
+
+    @classmethod
+    def from_env(cls) -> "IndexConfig":
+        kind = os.getenv("KB_INDEX_TYPE", "flat").strip().lower()
+        if kind not in INDEX_TYPES:
+            raise ValueError(f"未知的 KB_INDEX_TYPE: {kind}（可选 {' / '.join(INDEX_TYPES)}）")
+        defaults = cls()
+        return cls(kind=kind, **{
+            name: int(os.getenv(f"KB_INDEX_{name.upper()}", str(getattr(defaults, name))))
+            for name in ("min_vectors", "nlist", "train_sample", "pq_m", "pq_bits", "hnsw_m",
+                         "ef_construction", "nprobe", "ef_search")
+        })
+
+
+def factory_string(config: IndexConfig, n: int, d: int) -> str:
+    """按配置与规模给出 faiss.index_factory 的描述串；规模不足时退回 "Flat"。"""
+    if config.kind == "flat" or n < config.min_vectors:
+        return "Flat"
+    if config.kind == "hnsw":
+        return f"HNSW{config.hnsw_m},Flat"
+    # 取 2 的幂，规模小幅变化时描述串不变，可以沿用已训练的索引；每个聚类至少需要 39 个训练样本
+    nlist = config.nlist or 2 ** round(math.log2(4 * math.sqrt(n)))
+    nlist = max(1, min(nlist, 2 ** int(math.log2(max(1, min(n, config.train_sample) // 39)))))
+    if config.kind == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    m = max(k for k in range(1, min(config.pq_m, d) + 1) if d % k == 0)
+    return f"IVF{nlist},PQ{m}x{config.pq_bits}"
+
+
+def build_index(vectors: np.ndarray, spec: str, config: IndexConfig, seed: int = 0,
+                trained: Optional[faiss.Index] = None) -> faiss.Index:
+    """
+    按描述串建索引（L2 距离，与原有的 IndexFlatL2 一致）：需要训练时先在随机样本上训练，再加入全部向量。
+    trained 为同一描述串下已训练的 IVF 索引时沿用其聚类中心与码本，只重新加入向量。
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if trained is not None and _is_ivf(trained) and trained.is_trained and trained.d == vectors.shape[1]:
+        trained.reset()
+        trained.add(vectors)
+        apply_search_defaults(trained, config)
+        return trained
+    index = faiss.index_factory(vectors.shape[1], spec)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = config.ef_construction
+    if isinstance(index, faiss.IndexIVFPQ):
+        # 工厂默认开启的多义（polysemous）训练只服务于汉明距离过滤，检索用不到且训练耗时数倍
+        index.do_polysemous_training = False
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if len(vectors) > config.train_sample:
+            sample = vectors[np.sort(rng.choice(len(vectors), config.train_sample, replace=False))]
+        index.train(sample)
+    index.add(vectors)
+    apply_search_defaults(index, config)
+    return index
+
+
+def apply_search_defaults(index: faiss.Index, config: IndexConfig) -> None:
+    """设置索引的默认 nprobe / efSearch（Flat 索引无需设置）。"""
+    if _is_ivf(index):
+        faiss.extract_index_ivf(index).nprobe = config.nprobe
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = config.ef_search
+
+
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None) -> Optional[faiss.SearchParameters]:
+    """单次查询的参数；不改动索引本身，多线程并发查询时互不影响。"""
+    if nprobe is not None and _is_ivf(index):
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    return None
+
+
+def search(index: faiss.Index, queries: np.ndarray, k: int, nprobe: Optional[int] = None,
+           ef_search: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """带单次查询参数的 index.search。"""
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    params = search_parameters(index, nprobe, ef_search)
+    return index.search(queries, k, params=params) if params is not None else index.search(queries, k)
+
+
+def index_bytes(index: faiss.Index) -> int:
+    """索引序列化后的字节数，即完整载入内存时的大致占用。"""
+    return int(faiss.serialize_index(index).size)
+
+
+def _is_ivf(index: faiss.Index) -> bool:
+    try:
+        faiss.extract_index_ivf(index)
+        return True
+    except RuntimeError:
+        return False
+
+
+class TunableFAISS(FAISS):
+    """检索时可以传入 nprobe / ef_search 覆盖索引的默认查询参数（例如 search_kwargs={"k": 3, "nprobe": 32}）。"""
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Any] = None,
+        fetch_k: int = 20,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        params = search_parameters(self.index, nprobe, ef_search)
+        # 带过滤条件或得分阈值时沿用 LangChain 的实现（使用索引的默认查询参数）
+        if params is None or filter is not None or kwargs.get("score_threshold") is not None:
+            return super().similarity_search_with_score_by_vector(embedding, k, filter, fetch_k, **kwargs)
+        vector = np.array([embedding], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vector)
+        scores, indices = self.index.search(vector, k, params=params)
+        return [
+            (self.docstore.search(self.index_to_docstore_id[i]), scores[0][j])
+            for j, i in enumerate(indices[0]) if i != -1
+        ]
@@ -0,0 +1,34 @@
+import pandas as pd
+
+# 统一对外展示与缓存的日K线字段
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def empty_ohlcv() -> pd.DataFrame:
+    """数据源请求成功但区间内没有交易（节假日、停牌、开盘前等）时返回的空日K线。"""
+    return pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], name="Date"))
+
+
+def normalize_ohlcv(df: pd.DataFrame | None) -> pd.DataFrame | None:
+    """将不同数据源返回的日K线统一为 OHLCV 字段、无时区的日期索引（升序、去重）。"""
+    if df is None or df.empty:
+        return None
+    df = df.copy()
+    # yfinance.download 即使单个标的也可能返回 (Price, Ticker) 两级列索引
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df = df.rename(columns={"open": "Open", "high": "High", "low": "Low", "close": "Close", "vol": "Volume"})
+    columns = [c for c in OHLCV_COLUMNS if c in df.columns]
+    if "Close" not in columns:
+        return None
+    # 多标的按日期对齐后，某标的无交易的日期整行为空
+    df = df[columns].dropna(subset=["Close"])
+    if df.empty:
+        return None
+    index = pd.to_datetime(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    df.index = index.normalize()
+    df.index.name = "Date"
+    df = df[~df.index.duplicated(keep="last")].sort_index()
+    return df
@@ -0,0 +1,219 @@
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 支持的指标及默认参数（与国内行情软件常用设置一致）
+INDICATORS = ("MA", "EMA", "MACD", "KDJ", "RSI", "BOLL", "ATR")
+DEFAULT_PARAMS = {
+    "MA": (5, 10, 20, 60),
+    "EMA": (12, 26),
+    "MACD": (12, 26, 9),
+    "KDJ": (9, 3, 3),
+    "RSI": (6, 12, 24),
+    "BOLL": (20, 2),
+    "ATR": (14,),
+}
+# 计算前需要额外拉取的预热交易日数，使区间起点处的指标已经稳定
+WARMUP_DAYS = 120
+
+
+# ---- 向量化内核：输入均为 (T, N) 矩阵，按时间轴计算，N 个标的同时处理 ----
+
+def stack_columns(frames: Dict[str, pd.DataFrame], column: str, length: int) -> np.ndarray:
+    """将各标的的某一列按“最新日期对齐”堆叠为 (length, N) 矩阵，较短的序列在前部补 NaN。
+    不同市场交易日不同，按尾部对齐可避免日历对齐带来的中间空洞。
+    """
+    out = np.full((length, len(frames)), np.nan)
+    for j, df in enumerate(frames.values()):
+        values = df[column].to_numpy(dtype=float) if column in df else df["Close"].to_numpy(dtype=float)
+        out[length - len(values):, j] = values
+    return out
+
+
+def rolling_mean(x: np.ndarray, n: int) -> np.ndarray:
+    """滑动均值：累计和相减，O(T·N)；窗口内含 NaN（序列起始前）时结果为 NaN。"""
+    valid = ~np.isnan(x)
+    csum = np.cumsum(np.where(valid, x, 0.0), axis=0)
+    ccount = np.cumsum(valid, axis=0)
+    csum = np.vstack([np.zeros((1, x.shape[1])), csum])
+    ccount = np.vstack([np.zeros((1, x.shape[1])), ccount])
+    out = np.full_like(x, np.nan)
+    if n <= x.shape[0]:
+        window_sum = csum[n:] - csum[:-n]
+        window_count = ccount[n:] - ccount[:-n]
+        out[n - 1:] = np.where(window_count == n, window_sum / n, np.nan)
+    return out
+
+
+def rolling_std(x: np.ndarray, n: int) -> np.ndarray:
+    """滑动总体标准差（BOLL 惯例 ddof=0），由 E[x²] - E[x]² 计算。"""
+    mean = rolling_mean(x, n)
+    mean_sq = rolling_mean(x * x, n)
+    return np.sqrt(np.maximum(mean_sq - mean * mean, 0.0))
+
+
+def rolling_max(x: np.ndarray, n: int) -> np.ndarray:
+    out = np.full_like(x, np.nan)
+    if n <= x.shape[0]:
+        out[n - 1:] = sliding_window_view(x, n, axis=0).max(axis=-1)
+    return out
+
+
+def rolling_min(x: np.ndarray, n: int) -> np.ndarray:
+    out = np.full_like(x, np.nan)
+    if n <= x.shape[0]:
+        out[n - 1:] = sliding_window_view(x, n, axis=0).min(axis=-1)
+    return out
+
+
+def ewm(x: np.ndarray, alpha: float, seed: float | None = None) -> np.ndarray:
+    """指数加权递推 y_t = alpha·x_t + (1-alpha)·y_{t-1}。
+    沿时间逐步递推、在标的维度上向量化；每个标的从首个有效值（或给定 seed）起算。
+    输入中的 NaN 只允许出现在各序列的起始处（尾部对齐后的补齐部分）。
+    """
+    rows, cols = x.shape
+    out = np.full_like(x, np.nan)
+    valid = ~np.isnan(x)
+    has_data = valid.any(axis=0)
+    first = np.where(has_data, valid.argmax(axis=0), rows)
+    beta = 1.0 - alpha
+    prev = np.full(cols, np.nan)
+    for t in range(int(first.min()) if cols else rows, rows):
+        cur = alpha * x[t] + beta * prev
+        starting = first == t
+        if starting.any():
+            cur[starting] = x[t, starting] if seed is None else alpha * x[t, starting] + beta * seed
+        out[t] = cur
+        prev = cur
+    return out
+
+
+def ema(x: np.ndarray, n: int) -> np.ndarray:
+    return ewm(x, 2.0 / (n + 1))
+
+
+def sma_cn(x: np.ndarray, n: int, m: int = 1, seed: float | None = None) -> np.ndarray:
+    """国内行情软件的 SMA(X, N, M)：Y = (M·X + (N-M)·Y') / N。"""
+    return ewm(x, m / n, seed)
+
+
+# ---- 指标 ----
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, np.ndarray]:
+    dif = ema(close, fast) - ema(close, slow)
+    dea = ewm(dif, 2.0 / (signal + 1))
+    return {"DIF": dif, "DEA": dea, "MACD": 2 * (dif - dea)}
+
+
+def kdj(high: np.ndarray, low: np.ndarray, close: np.ndarray, n: int = 9, m1: int = 3, m2: int = 3) -> Dict[str, np.ndarray]:
+    llv = rolling_min(low, n)
+    hhv = rolling_max(high, n)
+    span = hhv - llv
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsv = np.where(span > 0, (close - llv) / span * 100, 50.0)
+    rsv = np.where(np.isnan(llv), np.nan, rsv)
+    k = sma_cn(rsv, m1, 1, seed=50.0)
+    d = sma_cn(k, m2, 1, seed=50.0)
+    return {"K": k, "D": d, "J": 3 * k - 2 * d}
+
+
+def rsi(close: np.ndarray, n: int) -> np.ndarray:
+    diff = np.vstack([np.full((1, close.shape[1]), np.nan), np.diff(close, axis=0)])
+    gain = sma_cn(np.where(np.isnan(diff), np.nan, np.maximum(diff, 0.0)), n)
+    loss = sma_cn(np.where(np.isnan(diff), np.nan, np.abs(diff)), n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        value = np.where(loss > 0, gain / loss * 100, 50.0)
+    return np.where(np.isnan(loss), np.nan, value)
+
+
+def boll(close: np.ndarray, n: int = 20, k: float = 2) -> Dict[str, np.ndarray]:
+    mid = rolling_mean(close, n)
+    std = rolling_std(close, n)
+    return {"BOLL_MID": mid, "BOLL_UP": mid + k * std, "BOLL_LOW": mid - k * std}
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, n: int = 14) -> np.ndarray:
+    prev_close = np.vstack([np.full((1, close.shape[1]), np.nan), close[:-1]])
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return ewm(tr, 1.0 / n)
+
+
+def compute_indicators(
+    frames: Dict[str, pd.DataFrame],
+    indicators: Iterable[str] = INDICATORS,
+    params: Dict[str, Sequence[float]] | None = None,
+) -> Dict[str, pd.DataFrame]:
+    """批量计算多个标的的技术指标，返回 {标的: 指标 DataFrame（与原日期索引一致）}。"""
+    frames = {s: df for s, df in frames.items() if df is not None and not df.empty}
+    if not frames:
+        return {}
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    wanted = [i.upper() for i in indicators]
+    unknown = [i for i in wanted if i not in INDICATORS]
+    if unknown:
+        raise ValueError(f"不支持的指标: {', '.join(unknown)}；可选: {', '.join(INDICATORS)}")
+
+    length = max(len(df) for df in frames.values())
+    close = stack_columns(frames, "Close", length)
+    high = stack_columns(frames, "High", length)
+    low = stack_columns(frames, "Low", length)
+
+    columns: Dict[str, np.ndarray] = {}
+    if "MA" in wanted:
+        for n in params["MA"]:
+            columns[f"MA{n}"] = rolling_mean(close, int(n))
+    if "EMA" in wanted:
+        for n in params["EMA"]:
+            columns[f"EMA{n}"] = ema(close, int(n))
+    if "MACD" in wanted:
+        columns.update(macd(close, *map(int, params["MACD"])))
+    if "KDJ" in wanted:
+        columns.update(kdj(high, low, close, *map(int, params["KDJ"])))
+    if "RSI" in wanted:
+        for n in params["RSI"]:
+            columns[f"RSI{n}"] = rsi(close, int(n))
+    if "BOLL" in wanted:
+        n, k = params["BOLL"]
+        columns.update(boll(close, int(n), k))
+    if "ATR" in wanted:
+        n = int(params["ATR"][0])
+        columns[f"ATR{n}"] = atr(high, low, close, n)
+
+    result = {}
+    for j, (symbol, df) in enumerate(frames.items()):
+        rows = len(df)
+        result[symbol] = pd.DataFrame({name: values[length - rows:, j] for name, values in columns.items()}, index=df.index)
+    return result
+
+
+def describe_signals(df: pd.DataFrame, close: pd.Series) -> List[str]:
+    """根据最新指标值给出常见的形态提示（超买超卖、金叉死叉、布林带位置）。"""
+    signals = []
+    last = df.iloc[-1]
+    if {"K", "D", "J"} <= set(df.columns):
+        if last["K"] > 80 and last["D"] > 80:
+            signals.append("KDJ 处于超买区（K、D>80）")
+        elif last["K"] < 20 and last["D"] < 20:
+            signals.append("KDJ 处于超卖区（K、D<20）")
+    if {"DIF", "DEA"} <= set(df.columns) and len(df) >= 2:
+        spread = (df["DIF"] - df["DEA"]).to_numpy()
+        crosses = np.nonzero(np.diff(np.sign(spread[-6:])))[0]
+        if len(crosses):
+            kind = "金叉" if spread[-1] > 0 else "死叉"
+            signals.append(f"MACD 近 5 个交易日内出现{kind}")
+    rsi_cols = [c for c in df.columns if c.startswith("RSI")]
+    if rsi_cols:
+        value = last[rsi_cols[0]]
+        if value > 80:
+            signals.append(f"{rsi_cols[0]}={value:.1f}，超买")
+        elif value < 20:
+            signals.append(f"{rsi_cols[0]}={value:.1f}，超卖")
+    if {"BOLL_UP", "BOLL_LOW"} <= set(df.columns):
+        price = close.iloc[-1]
+        if price > last["BOLL_UP"]:
+            signals.append("收盘价突破布林上轨")
+        elif price < last["BOLL_LOW"]:
+            signals.append("收盘价跌破布林下轨")
+    return signals
@@ -0,0 +1,259 @@
+import importlib.util
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import pandas as pd
+
+from .frames import normalize_ohlcv
+
+# Parquet 列式存储（requirements 已锁定 pyarrow）；只检查是否安装，由 pandas 在首次读写时导入
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+# fetcher(symbol, start_date, end_date) -> (DataFrame 或 None, 来源或错误说明)，日期均为闭区间 'YYYY-MM-DD'；
+# 请求成功但区间内没有交易时返回空 DataFrame，None 只表示请求失败
+Fetcher = Callable[[str, str, str], Tuple[Optional[pd.DataFrame], str]]
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parents[1] / "cache" / "prices"
+CACHE_SOURCE = "缓存"
+NO_TRADES = "该区间内没有交易数据"
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def date_range_error(start_date: str, end_date: str) -> Optional[str]:
+    """校验闭区间 [start_date, end_date]：格式错误或起始日期晚于结束日期（或今天）时返回错误说明。"""
+    try:
+        start, end = _parse_date(start_date), _parse_date(end_date)
+    except (TypeError, ValueError):
+        return f"日期格式无效：{start_date} ~ {end_date}，应为 'YYYY-MM-DD'"
+    if start > min(end, date.today()):
+        return f"日期区间无效：{start_date} ~ {end_date}"
+    return None
+
+
+def _last_trading_day(today: date) -> date:
+    """最近一个交易日（仅按工作日近似，不考虑节假日）。"""
+    while today.weekday() >= 5:
+        today -= timedelta(days=1)
+    return today
+
+
+def _merge_ranges(ranges: List[Tuple[date, date]]) -> List[Tuple[date, date]]:
+    """合并重叠或首尾相邻的闭区间。"""
+    merged: List[Tuple[date, date]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _missing_ranges(ranges: List[Tuple[date, date]], start: date, end: date) -> List[Tuple[date, date]]:
+    """计算 [start, end] 中尚未被 ranges 覆盖的子区间。"""
+    gaps: List[Tuple[date, date]] = []
+    cursor = start
+    for r_start, r_end in ranges:
+        if r_end < cursor:
+            continue
+        if r_start > end:
+            break
+        if r_start > cursor:
+            gaps.append((cursor, min(end, r_start - timedelta(days=1))))
+        cursor = max(cursor, r_end + timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def _has_weekday(start: date, end: date) -> bool:
+    """区间内是否存在工作日；纯周末区间无需请求数据源。"""
+    if (end - start).days >= 2:
+        return True
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            return True
+        day += timedelta(days=1)
+    return False
+
+
+class PriceCache:
+    """
+    按标的持久化的日K线本地缓存（Parquet 列式存储 + JSON 元数据）。
+    元数据记录已覆盖的日期区间：完全覆盖的请求直接读本地，部分覆盖的只补拉缺口。
+    最近一个交易日的数据可能仍在变化，仅在 recent_ttl 秒内视为有效。
+    """
+
+    def __init__(self, cache_dir: str | Path | None = None, recent_ttl: float | None = None):
+        self.cache_dir = Path(cache_dir or os.getenv("PRICE_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        if recent_ttl is None:
+            recent_ttl = float(os.getenv("PRICE_CACHE_TTL", "900"))
+        self.recent_ttl = recent_ttl
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "partial_hits": 0, "misses": 0, "gaps_fetched": 0, "fetch_failures": 0}
+
+    def get(self, symbol: str, start_date: str, end_date: str, fetcher: Fetcher) -> Tuple[Optional[pd.DataFrame], str]:
+        """读取 [start_date, end_date] 的日K线，缺失区间通过 fetcher 补齐。返回 (DataFrame 或 None, 来源或错误说明)。"""
+        error = date_range_error(start_date, end_date)
+        if error:
+            return None, error
+
+        sources: List[str] = []
+        errors: List[str] = []
+        fetched: List[Tuple[str, str, pd.DataFrame]] = []
+        # 网络请求不持有锁，避免慢数据源阻塞其他标的
+        for gap_start, gap_end in self.missing(symbol, start_date, end_date):
+            df, label = fetcher(symbol, gap_start, gap_end)
+            if df is None:
+                errors.append(label)
+                continue
+            # 请求成功但没有数据（节假日、开盘前等）同样记为已覆盖，之后不再反复补拉
+            fetched.append((gap_start, gap_end, df))
+            sources.append(label)
+        if errors:
+            with self._lock:
+                self.stats["fetch_failures"] += len(errors)
+        if fetched:
+            self.store(symbol, fetched)
+
+        result = self.read(symbol, start_date, end_date)
+        if result is None:
+            return None, errors[-1] if errors else NO_TRADES
+        if errors:
+            return result, f"{CACHE_SOURCE}，部分区间获取失败"
+        return result, "+".join(dict.fromkeys(sources)) if sources else CACHE_SOURCE
+
+    def missing(self, symbol: str, start_date: str, end_date: str) -> List[Tuple[str, str]]:
+        """返回 [start_date, end_date] 中尚未缓存（或已过期）的子区间，并计入命中统计。"""
+        start, end = _parse_date(start_date), _parse_date(end_date)
+        # 未来日期不可能有数据，覆盖区间只记录到今天
+        end = min(end, date.today())
+        if start > end:
+            return []
+        with self._lock:
+            ranges = self._valid_ranges(self._load_meta(symbol))
+            gaps = [g for g in _missing_ranges(ranges, start, end) if _has_weekday(*g)]
+            if not gaps:
+                self.stats["hits"] += 1
+            elif gaps == [(start, end)]:
+                self.stats["misses"] += 1
+            else:
+                self.stats["partial_hits"] += 1
+            self.stats["gaps_fetched"] += len(gaps)
+        return [(s.isoformat(), e.isoformat()) for s, e in gaps]
+
+    def store(self, symbol: str, fetched: List[Tuple[str, str, pd.DataFrame]]) -> None:
+        """写入已获取的 (开始日期, 结束日期, DataFrame)，并将这些区间标记为已覆盖（DataFrame 为空时只记录区间）。"""
+        fetched_ranges = [(_parse_date(s), min(_parse_date(e), date.today())) for s, e, _ in fetched]
+        frames = [f for f in (normalize_ohlcv(df) for _, _, df in fetched) if f is not None]
+        with self._lock:
+            # 重新加载，合并其他线程可能已写入的数据
+            frame, meta = self._load(symbol)
+            frames = [f for f in [frame] + frames if f is not None]
+            frame = pd.concat(frames) if frames else None
+            if frame is not None:
+                frame = frame[~frame.index.duplicated(keep="last")].sort_index()
+            ranges = _merge_ranges(self._valid_ranges(meta) + fetched_ranges)
+            self._save(symbol, frame, meta, ranges, fetched_ranges)
+
+    def read(self, symbol: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+        """只读本地缓存中 [start_date, end_date] 的数据，无数据返回 None。"""
+        with self._lock:
+            frame, _ = self._load(symbol)
+        if frame is None:
+            return None
+        result = frame.loc[pd.Timestamp(start_date):pd.Timestamp(end_date)]
+        return None if result.empty else result
+
+    def clear(self, symbol: str | None = None) -> None:
+        """清除某个标的或全部缓存。"""
+        with self._lock:
+            targets = [symbol] if symbol else {p.stem for p in self.cache_dir.glob("*.json")}
+            for s in targets:
+                for path in self._paths(s):
+                    if path.exists():
+                        path.unlink()
+
+    def _paths(self, symbol: str) -> Tuple[Path, Path]:
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", symbol.upper())
+        suffix = ".parquet" if HAS_PYARROW else ".pkl"
+        return self.cache_dir / f"{safe}{suffix}", self.cache_dir / f"{safe}.json"
+
+    def _load_meta(self, symbol: str) -> dict:
+        _, meta_path = self._paths(symbol)
+        try:
+            return json.loads(meta_path.read_text(encoding="utf-8"))
+        except Exception:
+            return {}
+
+    def _load(self, symbol: str) -> Tuple[Optional[pd.DataFrame], dict]:
+        data_path, meta_path = self._paths(symbol)
+        if not meta_path.exists():
+            return None, {}
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            # 只覆盖了无交易区间的标的没有数据文件
+            if not data_path.exists():
+                return None, meta
+            frame = pd.read_parquet(data_path) if HAS_PYARROW else pd.read_pickle(data_path)
+            return frame, meta
+        except Exception:
+            # 缓存文件损坏时按未命中处理
+            return None, {}
+
+    def _save(
+        self,
+        symbol: str,
+        frame: Optional[pd.DataFrame],
+        old_meta: dict,
+        ranges: List[Tuple[date, date]],
+        fetched: List[Tuple[date, date]],
+    ) -> None:
+        data_path, meta_path = self._paths(symbol)
+        meta = {
+            "symbol": symbol,
+            "ranges": [[s.isoformat(), e.isoformat()] for s, e in ranges],
+            "recent_day": old_meta.get("recent_day"),
+            "recent_fetched_at": old_meta.get("recent_fetched_at"),
+        }
+        recent_day = _last_trading_day(date.today())
+        if any(e >= recent_day for _, e in fetched):
+            meta["recent_day"] = recent_day.isoformat()
+            meta["recent_fetched_at"] = time.time()
+        elif meta["recent_day"] and any(e >= _parse_date(meta["recent_day"]) for _, e in fetched):
+            # 旧的“最近交易日”已收盘且被重新拉取，数据不再变化
+            meta["recent_day"] = None
+            meta["recent_fetched_at"] = None
+        # 先写临时文件再替换，避免进程中断留下半个文件
+        if frame is not None:
+            tmp_data = data_path.with_suffix(data_path.suffix + ".tmp")
+            if HAS_PYARROW:
+                frame.to_parquet(tmp_data)
+            else:
+                frame.to_pickle(tmp_data)
+            os.replace(tmp_data, data_path)
+        tmp_meta = meta_path.with_suffix(".json.tmp")
+        tmp_meta.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_meta, meta_path)
+
+    def _valid_ranges(self, meta: dict) -> List[Tuple[date, date]]:
+        """读取已覆盖区间；最近交易日的数据超过 TTL 后从覆盖区间中剔除。"""
+        ranges = [(_parse_date(s), _parse_date(e)) for s, e in meta.get("ranges", [])]
+        recent_day = meta.get("recent_day")
+        fetched_at = meta.get("recent_fetched_at") or 0
+        if recent_day and time.time() - fetched_at > self.recent_ttl:
+            cutoff = _parse_date(recent_day) - timedelta(days=1)
+            ranges = [(s, min(e, cutoff)) for s, e in ranges if s <= cutoff]
+        return ranges
@@ -0,0 +1,281 @@
+import importlib.util
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+from .frames import empty_ohlcv, normalize_ohlcv
+
+# tushare / yfinance / pandas-datareader 导入较慢，只在首次向对应数据源取数时导入
+# pandas-datareader 作为备用数据源（避免 yfinance 限流），未安装时跳过
+HAS_PDR = importlib.util.find_spec("pandas_datareader") is not None
+try:
+    from dotenv import load_dotenv
+    HAS_DOTENV = True
+except Exception:
+    HAS_DOTENV = False
+
+
+def _tushare():
+    import tushare as ts
+    return ts
+
+
+def _yfinance():
+    import yfinance as yf
+    return yf
+
+
+def _datareader():
+    from pandas_datareader import data as pdr
+    return pdr
+
+
+def is_china_equity(symbol: str) -> bool:
+    """判断是否为中国 A 股或北交所代码。支持 '600519', '600519.SH', '600519.SS' 等格式。"""
+    s = symbol.upper().strip()
+    # 数字 6 位直接认定为 A 股
+    if s.isdigit() and len(s) == 6:
+        return True
+    # 含交易所后缀
+    if ".SH" in s or ".SZ" in s or ".BJ" in s or ".SS" in s:
+        return True
+    return False
+
+
+def to_ts_code(symbol: str) -> str | None:
+    """将输入代码转换为 Tushare ts_code 格式，例如 '600519.SH'。
+    规则：
+    - 以 '6' 开头 -> 上交所 'SH'
+    - 以 '0' 或 '3' 开头 -> 深交所 'SZ'
+    - 以 '8' 或 '4' 开头 -> 北交所 'BJ'
+    - 带 '.SS' 的 -> 上交所 'SH'
+    - 已带 '.SH/.SZ/.BJ' 保持不变
+    """
+    s = symbol.upper().strip()
+    if ".SS" in s:
+        base = s.replace(".SS", "")
+        if base.isdigit():
+            return f"{base}.SH"
+        return None
+    if any(s.endswith(suf) for suf in [".SH", ".SZ", ".BJ"]):
+        return s
+    # 纯数字处理
+    if s.isdigit() and len(s) == 6:
+        if s[0] == "6":
+            return f"{s}.SH"
+        if s[0] in ("0", "3"):
+            return f"{s}.SZ"
+        if s[0] in ("8", "4"):
+            return f"{s}.BJ"
+    return None
+
+
+def to_yahoo_symbol(symbol: str) -> str:
+    """A 股代码转换为 Yahoo 格式（上交所后缀为 '.SS'），其他代码原样返回。"""
+    s = symbol.strip()
+    ts_code = to_ts_code(s) if is_china_equity(s) else None
+    if ts_code and ts_code.endswith(".SH"):
+        return ts_code.replace(".SH", ".SS")
+    return ts_code or s
+
+
+class MarketDataProvider:
+    """
+    行情数据源接口。fetch 的日期均为闭区间 'YYYY-MM-DD'，
+    成功返回统一的 OHLCV DataFrame，无数据返回 None，网络或接口错误直接抛出异常。
+    """
+    name: str = "base"
+    # 尚无实测数据时用于排序的先验耗时（秒）
+    prior_latency: float = 1.0
+    # 所属上游（core/upstream 中的并发上限按它共享），None 为不限制
+    upstream: str | None = None
+
+    def supports(self, symbol: str) -> bool:
+        return True
+
+    def fetch(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame | None:
+        raise NotImplementedError
+
+    def fetch_many(self, symbols: List[str], start_date: str, end_date: str) -> Dict[str, pd.DataFrame]:
+        """批量获取，返回 {原始代码: DataFrame}，请求失败的标的不出现在结果中，请求成功但没有数据的为空 DataFrame。
+        默认逐个调用 fetch；有批量接口的数据源应覆盖此方法。
+        """
+        result = {}
+        for symbol in symbols:
+            try:
+                df = self.fetch(symbol, start_date, end_date)
+            except Exception:
+                continue
+            result[symbol] = df if df is not None and not df.empty else empty_ohlcv()
+        return result
+
+
+class TushareProvider(MarketDataProvider):
+    """Tushare Pro 日线接口，仅支持 A 股与北交所，需要 TUSHARE_TOKEN。"""
+    name = "Tushare"
+    prior_latency = 0.5
+    upstream = "tushare"
+
+    def supports(self, symbol: str) -> bool:
+        return is_china_equity(symbol) and to_ts_code(symbol) is not None and self._init_tushare()
+
+    def fetch(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame | None:
+        # 直接从环境读取 TOKEN，避免 set_token 未生效问题
+        token = os.getenv("TUSHARE_TOKEN")
+        ts = _tushare()
+        pro = ts.pro_api(token) if token else ts.pro_api()
+        df = pro.daily(
+            ts_code=to_ts_code(symbol),
+            start_date=start_date.replace("-", ""),
+            end_date=end_date.replace("-", ""),
+        )
+        return self._to_frame(df)
+
+    def fetch_many(self, symbols: List[str], start_date: str, end_date: str) -> Dict[str, pd.DataFrame]:
+        """一次 pro.daily 调用，ts_code 以逗号拼接。"""
+        codes = {to_ts_code(s): s for s in symbols}
+        token = os.getenv("TUSHARE_TOKEN")
+        ts = _tushare()
+        pro = ts.pro_api(token) if token else ts.pro_api()
+        df = pro.daily(
+            ts_code=",".join(codes),
+            start_date=start_date.replace("-", ""),
+            end_date=end_date.replace("-", ""),
+        )
+        # 请求成功时，结果中没有行的标的即区间内没有交易
+        result = {symbol: empty_ohlcv() for symbol in codes.values()}
+        if df is None or df.empty:
+            return result
+        for ts_code, group in df.groupby("ts_code"):
+            frame = self._to_frame(group)
+            if frame is not None and ts_code in codes:
+                result[codes[ts_code]] = frame
+        return result
+
+    @staticmethod
+    def _to_frame(df: pd.DataFrame | None) -> pd.DataFrame | None:
+        """Tushare 返回按 trade_date 倒序的原始表，转换为以日期为索引的 OHLCV。"""
+        if df is None or df.empty:
+            return None
+        df = df.copy()
+        df["trade_date"] = pd.to_datetime(df["trade_date"])
+        return normalize_ohlcv(df.set_index("trade_date"))
+
+    def _init_tushare(self) -> bool:
+        """初始化 Tushare TOKEN。
+        直接从环境变量读取 TUSHARE_TOKEN。
+        """
+        token = os.getenv("TUSHARE_TOKEN")
+        if not token:
+            # 如果环境变量中没有找到 TUSHARE_TOKEN，则尝试从 .env 文件加载
+            try:
+                if HAS_DOTENV:
+                    # .env 文件在项目根目录的 configs 文件夹下；也兼容 README 中的 financial_agent/configs/.env
+                    package_dir = Path(__file__).resolve().parents[1]
+                    for dotenv_path in (package_dir.parent / "configs" / ".env", package_dir / "configs" / ".env"):
+                        if dotenv_path.exists():
+                            load_dotenv(dotenv_path=dotenv_path)
+                            token = os.getenv("TUSHARE_TOKEN")
+                            if token:
+                                break
+            except Exception:
+                pass  # 静默失败
+
+        if not token:
+            # 最终还是没有 TOKEN，则初始化失败
+            return False
+
+        try:
+            _tushare().set_token(token)
+            return True
+        except Exception:
+            return False
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Yahoo Finance：先 download，再使用 Ticker.history 作为二次尝试。"""
+    name = "yfinance"
+    prior_latency = 1.0
+    upstream = "yahoo"
+
+    def fetch(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame | None:
+        symbol = to_yahoo_symbol(symbol)
+        # yfinance 的 end 为开区间，顺延一天使结束日期包含在内（与 Tushare 一致）
+        end_date = (datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+        errors = []
+        yf = _yfinance()
+        try:
+            # 第一尝试：download 按区间获取
+            df = yf.download(
+                symbol,
+                start=start_date,
+                end=end_date,
+                interval="1d",
+                progress=False,
+                threads=False,
+            )
+            df = normalize_ohlcv(df)
+            if df is not None:
+                return df
+        except Exception as e:
+            errors.append(e)
+        try:
+            # 第二尝试：Ticker.history，部分标的在 download 下会返回空
+            df = normalize_ohlcv(yf.Ticker(symbol).history(start=start_date, end=end_date, interval="1d"))
+            if df is not None:
+                return df
+        except Exception as e:
+            errors.append(e)
+        if errors:
+            raise RuntimeError("; ".join(str(e) for e in errors))
+        return None
+
+    def fetch_many(self, symbols: List[str], start_date: str, end_date: str) -> Dict[str, pd.DataFrame]:
+        """一次 yf.download 获取多个标的（threads=True 由 yfinance 内部并发）。"""
+        if len(symbols) == 1:
+            return super().fetch_many(symbols, start_date, end_date)
+        tickers = {to_yahoo_symbol(s): s for s in symbols}
+        end_date = (datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+        raw = _yfinance().download(
+            list(tickers),
+            start=start_date,
+            end=end_date,
+            interval="1d",
+            progress=False,
+            threads=True,
+            group_by="ticker",
+        )
+        if raw is None or raw.empty or not isinstance(raw.columns, pd.MultiIndex):
+            return {}
+        result = {}
+        available = set(raw.columns.get_level_values(0))
+        for ticker, symbol in tickers.items():
+            if ticker not in available:
+                continue
+            df = normalize_ohlcv(raw[ticker])
+            result[symbol] = df if df is not None else empty_ohlcv()
+        return result
+
+
+class StooqProvider(MarketDataProvider):
+    """Stooq（经 pandas-datareader），作为 yfinance 限流时的回退，不支持 A 股代码。"""
+    name = "Stooq"
+    prior_latency = 2.0
+    upstream = "stooq"
+
+    def supports(self, symbol: str) -> bool:
+        return HAS_PDR and not is_china_equity(symbol)
+
+    def fetch(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame | None:
+        # Stooq 使用 'YYYY-MM-DD' 日期格式，符号如 'AAPL'、'MSFT'
+        start_dt = datetime.strptime(start_date, "%Y-%m-%d")
+        end_dt = datetime.strptime(end_date, "%Y-%m-%d")
+        return normalize_ohlcv(_datareader().DataReader(symbol.strip(), "stooq", start=start_dt, end=end_dt))
+
+
+def default_providers() -> list[MarketDataProvider]:
+    """默认数据源，顺序即无实测数据时的优先级。"""
+    return [TushareProvider(), YFinanceProvider(), StooqProvider()]
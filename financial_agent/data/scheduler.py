@@ -0,0 +1,274 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from ..core.tracing import get_tracer
+from ..core.upstream import UpstreamUnavailable, call_upstream, get_guard
+from .frames import empty_ohlcv
+from .providers import MarketDataProvider, default_providers
+
+EMPTY_RESULT = "返回数据为空"
+
+
+@dataclass
+class ProviderStats:
+    """单个数据源的实测表现，用于自适应排序。"""
+    calls: int = 0
+    successes: int = 0
+    failures: int = 0
+    ewma_latency: Optional[float] = None
+    last_error: str = ""
+
+    @property
+    def success_rate(self) -> float:
+        # 拉普拉斯平滑，避免少量样本把数据源“判死”
+        return (self.successes + 1) / (self.calls + 2)
+
+
+class ProviderScheduler:
+    """
+    多数据源调度器。在线程池中按自适应顺序启动数据源，取第一个返回非空数据的结果，
+    其余尚未开始的请求直接取消，已在执行的结果被丢弃（但仍计入统计）。
+
+    mode:
+    - "hedged"：先启动最优数据源，超过 hedge_delay 秒仍未返回再启动下一个（默认）；
+    - "race"：所有数据源同时启动；
+    - "serial"：逐个尝试，前一个失败才启动下一个（原有行为）。
+    """
+
+    EWMA_ALPHA = 0.3
+
+    def __init__(
+        self,
+        providers: List[MarketDataProvider] | None = None,
+        mode: str | None = None,
+        hedge_delay: float | None = None,
+        timeout: float | None = None,
+        max_workers: int | None = None,
+    ):
+        self.providers = providers if providers is not None else default_providers()
+        self.mode = mode or os.getenv("FETCH_MODE", "hedged")
+        if self.mode not in ("hedged", "race", "serial"):
+            raise ValueError(f"未知的调度模式: {self.mode}")
+        self.hedge_delay = hedge_delay if hedge_delay is not None else float(os.getenv("FETCH_HEDGE_DELAY", "1.5"))
+        self.timeout = timeout if timeout is not None else float(os.getenv("FETCH_TIMEOUT", "30"))
+        workers = max_workers or int(os.getenv("FETCH_MAX_WORKERS", "8"))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="provider")
+        self._stats: Dict[str, ProviderStats] = {p.name: ProviderStats() for p in self.providers}
+        self._lock = threading.Lock()
+
+    def ordered(self, symbol: str) -> List[MarketDataProvider]:
+        """支持该标的的数据源，按“期望耗时 / 成功率”升序排列；所属上游熔断中的数据源跳过（全部熔断时仍保留）。"""
+        candidates = []
+        for p in self.providers:
+            try:
+                if p.supports(symbol):
+                    candidates.append(p)
+            except Exception:
+                continue
+        available = [p for p in candidates if not p.upstream or get_guard(p.upstream).breaker.state != "open"]
+        candidates = available or candidates
+        with self._lock:
+            def cost(p: MarketDataProvider) -> float:
+                s = self._stats[p.name]
+                latency = s.ewma_latency if s.ewma_latency is not None else p.prior_latency
+                return latency / s.success_rate
+            return sorted(candidates, key=cost)
+
+    def fetch(self, symbol: str, start_date: str, end_date: str) -> Tuple[Optional[pd.DataFrame], str]:
+        """
+        获取日K线（闭区间）。返回 (DataFrame, 数据源名称)；全部失败时返回 (None, 错误说明)。
+        尝试过的数据源都成功返回、但都没有数据时返回空 DataFrame（区间内没有交易）；
+        只要有一个失败或超时就返回 None，避免把暂时的故障当作“没有交易”缓存下来。
+        """
+        candidates = self.ordered(symbol)
+        if not candidates:
+            return None, f"没有可用于 {symbol} 的数据源。如需 A 股数据，请在 configs/.env 配置 TUSHARE_TOKEN。"
+
+        if self.mode == "race":
+            delay = 0.0
+        elif self.mode == "serial":
+            delay = None
+        else:
+            delay = self.hedge_delay
+
+        pending: Dict[Future, MarketDataProvider] = {}
+        errors: List[str] = []
+        empty_source = ""
+        failed = False
+        queue = list(candidates)
+        deadline = time.monotonic() + self.timeout
+
+        def launch() -> None:
+            provider = queue.pop(0)
+            # 在调用方的上下文中执行，取数的 span 挂在当前工具调用下
+            future = self._executor.submit(contextvars.copy_context().run, self._timed_fetch,
+                                           provider, symbol, start_date, end_date)
+            pending[future] = provider
+
+        launch()
+        while delay == 0.0 and queue:
+            launch()
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                errors.append(f"超时（{self.timeout:.0f}s）")
+                failed = True
+                break
+            wait_for = remaining if delay is None or not queue else min(delay, remaining)
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            if not done:
+                # 对冲：当前数据源迟迟未返回，提前启动下一个
+                if queue:
+                    launch()
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                df, error = future.result()
+                if df is not None:
+                    for other in pending:
+                        other.cancel()
+                    return df, provider.name
+                if error == EMPTY_RESULT:
+                    empty_source = empty_source or provider.name
+                else:
+                    failed = True
+                errors.append(f"{provider.name}: {error}")
+            # 有数据源失败时不必等待对冲间隔，立即启动下一个
+            if queue:
+                launch()
+        for other in pending:
+            other.cancel()
+        if empty_source and not failed:
+            return empty_ohlcv(), empty_source
+        return None, (
+            f"所有数据源均未能获取 {symbol} 从 {start_date} 到 {end_date} 的数据。"
+            f"请尝试缩短日期范围或稍后重试，A 股可配置 TUSHARE_TOKEN 使用 Tushare。错误: {'; '.join(errors)}"
+        )
+
+    def fetch_many(
+        self, symbols: List[str], start_date: str, end_date: str
+    ) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+        """批量获取多个标的。按各标的当前最优数据源分组，每组一次批量请求、各组并发执行；
+        未取到的标的换用下一个数据源再试。返回 (frames, sources)，失败标的在 sources 中为错误说明；
+        尝试过的数据源都成功返回、但都没有数据的标的对应空 DataFrame（有一个失败或超时即不算）。
+        """
+        frames: Dict[str, pd.DataFrame] = {}
+        sources: Dict[str, str] = {}
+        tried: Dict[str, set] = {s: set() for s in symbols}
+        empty: Dict[str, str] = {}
+        failed: set = set()
+        remaining = list(dict.fromkeys(symbols))
+        deadline = time.monotonic() + self.timeout
+        while remaining:
+            groups: Dict[str, Tuple[MarketDataProvider, List[str]]] = {}
+            for symbol in remaining:
+                provider = next((p for p in self.ordered(symbol) if p.name not in tried[symbol]), None)
+                if provider is None:
+                    sources.setdefault(symbol, f"所有数据源均未能获取 {symbol} 的数据")
+                    continue
+                tried[symbol].add(provider.name)
+                groups.setdefault(provider.name, (provider, []))[1].append(symbol)
+            futures = {
+                self._executor.submit(contextvars.copy_context().run, self._timed_fetch_many,
+                                      provider, group, start_date, end_date): (provider, group)
+                for provider, group in groups.values()
+            }
+            done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+            for future in not_done:
+                future.cancel()
+            remaining = []
+            for future, (provider, group) in futures.items():
+                result, error = future.result() if future in done else ({}, f"超时（{self.timeout:.0f}s）")
+                for symbol in group:
+                    if symbol in result and not result[symbol].empty:
+                        frames[symbol] = result[symbol]
+                        sources[symbol] = provider.name
+                    else:
+                        if symbol in result:
+                            empty.setdefault(symbol, provider.name)
+                        else:
+                            failed.add(symbol)
+                        sources[symbol] = f"{provider.name}: {error or EMPTY_RESULT}"
+                        remaining.append(symbol)
+            if time.monotonic() >= deadline:
+                break
+        for symbol, name in empty.items():
+            if symbol not in frames and symbol not in failed:
+                frames[symbol], sources[symbol] = empty_ohlcv(), name
+        return frames, sources
+
+    def stats(self) -> Dict[str, dict]:
+        """各数据源的调用次数、成功率与平均耗时。"""
+        with self._lock:
+            return {
+                name: {
+                    "calls": s.calls,
+                    "successes": s.successes,
+                    "failures": s.failures,
+                    "success_rate": round(s.success_rate, 3),
+                    "ewma_latency": None if s.ewma_latency is None else round(s.ewma_latency, 3),
+                    "last_error": s.last_error,
+                }
+                for name, s in self._stats.items()
+            }
+
+    def _timed_fetch(
+        self, provider: MarketDataProvider, symbol: str, start_date: str, end_date: str
+    ) -> Tuple[Optional[pd.DataFrame], str]:
+        span = get_tracer().start_span("provider.fetch", provider.name, symbols=1)
+        started = time.perf_counter()
+        error = ""
+        measured = True
+        try:
+            df = call_upstream(provider.upstream, lambda: provider.fetch(symbol, start_date, end_date))
+            if df is None or df.empty:
+                df, error = None, EMPTY_RESULT
+        except Exception as e:
+            df, error = None, str(e) or e.__class__.__name__
+            # 熔断时请求没有发出，不计入耗时与成功率
+            measured = not isinstance(e, UpstreamUnavailable)
+        if measured:
+            self._record(provider.name, time.perf_counter() - started, df is not None, error)
+        span.end(error or None)
+        return df, error
+
+    def _timed_fetch_many(
+        self, provider: MarketDataProvider, symbols: List[str], start_date: str, end_date: str
+    ) -> Tuple[Dict[str, pd.DataFrame], str]:
+        span = get_tracer().start_span("provider.fetch", provider.name, symbols=len(symbols))
+        started = time.perf_counter()
+        error = ""
+        measured = True
+        try:
+            frames = call_upstream(provider.upstream, lambda: provider.fetch_many(symbols, start_date, end_date))
+            result = {s: df for s, df in frames.items() if df is not None}
+            returned = sum(not df.empty for df in result.values())
+        except Exception as e:
+            result, error, returned = {}, str(e) or e.__class__.__name__, 0
+            measured = not isinstance(e, UpstreamUnavailable)
+        if measured:
+            self._record(provider.name, time.perf_counter() - started, returned > 0, error or EMPTY_RESULT)
+        span.set(returned=returned)
+        span.end(None if returned else error or EMPTY_RESULT)
+        return result, error
+
+    def _record(self, name: str, latency: float, ok: bool, error: str) -> None:
+        with self._lock:
+            s = self._stats.setdefault(name, ProviderStats())
+            s.calls += 1
+            if ok:
+                s.successes += 1
+            else:
+                s.failures += 1
+                s.last_error = error
+            if s.ewma_latency is None:
+                s.ewma_latency = latency
+            else:
+                s.ewma_latency = self.EWMA_ALPHA * latency + (1 - self.EWMA_ALPHA) * s.ewma_latency
@@ -0,0 +1,157 @@
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..core.tokens import estimate_tokens
+
+TRADING_DAYS_PER_YEAR = 252
+_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+
+def make_handle(symbol: str, start_date: str, end_date: str) -> str:
+    """数据句柄：由标的与区间确定，便于后续工具或追问引用同一份完整数据。"""
+    return f"{symbol.upper().strip()}@{start_date}~{end_date}"
+
+
+def parse_handle(handle: str) -> Optional[tuple[str, str, str]]:
+    """解析数据句柄为 (symbol, start_date, end_date)，格式不符返回 None。"""
+    try:
+        symbol, dates = handle.strip().split("@", 1)
+        start_date, end_date = dates.split("~", 1)
+        return symbol, start_date, end_date
+    except ValueError:
+        return None
+
+
+class FrameStore:
+    """进程内的完整日K线暂存（LRU），摘要只输出统计信息，完整数据通过句柄取回。"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._frames: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, handle: str, df: pd.DataFrame) -> str:
+        with self._lock:
+            self._frames[handle] = df
+            self._frames.move_to_end(handle)
+            while len(self._frames) > self.max_entries:
+                self._frames.popitem(last=False)
+        return handle
+
+    def get(self, handle: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            df = self._frames.get(handle)
+            if df is not None:
+                self._frames.move_to_end(handle)
+            return df
+
+
+def resample_bars(df: pd.DataFrame, freq: str) -> pd.DataFrame:
+    """按周（'W-FRI'）或月（'M'）聚合日K线，索引为每个周期内最后一个交易日。"""
+    periods = df.index.to_period(freq)
+    agg = {c: f for c, f in _AGG.items() if c in df.columns}
+    bars = df.groupby(periods).agg(agg)
+    bars.index = df.index.to_series().groupby(periods).max().dt.strftime("%Y-%m-%d").values
+    return bars
+
+
+def resample_closes(closes: pd.DataFrame, freq: str) -> pd.DataFrame:
+    """多标的对齐收盘价表按周期取最后一个有效值，索引为周期内最后一个交易日。"""
+    periods = closes.index.to_period(freq)
+    result = closes.groupby(periods).last()
+    result.index = closes.index.to_series().groupby(periods).max().dt.strftime("%Y-%m-%d").values
+    return result
+
+
+def compute_stats(df: pd.DataFrame) -> dict:
+    """区间统计（全部为向量化计算）：首末价、涨跌幅、极值及日期、波动率、最大回撤等。"""
+    close = df["Close"].to_numpy(dtype=float)
+    high = df["High"].to_numpy(dtype=float) if "High" in df else close
+    low = df["Low"].to_numpy(dtype=float) if "Low" in df else close
+    returns = np.diff(np.log(close)) if len(close) > 1 else np.array([])
+    running_max = np.maximum.accumulate(close)
+    stats = {
+        "days": len(close),
+        "first_close": close[0],
+        "last_close": close[-1],
+        "change_pct": (close[-1] / close[0] - 1) * 100,
+        "high": high.max(),
+        "high_date": df.index[int(high.argmax())].strftime("%Y-%m-%d"),
+        "low": low.min(),
+        "low_date": df.index[int(low.argmin())].strftime("%Y-%m-%d"),
+        "max_drawdown_pct": ((close / running_max) - 1).min() * 100,
+        "daily_vol_pct": returns.std(ddof=1) * 100 if len(returns) > 1 else 0.0,
+        "best_day_pct": (np.exp(returns.max()) - 1) * 100 if len(returns) else 0.0,
+        "worst_day_pct": (np.exp(returns.min()) - 1) * 100 if len(returns) else 0.0,
+    }
+    stats["annual_vol_pct"] = stats["daily_vol_pct"] * np.sqrt(TRADING_DAYS_PER_YEAR)
+    if "Volume" in df:
+        stats["avg_volume"] = float(df["Volume"].mean())
+    return stats
+
+
+def _format_table(df: pd.DataFrame) -> str:
+    if "Volume" in df:
+        df = df.assign(Volume=df["Volume"].round().astype("Int64"))
+    return df.to_string(float_format=lambda x: f"{x:.2f}")
+
+
+def summarize_ohlcv(
+    df: pd.DataFrame,
+    header: str,
+    token_budget: int = 800,
+    last_n: int = 5,
+) -> str:
+    """
+    生成不超过 token_budget（估算值）的紧凑摘要：区间统计 + 月线/周线 + 最近 N 个交易日。
+    完整表格本身就在预算内时直接返回完整表格；否则按“周线 -> 最近 N 行 -> 月线”的顺序逐步裁剪。
+    """
+    full = f"{header}\n{_format_table(df)}"
+    if estimate_tokens(full) <= token_budget:
+        return full
+
+    s = compute_stats(df)
+    lines = [
+        header,
+        f"区间统计（{s['days']} 个交易日）：期初收盘 {s['first_close']:.2f}，期末收盘 {s['last_close']:.2f}，"
+        f"区间涨跌幅 {s['change_pct']:+.2f}%；最高 {s['high']:.2f}（{s['high_date']}），最低 {s['low']:.2f}（{s['low_date']}）；"
+        f"日波动率 {s['daily_vol_pct']:.2f}%，年化波动率 {s['annual_vol_pct']:.2f}%，最大回撤 {s['max_drawdown_pct']:.2f}%；"
+        f"单日最大涨幅 {s['best_day_pct']:+.2f}%，最大跌幅 {s['worst_day_pct']:+.2f}%"
+        + (f"；日均成交量 {s['avg_volume']:.0f}" if "avg_volume" in s else ""),
+    ]
+    base = "\n".join(lines)
+
+    monthly = resample_bars(df, "M") if s["days"] > 40 else None
+    weekly = resample_bars(df, "W-FRI") if s["days"] > 10 else None
+
+    def render(n_rows: int, n_weeks: int, n_months: int) -> str:
+        parts: List[str] = [base]
+        if monthly is not None and n_months > 0:
+            parts.append(f"月线（最近 {min(n_months, len(monthly))} 个月）：\n{_format_table(monthly.tail(n_months))}")
+        if weekly is not None and n_weeks > 0:
+            parts.append(f"周线（最近 {min(n_weeks, len(weekly))} 周）：\n{_format_table(weekly.tail(n_weeks))}")
+        if n_rows > 0:
+            parts.append(f"最近 {min(n_rows, s['days'])} 个交易日：\n{_format_table(df.tail(n_rows))}")
+        return "\n".join(parts)
+
+    n_months = len(monthly) if monthly is not None else 0
+    n_weeks = len(weekly) if weekly is not None else 0
+    n_rows = last_n
+    while True:
+        text = render(n_rows, n_weeks, n_months)
+        if estimate_tokens(text) <= token_budget:
+            return text
+        if n_weeks > 0:
+            n_weeks = n_weeks // 2 if n_weeks > 4 else 0
+        elif n_rows > 1:
+            n_rows -= 1
+        elif n_months > 0:
+            n_months = n_months // 2 if n_months > 3 else 0
+        elif n_rows > 0:
+            n_rows = 0
+        else:
+            return text
@@ -1,5 +1,6 @@
 from financial_agent.core.agent import create_financial_agent
 from financial_agent.core.llm_adapter import VolcanoLLM
+from financial_agent.core.tracing import get_tracer
 from financial_agent.tools.financial_data_tool import FinancialDataTool
 # from financial_agent.tools.knowledge_base_tool import KnowledgeBaseTool
 
@@ -30,7 +31,7 @@ def main():
     for user_query in queries:
         print(f"\n用户提问: {user_query}")
         try:
-            response = agent.invoke({"input": user_query})
+            response = agent.invoke({"input": user_query}, config={"callbacks": get_tracer().callbacks()})
             print(f"智能体回答: {response['output']}")
         except Exception as e:
             print(f"执行过程中发生错误: {e}")
@@ -1,205 +1,256 @@
 from langchain.tools import BaseTool
-import yfinance as yf
+import os
 import pandas as pd
 from pydantic import BaseModel, Field
-from typing import Type
-import os
-from pathlib import Path
-from datetime import datetime
-import tushare as ts
-try:
-    # 作为备用数据源（避免 yfinance 限流）
-    from pandas_datareader import data as pdr
-    HAS_PDR = True
-except Exception:
-    HAS_PDR = False
-try:
-    from dotenv import load_dotenv
-    HAS_DOTENV = True
-except Exception:
-    HAS_DOTENV = False
-from datetime import datetime
-try:
-    # 作为备用数据源（避免 yfinance 限流）
-    from pandas_datareader import data as pdr
-    HAS_PDR = True
-except Exception:
-    HAS_PDR = False
+from typing import Any, Dict, List, Type
+from ..data.price_cache import CACHE_SOURCE, NO_TRADES, PriceCache, date_range_error
+from ..data.providers import is_china_equity, to_ts_code
+from ..data.scheduler import ProviderScheduler
+from ..data.summary import FrameStore, make_handle, parse_handle, resample_closes, summarize_ohlcv
+from ..core.executor import run_blocking
+from ..core.tokens import estimate_tokens
+
+OUTPUT_MODE_DESCRIPTION = "输出模式：'summary'（默认，紧凑的统计摘要与最近行情）或 'full'（完整逐日数据，仅在确需逐日明细时使用）"
 
 class StockQueryInput(BaseModel):
     """获取股票日K线数据的输入模型"""
     symbol: str = Field(description="股票代码，例如 '600519.SS' 表示贵州茅台")
     start_date: str = Field(description="开始日期，格式为 'YYYY-MM-DD'")
     end_date: str = Field(description="结束日期，格式为 'YYYY-MM-DD'")
+    output_mode: str = Field(default="summary", description=OUTPUT_MODE_DESCRIPTION)
+
+class BatchStockQueryInput(BaseModel):
+    """批量获取多只股票日K线数据的输入模型"""
+    symbols: List[str] = Field(description="股票代码列表，例如 ['600519.SS', '000858.SZ', 'AAPL']")
+    start_date: str = Field(description="开始日期，格式为 'YYYY-MM-DD'")
+    end_date: str = Field(description="结束日期，格式为 'YYYY-MM-DD'")
+    output_mode: str = Field(default="summary", description=OUTPUT_MODE_DESCRIPTION)
+
+class FrameHandleInput(BaseModel):
+    """按数据句柄取回完整日K线的输入模型"""
+    handle: str = Field(description="此前取数结果中给出的数据句柄，例如 '600519.SH@2024-01-01~2024-03-31'")
 
 class FinancialDataTool(BaseTool):
     name: str = "Financial Data Retrieval"
     description: str = "用于获取股票的日K线数据。输入应为一个包含'symbol', 'start_date', 'end_date'的字典。"
     args_schema: Type[BaseModel] = StockQueryInput
+    # 本地日K线缓存；传入 use_cache=False 时每次都直接请求数据源
+    use_cache: bool = True
+    price_cache: Any = None
+    # 多数据源调度器（Tushare / yfinance / Stooq），可传入自定义数据源便于离线测试
+    scheduler: Any = None
+    # 摘要模式下单次输出的 token 预算（估算值）与保留的最近交易日行数
+    token_budget: int = 0
+    summary_last_rows: int = 0
+    # 完整数据暂存，摘要中的数据句柄可用于后续取回
+    frame_store: Any = None
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        if self.use_cache and self.price_cache is None:
+            self.price_cache = PriceCache()
+        if self.scheduler is None:
+            self.scheduler = ProviderScheduler()
+        if self.frame_store is None:
+            self.frame_store = FrameStore()
+        self.token_budget = self.token_budget or int(os.getenv("PRICE_SUMMARY_TOKEN_BUDGET", "800"))
+        self.summary_last_rows = self.summary_last_rows or int(os.getenv("PRICE_SUMMARY_LAST_ROWS", "5"))
+
+    def _run(self, symbol: str, start_date: str, end_date: str, output_mode: str = "summary") -> str:
+        """执行获取日K线数据的核心逻辑。优先读取本地缓存，缺失区间再由调度器并发请求各数据源。
+        默认返回预算内的统计摘要，完整数据保存在数据句柄下。
+        """
+        error = date_range_error(start_date, end_date)
+        if error:
+            return error
+        if self.price_cache is not None:
+            df, source = self.price_cache.get(
+                self._cache_key(symbol),
+                start_date,
+                end_date,
+                lambda _, sd, ed: self._fetch_frame(symbol, sd, ed),
+            )
+        else:
+            df, source = self._fetch_frame(symbol, start_date, end_date)
+        if df is None:
+            # 获取失败时 source 为错误说明
+            return source
+        if df.empty:
+            return NO_TRADES
+        handle = self.frame_store.put(make_handle(self._cache_key(symbol), start_date, end_date), df)
+        header = f"({source})成功获取 {symbol} 从 {start_date} 到 {end_date} 的日K线数据（数据句柄 {handle}）："
+        if output_mode == "full":
+            return f"{header}\n{df.to_string()}"
+        return summarize_ohlcv(df, header, self.token_budget, self.summary_last_rows)
+
+    def get_frame(self, handle: str) -> pd.DataFrame | None:
+        """按数据句柄取回完整日K线；暂存已淘汰时从本地缓存或数据源重新读取。"""
+        df = self.frame_store.get(handle)
+        if df is not None:
+            return df
+        parsed = parse_handle(handle)
+        if parsed is None:
+            return None
+        symbol, start_date, end_date = parsed
+        if self.price_cache is not None:
+            df, _ = self.price_cache.get(symbol, start_date, end_date, self._fetch_frame)
+        else:
+            df, _ = self._fetch_frame(symbol, start_date, end_date)
+        if df is None or df.empty:
+            return None
+        self.frame_store.put(handle, df)
+        return df
+
+    async def _arun(self, symbol: str, start_date: str, end_date: str, output_mode: str = "summary") -> str:
+        """异步入口：缓存读写与各数据源 SDK 均为阻塞调用，交给有界线程池执行，不阻塞事件循环。"""
+        return await run_blocking(self._run, symbol, start_date, end_date, output_mode)
+
+    def _fetch_frame(self, symbol: str, start_date: str, end_date: str) -> tuple[pd.DataFrame | None, str]:
+        """通过调度器获取日K线（日期为闭区间）。
+        返回 (DataFrame, 数据源名称)；全部失败时返回 (None, 错误说明)。
+        """
+        return self.scheduler.fetch(symbol, start_date, end_date)
 
-    def _run(self, symbol: str, start_date: str, end_date: str) -> str:
-        """执行获取日K线数据的核心逻辑。优先 yfinance，失败则多重回退。"""
-        # 若为 A 股代码，优先使用 Tushare（更稳定）
+    def _cache_key(self, symbol: str) -> str:
+        """缓存键：A 股统一为 ts_code，避免 '600519' 与 '600519.SS' 各存一份。"""
         if self._is_china_equity(symbol):
-            ts_init_ok = self._init_tushare()
             ts_code = self._to_ts_code(symbol)
-            if ts_init_ok and ts_code:
-                ts_result = self._fetch_with_tushare(ts_code, start_date, end_date)
-                if ts_result:
-                    return ts_result
-                # 若 Tushare 返回空或失败，继续尝试国际源
-        # 国际源（yfinance），失败则回退到更稳健的方式与 Stooq
-        df = self._fetch_with_yfinance(symbol, start_date, end_date)
-        if df is not None and not df.empty:
-            return f"成功获取 {symbol} 从 {start_date} 到 {end_date} 的日K线数据：\n{df.to_string()}"
-        # yfinance 失败或返回空，使用回退数据源（需安装 pandas-datareader）
-        return self._fallback_fetch(symbol, start_date, end_date)
-
-    def _arun(self, query: str):
-        raise NotImplementedError("This tool does not support async")
-
-    def _init_tushare(self) -> bool:
-        """初始化 Tushare TOKEN。
-        直接从环境变量读取 TUSHARE_TOKEN。
-        """
-        token = os.getenv("TUSHARE_TOKEN")
-        if not token:
-            # 如果环境变量中没有找到 TUSHARE_TOKEN，则尝试从 .env 文件加载
-            try:
-                if HAS_DOTENV:
-                    # .env 文件应该在项目根目录的 configs 文件夹下
-                    dotenv_path = Path(__file__).resolve().parents[2] / "configs" / ".env"
-                    if dotenv_path.exists():
-                        load_dotenv(dotenv_path=dotenv_path)
-                        token = os.getenv("TUSHARE_TOKEN")
-            except Exception:
-                pass  # 静默失败
-
-        if not token:
-            # 最终还是没有 TOKEN，则初始化失败
-            return False
-        
-        try:
-            ts.set_token(token)
-            return True
-        except Exception:
-            return False
+            if ts_code:
+                return ts_code
+        return symbol.upper().strip()
 
     def _is_china_equity(self, symbol: str) -> bool:
         """判断是否为中国 A 股或北交所代码。支持 '600519', '600519.SH', '600519.SS' 等格式。"""
-        s = symbol.upper().strip()
-        # 数字 6 位直接认定为 A 股
-        if s.isdigit() and len(s) == 6:
-            return True
-        # 含交易所后缀
-        if ".SH" in s or ".SZ" in s or ".BJ" in s or ".SS" in s:
-            return True
-        return False
+        return is_china_equity(symbol)
 
     def _to_ts_code(self, symbol: str) -> str | None:
-        """将输入代码转换为 Tushare ts_code 格式，例如 '600519.SH'。
-        规则：
-        - 以 '6' 开头 -> 上交所 'SH'
-        - 以 '0' 或 '3' 开头 -> 深交所 'SZ'
-        - 以 '8' 或 '4' 开头 -> 北交所 'BJ'
-        - 带 '.SS' 的 -> 上交所 'SH'
-        - 已带 '.SH/.SZ/.BJ' 保持不变
-        """
-        s = symbol.upper().strip()
-        if ".SS" in s:
-            base = s.replace(".SS", "")
-            if base.isdigit():
-                return f"{base}.SH"
-            return None
-        if any(s.endswith(suf) for suf in [".SH", ".SZ", ".BJ"]):
-            return s
-        # 纯数字处理
-        if s.isdigit() and len(s) == 6:
-            if s[0] == "6":
-                return f"{s}.SH"
-            if s[0] in ("0", "3"):
-                return f"{s}.SZ"
-            if s[0] in ("8", "4"):
-                return f"{s}.BJ"
-        return None
-
-    def _fetch_with_tushare(self, ts_code: str, start_date: str, end_date: str) -> str | None:
-        """使用 Tushare 获取 A 股日线数据。返回格式化字符串，失败返回 None。"""
-        try:
-            # 直接从环境读取 TOKEN，避免 set_token 未生效问题
-            token = os.getenv("TUSHARE_TOKEN")
-            pro = ts.pro_api(token) if token else ts.pro_api()
-            sd = start_date.replace("-", "")
-            ed = end_date.replace("-", "")
-            df = pro.daily(ts_code=ts_code, start_date=sd, end_date=ed)
-            if df is None or df.empty:
-                return None
-            # Tushare 返回按 trade_date 倒序，一般需要按日期升序展示
-            df = df.sort_values(by="trade_date").rename(columns={
-                "open": "Open",
-                "high": "High",
-                "low": "Low",
-                "close": "Close",
-                "vol": "Volume",
-            })
-            # 将 trade_date 转换为 DatetimeIndex 并格式化
-            df["trade_date"] = pd.to_datetime(df["trade_date"])
-            df = df.set_index("trade_date")
-            return f"(Tushare)成功获取 {ts_code} 从 {start_date} 到 {end_date} 的日K线数据：\n{df[['Open','High','Low','Close','Volume']].to_string()}"
-        except Exception:
-            return None
+        """将输入代码转换为 Tushare ts_code 格式，例如 '600519.SH'。"""
+        return to_ts_code(symbol)
 
-    def _fallback_fetch(self, symbol: str, start_date: str, end_date: str, err: Exception | None = None) -> str:
-        """当 yfinance 限流或返回空数据时，尝试使用 Stooq 数据源回退"""
-        if not HAS_PDR:
-            return (
-                f"获取数据失败，且备用数据源不可用。错误: {err}. "
-                f"如需更稳定的 A 股数据，请在 configs/.env 配置 TUSHARE_TOKEN 并使用 Tushare。"
-            )
 
-        try:
-            # Stooq 使用 'YYYY-MM-DD' 日期格式，符号如 'AAPL'、'MSFT'；不支持 A 股代码
-            # 转换日期，确保格式正确
-            start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-            end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-            df = pdr.DataReader(symbol, "stooq", start=start_dt, end=end_dt)
-            if df is None or df.empty:
-                return (
-                    f"yfinance 获取失败且 Stooq 数据为空。"
-                    f"请尝试缩短日期范围或更换标的（如 AAPL、MSFT），"
-                    f"或改用 Tushare 获取 A 股数据（需配置 TUSHARE_TOKEN）。原始错误: {err}"
-                )
-            # 与 yfinance 字段对齐展示
-            df = df.sort_index()
-            return f"(回退)成功获取 {symbol} 从 {start_date} 到 {end_date} 的日K线数据：\n{df.to_string()}"
-        except Exception as e2:
-            return (
-                f"yfinance 获取失败且 Stooq 回退失败。请稍后重试或更换数据源。"
-                f"yfinance错误: {err}; Stooq错误: {e2}"
-            )
+class BatchFinancialDataTool(FinancialDataTool):
+    name: str = "Batch Financial Data Retrieval"
+    description: str = (
+        "用于一次性获取多只股票同一区间的日K线数据并按日期对齐比较，适合对比多个标的的走势。"
+        "输入应为一个包含'symbols'（股票代码列表）, 'start_date', 'end_date'的字典。"
+    )
+    args_schema: Type[BaseModel] = BatchStockQueryInput
+
+    def _run(self, symbols: List[str], start_date: str, end_date: str, output_mode: str = "summary") -> str:
+        """批量获取并返回各标的区间概要与按日期对齐的收盘价表（摘要模式下按预算降采样）。"""
+        symbols = list(dict.fromkeys(s.strip() for s in symbols if s and s.strip()))
+        if not symbols:
+            return "请至少提供一个股票代码。"
+        error = date_range_error(start_date, end_date)
+        if error:
+            return error
+        frames, sources = self.fetch_frames(symbols, start_date, end_date)
 
-    def _fetch_with_yfinance(self, symbol: str, start_date: str, end_date: str):
-        """更稳健的 yfinance 获取逻辑：先 download，再使用 Ticker.history 作为二次尝试。"""
-        try:
-            # 第一尝试：download 按区间获取
-            df = yf.download(
-                symbol,
-                start=start_date,
-                end=end_date,
-                interval="1d",
-                progress=False,
-                threads=False,
+        lines = [f"成功获取 {len(frames)}/{len(symbols)} 只标的从 {start_date} 到 {end_date} 的日K线数据："]
+        for symbol in symbols:
+            df = frames.get(symbol)
+            if df is None:
+                lines.append(f"- {symbol}: 获取失败（{sources.get(symbol, '无数据')}）")
+                continue
+            handle = self.frame_store.put(make_handle(self._cache_key(symbol), start_date, end_date), df)
+            close = df["Close"]
+            change = (close.iloc[-1] / close.iloc[0] - 1) * 100
+            high = df["High"].max() if "High" in df else close.max()
+            low = df["Low"].min() if "Low" in df else close.min()
+            lines.append(
+                f"- {symbol} ({sources.get(symbol, CACHE_SOURCE)}): 期初收盘 {close.iloc[0]:.2f}，期末收盘 {close.iloc[-1]:.2f}，"
+                f"区间涨跌幅 {change:+.2f}%，最高 {high:.2f}，最低 {low:.2f}，交易日 {len(df)} 天，数据句柄 {handle}"
             )
-            if df is not None and not df.empty:
-                return df
-        except Exception:
-            pass
-        try:
-            # 第二尝试：Ticker.history，部分标的在 download 下会返回空
-            tk = yf.Ticker(symbol.strip())
-            df2 = tk.history(start=start_date, end=end_date, interval="1d")
-            if df2 is not None and not df2.empty:
-                return df2
-        except Exception:
-            pass
-        return None
\ No newline at end of file
+        if frames:
+            # 不同市场交易日不同，按日期外连接对齐，缺失处为 NaN
+            aligned = pd.concat({s: frames[s]["Close"] for s in symbols if s in frames}, axis=1).sort_index()
+            lines.append(self._aligned_section(aligned, "\n".join(lines), output_mode))
+        return "\n".join(lines)
+
+    async def _arun(self, symbols: List[str], start_date: str, end_date: str, output_mode: str = "summary") -> str:
+        return await run_blocking(self._run, symbols, start_date, end_date, output_mode)
+
+    def _aligned_section(self, aligned: pd.DataFrame, head: str, output_mode: str) -> str:
+        """对齐收盘价表：摘要模式下依次尝试 日线 -> 周线 -> 月线 -> 最近若干行，取第一个不超预算的。"""
+        table = f"收盘价（按日期对齐）：\n{aligned.to_string()}"
+        if output_mode == "full":
+            return table
+        budget = self.token_budget - estimate_tokens(head)
+        candidates = [table]
+        for freq, label in (("W-FRI", "周"), ("M", "月")):
+            closes = resample_closes(aligned, freq)
+            candidates.append(f"收盘价（{label}末，按日期对齐）：\n{closes.to_string(float_format=lambda x: f'{x:.2f}')}")
+        for text in candidates:
+            if estimate_tokens(text) <= budget:
+                return text
+        rows = max(1, self.summary_last_rows)
+        return f"收盘价（最近 {rows} 个交易日）：\n{aligned.tail(rows).to_string()}"
+
+    def fetch_frames(
+        self, symbols: List[str], start_date: str, end_date: str
+    ) -> tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+        """先查本地缓存，仅对有缺口的标的发起一次批量请求（按数据源分组）。只返回有数据的标的。"""
+        error = date_range_error(start_date, end_date)
+        if error:
+            return {}, {s: error for s in symbols}
+        if self.price_cache is None:
+            fetched, sources = self.scheduler.fetch_many(symbols, start_date, end_date)
+            for symbol in [s for s, df in fetched.items() if df.empty]:
+                del fetched[symbol]
+                sources[symbol] = NO_TRADES
+            return fetched, sources
+
+        keys = {s: self._cache_key(s) for s in symbols}
+        gaps = {s: self.price_cache.missing(keys[s], start_date, end_date) for s in symbols}
+        to_fetch = [s for s in symbols if gaps[s]]
+        fetched: Dict[str, pd.DataFrame] = {}
+        sources: Dict[str, str] = {}
+        if to_fetch:
+            # 批量接口只能共用一个日期窗口：取所有缺口的并集范围
+            window_start = min(g[0][0] for s, g in gaps.items() if g)
+            window_end = max(g[-1][1] for s, g in gaps.items() if g)
+            fetched, sources = self.scheduler.fetch_many(to_fetch, window_start, window_end)
+            for symbol, df in fetched.items():
+                self.price_cache.store(keys[symbol], [(window_start, window_end, df)])
+
+        frames: Dict[str, pd.DataFrame] = {}
+        for symbol in symbols:
+            df = self.price_cache.read(keys[symbol], start_date, end_date)
+            if df is not None:
+                frames[symbol] = df
+                if symbol not in to_fetch:
+                    sources[symbol] = CACHE_SOURCE
+                elif symbol not in fetched:
+                    sources[symbol] = f"{CACHE_SOURCE}，部分区间获取失败"
+            elif symbol not in to_fetch or symbol in fetched:
+                sources[symbol] = NO_TRADES
+        return frames, sources
+
+
+class FrameLookupTool(BaseTool):
+    name: str = "Price Data By Handle"
+    description: str = (
+        "用于按数据句柄取回此前取数结果的完整逐日日K线（摘要或对话记忆中只保留了句柄时使用）。"
+        "输入应为一个包含'handle'的字典。"
+    )
+    args_schema: Type[BaseModel] = FrameHandleInput
+    # 句柄的来源（与取数工具共用数据暂存与本地缓存）
+    data_tool: Any = None
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        if self.data_tool is None:
+            self.data_tool = FinancialDataTool()
+
+    def _run(self, handle: str) -> str:
+        """返回句柄对应的完整日K线；句柄格式不符或数据取不到时返回说明。"""
+        if parse_handle(handle) is None:
+            return f"无法识别的数据句柄：{handle}（格式应为 代码@开始日期~结束日期）"
+        handle = handle.strip()
+        df = self.data_tool.get_frame(handle)
+        if df is None or df.empty:
+            return f"数据句柄 {handle} 对应的数据已无法取回，请重新获取日K线。"
+        return f"数据句柄 {handle} 的完整日K线：\n{df.to_string()}"
+
+    async def _arun(self, handle: str) -> str:
+        return await run_blocking(self._run, handle)
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Type
+
+from langchain.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from ..core.executor import run_blocking
+from ..data.indicators import INDICATORS, WARMUP_DAYS, compute_indicators, describe_signals
+from ..data.price_cache import date_range_error
+from .financial_data_tool import BatchFinancialDataTool
+
+class IndicatorQueryInput(BaseModel):
+    """计算技术指标的输入模型"""
+    symbols: List[str] = Field(description="股票代码列表，单只股票也使用列表，例如 ['600519.SS']")
+    start_date: str = Field(description="开始日期，格式为 'YYYY-MM-DD'")
+    end_date: str = Field(description="结束日期，格式为 'YYYY-MM-DD'")
+    indicators: Optional[List[str]] = Field(
+        default=None,
+        description="需要计算的指标，可选 MA、EMA、MACD、KDJ、RSI、BOLL、ATR，默认全部",
+    )
+
+class TechnicalIndicatorTool(BaseTool):
+    name: str = "Technical Indicators"
+    description: str = (
+        "用于计算股票的技术指标（KDJ、MACD、RSI、BOLL、MA/EMA、ATR），返回最新数值、常见信号提示与最近几日的指标值，"
+        "支持一次计算多只股票。输入应为一个包含'symbols', 'start_date', 'end_date'，可选'indicators'的字典。"
+    )
+    args_schema: Type[BaseModel] = IndicatorQueryInput
+    # 行情来源（复用批量取数工具的本地缓存与数据源调度）
+    data_tool: Any = None
+    # 输出中保留的最近交易日行数
+    recent_rows: int = 3
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        if self.data_tool is None:
+            self.data_tool = BatchFinancialDataTool()
+
+    def _run(
+        self,
+        symbols: List[str],
+        start_date: str,
+        end_date: str,
+        indicators: Optional[List[str]] = None,
+    ) -> str:
+        """拉取含预热区间的日K线，批量计算指标后只输出 [start_date, end_date] 内的结果。"""
+        symbols = list(dict.fromkeys(s.strip() for s in symbols if s and s.strip()))
+        if not symbols:
+            return "请至少提供一个股票代码。"
+        error = date_range_error(start_date, end_date)
+        if error:
+            return error
+        # 约 WARMUP_DAYS 个交易日对应的自然日
+        warm_start = (datetime.strptime(start_date, "%Y-%m-%d") - timedelta(days=WARMUP_DAYS * 3 // 2)).strftime("%Y-%m-%d")
+        frames, sources = self.data_tool.fetch_frames(symbols, warm_start, end_date)
+        try:
+            results = compute_indicators(frames, indicators or INDICATORS)
+        except ValueError as e:
+            return str(e)
+
+        lines = [f"技术指标（{start_date} 至 {end_date}）："]
+        for symbol in symbols:
+            if symbol not in results:
+                lines.append(f"- {symbol}: 获取行情失败（{sources.get(symbol, '无数据')}）")
+                continue
+            ind = results[symbol].loc[start_date:end_date]
+            close = frames[symbol]["Close"].loc[start_date:end_date]
+            if ind.empty:
+                lines.append(f"- {symbol}: 该区间内没有交易数据")
+                continue
+            latest = ind.iloc[-1].dropna()
+            signals = describe_signals(ind, close)
+            lines.append(f"【{symbol}】最新交易日 {ind.index[-1]:%Y-%m-%d}，收盘 {close.iloc[-1]:.2f}")
+            lines.append("最新值：" + "，".join(f"{k}={v:.2f}" for k, v in latest.items()))
+            lines.append("信号：" + ("；".join(signals) if signals else "无明显信号"))
+            if self.recent_rows > 0:
+                recent = ind.tail(self.recent_rows).T
+                recent.columns = [f"{d:%m-%d}" for d in recent.columns]
+                lines.append(f"最近 {len(recent.columns)} 个交易日：\n{recent.to_string(float_format=lambda x: f'{x:.2f}')}")
+        return "\n".join(lines)
+
+    async def _arun(
+        self,
+        symbols: List[str],
+        start_date: str,
+        end_date: str,
+        indicators: Optional[List[str]] = None,
+    ) -> str:
+        """异步入口：取数与计算在有界线程池中执行。"""
+        return await run_blocking(self._run, symbols, start_date, end_date, indicators)
@@ -1,47 +1,132 @@
+import hashlib
 import os
+import threading
 from pathlib import Path
 from typing import Any
-from langchain_community.vectorstores import FAISS
-from ..core.llm_adapter import VolcanoLLM, VolcanoEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import CSVLoader
+from ..core.executor import run_blocking
+from ..core.embeddings import create_embeddings
+from ..core.llm_adapter import VolcanoLLM
 from langchain.tools import BaseTool
 
+KB_PATH = Path(__file__).resolve().parents[1] / "financial_knowledge_base.csv"
+# 影响文档切分的参数，变化时索引与基于知识库的缓存都需要重建
+KB_SIGNATURE = "chunk=1000,overlap=200"
+_fingerprint_memo: dict = {}
+# 工具名称；pydantic 模型的字段默认值在类上取不到，需要按名称判断工具的地方使用这个常量
+KB_TOOL_NAME = "Financial Knowledge Base"
+
+
+def kb_fingerprint() -> str:
+    """知识库内容指纹（源文件摘要 + 切分参数）；文件未改动（大小与修改时间不变）时不重新计算。"""
+    stat = KB_PATH.stat()
+    key = (stat.st_size, stat.st_mtime_ns)
+    if _fingerprint_memo.get("key") != key:
+        digest = hashlib.sha256(KB_PATH.read_bytes()).hexdigest()
+        _fingerprint_memo.update(key=key, value=f"{digest}:{KB_SIGNATURE}")
+    return _fingerprint_memo["value"]
+
+
 class KnowledgeBaseTool(BaseTool):
-    name: str = "Financial Knowledge Base"
+    name: str = KB_TOOL_NAME
     description: str = "Use this tool to answer questions about financial knowledge and terminology. The knowledge base contains definitions and explanations of various financial concepts."
     llm: Any = None
     retriever: Any = None
+    # 最近一次加载索引的统计（总块数、新嵌入块数、删除块数、是否内存映射）
+    index_stats: Any = None
+    # 索引就绪事件；后台构建失败时记录异常
+    ready: Any = None
+    build_error: Any = None
 
-    def __init__(self, llm):
+    def __init__(self, llm, background: bool = False):
+        """background=True 时在后台线程加载/构建索引，构造立即返回，其他工具可先行使用。"""
         super().__init__()
-        embeddings = VolcanoEmbeddings(
-            ark_api_key=os.getenv("ARK_API_KEY")
-        )
-        kb_path = Path(__file__).resolve().parents[1] / "financial_knowledge_base.csv"
-        loader = CSVLoader(file_path=str(kb_path), encoding='utf-8')
-        documents = loader.load()
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        texts = text_splitter.split_documents(documents)
-        vectorstore = FAISS.from_documents(texts, embeddings)
-        self.retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
         self.llm = llm
+        self.ready = threading.Event()
+        if background:
+            threading.Thread(target=self._build_in_background, name="kb-index", daemon=True).start()
+        else:
+            self._build_index()
+
+    def _build_index(self) -> None:
+        # FAISS 与文档加载器导入较慢，延迟到真正建索引时
+        from langchain_community.document_loaders import CSVLoader
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        from ..core.kb_index import KnowledgeBaseIndex
+
+        # 默认为方舟远程 Embedding；EMBEDDING_BACKEND=local 时使用本地嵌入，建库与检索都不联网
+        embeddings = create_embeddings()
+        kb_path = KB_PATH
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+
+        def load_documents():
+            loader = CSVLoader(file_path=str(kb_path), encoding='utf-8')
+            return text_splitter.split_documents(loader.load())
+
+        # 索引持久化在磁盘上，知识库未变化时不再调用 Embedding 接口
+        index = KnowledgeBaseIndex(embeddings)
+        vectorstore = index.load_or_build(kb_path, load_documents, signature=KB_SIGNATURE)
+        self.index_stats = dict(index.stats)
+        if os.getenv("KB_HYBRID", "1") != "0":
+            # 术语/别名命中与明确的 BM25 命中在本地完成，只有模糊查询才调用 Embedding 做向量检索
+            from ..core.hybrid_retriever import HybridRetriever
+            self.retriever = HybridRetriever.from_vectorstore(vectorstore, k=3)
+        else:
+            self.retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+        self.ready.set()
+
+    def _build_in_background(self) -> None:
+        try:
+            self._build_index()
+        except Exception as e:
+            self.build_error = e
+            self.ready.set()
+
+    @staticmethod
+    def _ready_timeout() -> float:
+        """检索前等待后台索引就绪的最长时间（秒）。"""
+        return float(os.getenv("KB_READY_TIMEOUT", "120"))
+
+    def _not_ready_reason(self) -> str | None:
+        """索引可用时返回 None，否则返回提示文本。"""
+        if not self.ready.is_set():
+            return "知识库索引仍在构建中，请稍后再试。"
+        if self.build_error is not None:
+            return f"知识库加载失败: {self.build_error}"
+        return None
 
     def _run(self, query: str) -> str:
         """简单检索并用 LLM 生成回答。返回纯文本字符串以兼容 LangChain Agent。"""
+        self.ready.wait(self._ready_timeout())
+        reason = self._not_ready_reason()
+        if reason:
+            return reason
         docs = self.retriever.get_relevant_documents(query)
+        prompt = self._build_prompt(query, docs)
+        try:
+            answer = self.llm.invoke(prompt)
+        except Exception:
+            # 兼容旧版 LLM 接口
+            answer = self.llm._call(prompt)
+        return str(answer)
+
+    async def _arun(self, query: str) -> str:
+        """异步检索（需要向量检索时查询向量走异步 Embedding 接口）并异步调用 LLM。"""
+        if not self.ready.is_set():
+            await run_blocking(self.ready.wait, self._ready_timeout())
+        reason = self._not_ready_reason()
+        if reason:
+            return reason
+        docs = await self.retriever.aget_relevant_documents(query)
+        answer = await self.llm.ainvoke(self._build_prompt(query, docs))
+        return str(answer)
+
+    def _build_prompt(self, query: str, docs: list) -> str:
         context = "\n\n".join([getattr(d, "page_content", str(d)) for d in docs])
-        prompt = (
+        return (
             "Please answer the question based on the following context. "
             "Your answer must be based on the context information. "
             "If the question is not related to the context, please answer 'Sorry, I don't know'.\n"
             f"Context: {context}\n"
             f"Question: {query}\n"
             "Answer (please be concise and clear):"
-        )
-        try:
-            answer = self.llm.invoke(prompt)
-        except Exception:
-            # 兼容旧版 LLM 接口
-            answer = self.llm._call(prompt)
-        return str(answer)
\ No newline at end of file
+        )
\ No newline at end of file
@@ -0,0 +1,295 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+from .titles import conversation_digest
+
+INDEX_FILE = "index.sqlite3"
+# 索引结构版本；1 表示已完成从 JSON 目录的一次性迁移
+SCHEMA_VERSION = 1
+SNAPSHOT_SUFFIX = ".json"
+LOG_SUFFIX = ".jsonl"
+
+
+class SessionMeta(NamedTuple):
+    id: str
+    title: Optional[str]
+    updated_at: float
+
+
+class HistoryStore:
+    """
+    聊天历史存储：会话元数据（标题、更新时间、消息数）存放在 SQLite 索引中，侧边栏只分页查询索引。
+    消息正文按会话存放：`<会话 ID>.json` 为快照，`<会话 ID>.jsonl` 为快照之后追加的消息日志
+    （每行一条，带序号）。新消息只追加一行，日志达到 compact_every 条时合并进快照。可在多线程间共用。
+    """
+
+    def __init__(self, root: str, compact_every: Optional[int] = None):
+        self.root = root
+        self.compact_every = compact_every or int(os.getenv("HISTORY_COMPACT_EVERY", "50"))
+        # 1 表示每次追加后 fsync，断电也不丢消息；默认只保证进程崩溃不丢
+        self.fsync = os.getenv("HISTORY_FSYNC", "0") == "1"
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.RLock()
+        # 各会话下一条日志消息的序号（首次追加时由索引与日志得出）
+        self._next_seq: dict = {}
+        self._conn = sqlite3.connect(os.path.join(root, INDEX_FILE), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, title TEXT, title_digest TEXT,"
+            " updated_at REAL NOT NULL, message_count INTEGER NOT NULL DEFAULT 0,"
+            " log_entries INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "log_entries" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN log_entries INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at DESC, id DESC)")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self.migrate()
+
+    def _body_path(self, session_id: str) -> str:
+        return os.path.join(self.root, session_id + SNAPSHOT_SUFFIX)
+
+    def _log_path(self, session_id: str) -> str:
+        return os.path.join(self.root, session_id + LOG_SUFFIX)
+
+    def migrate(self) -> int:
+        """一次性迁移：扫描历史目录中的快照（纯消息列表 或 {title, messages}）与消息日志写入索引，
+        纯列表格式同时改写为 {title, title_digest, messages}。返回迁移的会话数。"""
+        session_ids = {
+            name[:-len(suffix)] for name in os.listdir(self.root)
+            for suffix in (SNAPSHOT_SUFFIX, LOG_SUFFIX) if name.endswith(suffix)
+        }
+        rows = []
+        for session_id in session_ids:
+            path = self._body_path(session_id)
+            data = self._read_snapshot(path)
+            if isinstance(data, list):
+                data = {"title": None, "title_digest": conversation_digest(data), "messages": data}
+                self._write_body(path, data)
+            elif not isinstance(data, dict):
+                data = {}
+            snapshot = data.get("messages") or []
+            messages = snapshot + self._read_log(session_id, len(snapshot))
+            if not messages:
+                continue
+            paths = [p for p in (path, self._log_path(session_id)) if os.path.exists(p)]
+            rows.append((
+                session_id, data.get("title"), data.get("title_digest") or conversation_digest(messages),
+                max(os.path.getmtime(p) for p in paths), len(messages), len(messages) - len(snapshot),
+            ))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sessions (id, title, title_digest, updated_at, message_count, log_entries)"
+                " VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.execute("COMMIT")
+        return len(rows)
+
+    def list_sessions(self, limit: int = 20, offset: int = 0, exclude: Optional[str] = None) -> List[SessionMeta]:
+        """按更新时间倒序分页返回 (会话 ID, 标题, 更新时间)；exclude 为不列出的会话（如当前会话）。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, title, updated_at FROM sessions WHERE id IS NOT ?"
+                " ORDER BY updated_at DESC, id DESC LIMIT ? OFFSET ?",
+                (exclude, limit, offset),
+            ).fetchall()
+        return [SessionMeta(*row) for row in rows]
+
+    def count(self, exclude: Optional[str] = None) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions WHERE id IS NOT ?", (exclude,)).fetchone()[0]
+
+    def get_meta(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT title, title_digest, updated_at, message_count FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("title", "title_digest", "updated_at", "message_count"), row))
+
+    def load(self, session_id: str) -> Optional[List[dict]]:
+        """读取会话的全部消息（快照 + 日志）；会话不存在时返回 None。"""
+        data = self._read_snapshot(self._body_path(session_id))
+        if isinstance(data, list):
+            snapshot = data
+        else:
+            snapshot = data.get("messages", []) if isinstance(data, dict) else []
+        log = self._read_log(session_id, len(snapshot))
+        if data is None and not log:
+            return None
+        return snapshot + log
+
+    def append(self, session_id: str, message: dict) -> None:
+        """追加一条消息：只写入日志末尾一行并更新索引，耗时与会话长度无关。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT message_count, log_entries FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            indexed, log_entries = row if row else (0, 0)
+            seq = self._seq_for(session_id, indexed)
+            line = (json.dumps({"seq": seq, "message": message}, ensure_ascii=False) + "\n").encode("utf-8")
+            with open(self._log_path(session_id), "a+b") as f:
+                # 上次崩溃留下写了一半的行时先换行，避免与新消息粘连
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = b"\n" + line
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self._next_seq[session_id] = seq + 1
+            # 消息数以序号为准，同时修正上次崩溃时索引少计的消息
+            self._conn.execute(
+                "INSERT INTO sessions (id, updated_at, message_count, log_entries) VALUES (?, ?, ?, 1)"
+                " ON CONFLICT(id) DO UPDATE SET updated_at = excluded.updated_at,"
+                " message_count = excluded.message_count, log_entries = log_entries + 1",
+                (session_id, time.time(), seq + 1),
+            )
+            if log_entries + 1 >= self.compact_every:
+                self.compact(session_id)
+
+    def _seq_for(self, session_id: str, indexed: int) -> int:
+        """
+        下一条消息的序号：索引中的消息数与日志中最大序号 + 1 的较大者。日志先于索引写入，
+        两者之间崩溃时索引少计一条，只看索引会重复使用序号，读取时新消息覆盖旧消息。
+        """
+        seq = self._next_seq.get(session_id)
+        if seq is None:
+            seq = max([-1] + [entry["seq"] for entry in self._log_entries(session_id)]) + 1
+        return max(seq, indexed)
+
+    def compact(self, session_id: str) -> None:
+        """把日志合并进快照：先原子替换快照，再删除日志（中途崩溃时按序号去重，不会重复或丢失消息）。"""
+        with self._lock:
+            if not os.path.exists(self._log_path(session_id)):
+                return
+            messages = self.load(session_id) or []
+            meta = self.get_meta(session_id) or {}
+            self._write_body(self._body_path(session_id), {
+                "title": meta.get("title"), "title_digest": meta.get("title_digest"), "messages": messages,
+            })
+            os.remove(self._log_path(session_id))
+            self._next_seq[session_id] = len(messages)
+            self._conn.execute(
+                "UPDATE sessions SET message_count = ?, log_entries = 0 WHERE id = ?", (len(messages), session_id)
+            )
+
+    def save(self, session_id: str, messages: List[dict], title: Optional[str] = None,
+             title_digest: Optional[str] = None) -> None:
+        """整体写入消息正文（覆盖快照并清空日志）并更新索引。"""
+        title_digest = title_digest or conversation_digest(messages)
+        with self._lock:
+            self._write_body(self._body_path(session_id),
+                             {"title": title, "title_digest": title_digest, "messages": messages})
+            try:
+                os.remove(self._log_path(session_id))
+            except FileNotFoundError:
+                pass
+            self._next_seq[session_id] = len(messages)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, title, title_digest, updated_at, message_count, log_entries)"
+                " VALUES (?, ?, ?, ?, ?, 0)",
+                (session_id, title, title_digest, time.time(), len(messages)),
+            )
+
+    def set_meta(self, session_id: str, title: Optional[str], title_digest: Optional[str]) -> None:
+        """更新索引中的标题与对话哈希（不改写消息正文）。"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE sessions SET title = ?, title_digest = ? WHERE id = ?", (title, title_digest, session_id)
+            )
+
+    def set_title(self, session_id: str, title: str, title_digest: Optional[str] = None) -> bool:
+        """回填标题；给定 title_digest 时仅当会话尚无标题、且内容未变化（或尚未记录哈希）才写入。返回是否写入。"""
+        with self._lock:
+            if title_digest is None:
+                cursor = self._conn.execute("UPDATE sessions SET title = ? WHERE id = ?", (title, session_id))
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE sessions SET title = ? WHERE id = ? AND (title_digest IS NULL OR title_digest = ?)"
+                    " AND (title IS NULL OR title = '')",
+                    (title, session_id, title_digest),
+                )
+        if not cursor.rowcount:
+            return False
+        # 快照中的标题同步更新，保持文件可独立读取
+        path = self._body_path(session_id)
+        data = self._read_snapshot(path)
+        if isinstance(data, dict):
+            data["title"] = title
+            self._write_body(path, data)
+        return True
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._next_seq.pop(session_id, None)
+        for path in (self._body_path(session_id), self._log_path(session_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _read_snapshot(path: str):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _log_entries(self, session_id: str) -> List[dict]:
+        """日志中的全部 {seq, message} 记录，写了一半的行忽略。"""
+        entries = []
+        try:
+            with open(self._log_path(session_id), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(entry, dict) and "seq" in entry:
+                        entries.append(entry)
+        except OSError:
+            return []
+        return entries
+
+    def _read_log(self, session_id: str, start: int) -> List[dict]:
+        """读取序号不小于 start 的日志消息；同一序号以最后一次写入为准。"""
+        entries = {e["seq"]: e["message"] for e in self._log_entries(session_id) if e["seq"] >= start}
+        return [entries[seq] for seq in sorted(entries)]
+
+    @staticmethod
+    def _write_body(path: str, data: dict) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        os.replace(tmp, path)
+
+
+_stores: dict = {}
+_stores_lock = threading.Lock()
+
+
+def get_history_store(root: str) -> HistoryStore:
+    """按目录获取进程级共享的历史存储（Streamlit 的各个会话共用）。"""
+    root = os.path.abspath(root)
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = HistoryStore(root)
+        return store
@@ -1,107 +1,52 @@
 import streamlit as st
 import os
-import json
 import uuid
 from datetime import datetime
-<<<<<<< HEAD
-=======
-from typing import List
+from typing import List, Optional
 
->>>>>>> release/v1.4.1
 from financial_agent.core.llm_adapter import VolcanoLLM
+from financial_agent.core.memory import ConversationMemory
+from .history_store import get_history_store
+from .titles import conversation_digest, get_title_worker
 
 # --- 文件夹设置 ---
-HISTORY_DIR = "chat_history"
+HISTORY_DIR = os.getenv("CHAT_HISTORY_DIR", "chat_history")
 if not os.path.exists(HISTORY_DIR):
     os.makedirs(HISTORY_DIR)
 
+
+def history_store():
+    """会话历史存储（元数据索引 + 消息正文）"""
+    return get_history_store(HISTORY_DIR)
+
 # --- 会话状态管理 ---
 
 def get_new_session_id():
     """生成一个新的、基于时间的会话ID"""
     return datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
-<<<<<<< HEAD
-def generate_chat_title(messages):
-    """使用一个独立的、轻量的LLM为对话生成简洁的标题"""
-    # 明确使用为标题生成而指定的轻量模型
-    title_model_id = os.getenv("ARK_TITLE_MODEL_ID")
-    llm = VolcanoLLM(model_id=title_model_id)
-    
-    # 1. 格式化对话内容
-    conversation_text = "\n".join([f"{m['role']}: {m['content']}" for m in messages])
-    
-    # 2. 构建Prompt
-    prompt = f"""请根据以下对话内容，为其生成一个简洁的、不超过10个字的标题。
-
-对话内容:
----
-{conversation_text}
----
-
-标题:"""
-    
-    # 3. 调用LLM生成标题
-    try:
-        title = llm._call(prompt)
-        # 4. 清理和截断标题，使其适合作为文件名
-        # 移除不适合做文件名的字符
-        safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '_')).rstrip()
-        # 如果标题过长，进行截断
-        return safe_title[:20] if len(safe_title) > 20 else safe_title
-    except Exception as e:
-        # 如果LLM调用失败，则回退到使用时间戳
-        print(f"Error generating title: {e}")
-        return get_new_session_id()
-
-def save_chat_history(session_id, messages):
-    """将聊天记录保存到JSON文件，并优先使用动态生成的标题"""
-    if not messages:
-        return
-
-    # 检查缓存中是否已有为该会话生成的标题
-    if session_id in st.session_state.generated_titles:
-        title = st.session_state.generated_titles.pop(session_id) # 使用并移除缓存的标题
-    else:
-        # 如果缓存中没有，再判断是否是需要即时生成标题的新会话
-        is_timestamp_id = False
-        try:
-            datetime.strptime(session_id, "%Y-%m-%d_%H-%M-%S")
-            is_timestamp_id = True
-        except ValueError:
-            is_timestamp_id = False
-        
-        if is_timestamp_id:
-            title = generate_chat_title(messages)
-        else:
-            title = session_id # 如果不是新会话，则使用其本身的ID（即标题）
-
-    # 更新会话状态中的ID
-    if session_id != title:
-        if session_id in st.session_state.messages:
-            st.session_state.messages[title] = st.session_state.messages.pop(session_id)
-        if st.session_state.current_session_id == session_id:
-            st.session_state.current_session_id = title
-    
-    # 使用最终确定的标题作为文件名
-    file_path = os.path.join(HISTORY_DIR, f"{title}.json")
-=======
 def save_chat_history(session_id, messages, finalize: bool = False):
-    """将聊天记录保存到JSON文件。
-    - 仅在 finalize=True 时写入文件并生成标题（用户点击“新对话”时）。
-    - finalize=False 时不写入文件（避免当前会话出现在历史列表）。
+    """结束一个会话时补全其标题，并把消息日志合并为快照。
+    - 消息在 add_message_to_current_session 中已逐条追加写入，这里不再重写正文。
+    - finalize=False 时不做任何事；空会话不写入。
+    标题不在此处同步生成：优先沿用已有标题，否则提交后台生成，侧边栏先显示占位符，生成后回填。
     """
     if messages is None:
         return
-    if not finalize:
-        # 不持久化当前会话，直到创建新对话时再写入
+    if not finalize or not messages:
         return
-    file_path = os.path.join(HISTORY_DIR, f"{session_id}.json")
-    title = _generate_title_safe(messages)
-    payload = {"title": title, "messages": messages}
->>>>>>> release/v1.4.1
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(payload, f, ensure_ascii=False, indent=4)
+    store = history_store()
+    if store.get_meta(session_id) is None:
+        # 兼容未经 add_message_to_current_session 写入的消息
+        store.save(session_id, messages)
+    digest = conversation_digest(messages)
+    title = (
+        _stored_title(session_id, digest)
+        or st.session_state.generated_titles.get(session_id)
+        or request_title(session_id, messages)
+    )
+    store.set_meta(session_id, title, digest)
+    store.compact(session_id)
 
 def initialize_session_state():
     """初始化 Streamlit 的 session_state"""
@@ -113,6 +58,23 @@ def initialize_session_state():
     # 新增：用于缓存动态生成的标题
     if "generated_titles" not in st.session_state:
         st.session_state.generated_titles = {}
+    # 后台标题生成结果按浏览器会话区分
+    if "title_owner" not in st.session_state:
+        st.session_state.title_owner = uuid.uuid4().hex
+    # 每个会话的智能体记忆（最近几轮原文 + 滚动摘要）
+    if "memories" not in st.session_state:
+        st.session_state.memories = {}
+
+def get_session_memory() -> ConversationMemory:
+    """当前会话的智能体记忆"""
+    session_id = st.session_state.current_session_id
+    if session_id not in st.session_state.memories:
+        st.session_state.memories[session_id] = ConversationMemory()
+    return st.session_state.memories[session_id]
+
+def get_client_id() -> str:
+    """当前浏览器会话的标识，服务层按它排队与限流"""
+    return st.session_state.title_owner
 
 def get_current_messages():
     """获取当前会话的聊天记录"""
@@ -123,8 +85,8 @@ def add_message_to_current_session(role, content):
     current_messages = get_current_messages()
     current_messages.append({"role": role, "content": content})
     st.session_state.messages[st.session_state.current_session_id] = current_messages
-    # 仅保存消息，保持现有标题不变（不动态更新）
-    save_chat_history(st.session_state.current_session_id, current_messages, finalize=False)
+    # 只追加这一条消息（耗时与会话长度无关），进程中途退出也不会丢失
+    history_store().append(st.session_state.current_session_id, current_messages[-1])
 
     # --- 动态标题生成逻辑 ---
     session_id = st.session_state.current_session_id
@@ -135,11 +97,11 @@ def add_message_to_current_session(role, content):
     except ValueError:
         is_new_chat = False
 
-    # 当对话进行到第一轮（用户提问 -> 助手回答）后，就在后台生成标题
-    if is_new_chat and len(current_messages) >= 2:
-        # 调用LLM生成标题并将其缓存
-        title = generate_chat_title(current_messages)
-        st.session_state.generated_titles[session_id] = title
+    # 当对话进行到第一轮（用户提问 -> 助手回答）后，就在后台生成标题，不阻塞页面
+    if is_new_chat and len(current_messages) >= 2 and session_id not in st.session_state.generated_titles:
+        title = request_title(session_id, current_messages)
+        if title:
+            st.session_state.generated_titles[session_id] = title
 
 def handle_new_chat():
     """处理“新对话”按钮的点击事件"""
@@ -151,32 +113,68 @@ def handle_new_chat():
 
 def load_chat_history(session_id):
     """加载指定的聊天历史记录到当前会话"""
-    # 在加载前，先保存当前可能正在进行的对话
-    # 仅保存消息，不更新标题
-    save_chat_history(st.session_state.current_session_id, get_current_messages(), finalize=False)
-
-    file_path = os.path.join(HISTORY_DIR, f"{session_id}.json")
-    if os.path.exists(file_path):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            chat_history = json.load(f)
-            # 兼容两种格式：列表 或 {title, messages}
-            if isinstance(chat_history, list):
-                messages = chat_history
-            elif isinstance(chat_history, dict):
-                messages = chat_history.get("messages", [])
-            else:
-                messages = []
-            st.session_state.messages[session_id] = messages
-            # 修复：更新 current_session_id 以切换到加载的会话
-            st.session_state.current_session_id = session_id
-            st.rerun()
+    # 在加载前，结束当前可能正在进行的对话（消息已逐条写入，这里补全标题）
+    save_chat_history(st.session_state.current_session_id, get_current_messages(), finalize=True)
+
+    messages = history_store().load(session_id)
+    if messages is not None:
+        st.session_state.messages[session_id] = messages
+        # 修复：更新 current_session_id 以切换到加载的会话
+        st.session_state.current_session_id = session_id
+        st.rerun()
 
 def delete_chat_history(session_id):
-    """删除指定的聊天历史记录文件"""
-    file_path = os.path.join(HISTORY_DIR, f"{session_id}.json")
-    if os.path.exists(file_path):
-        os.remove(file_path)
-        # st.rerun() # The rerun is already in ui.py
+    """删除指定的聊天历史记录"""
+    history_store().delete(session_id)
+    # st.rerun() # The rerun is already in ui.py
+
+def list_chat_history(limit: int, offset: int = 0):
+    """分页返回历史会话的 (ID, 标题, 更新时间)，按更新时间倒序；不含当前会话"""
+    return history_store().list_sessions(limit=limit, offset=offset, exclude=st.session_state.current_session_id)
+
+def count_chat_history() -> int:
+    return history_store().count(exclude=st.session_state.current_session_id)
+
+
+def request_title(session_id: str, messages: List[dict]) -> Optional[str]:
+    """提交后台标题生成；同一对话内容已生成过时直接返回缓存的标题，否则返回 None。"""
+    worker = get_title_worker(_generate_title_safe)
+    return worker.submit(st.session_state.title_owner, session_id, messages)
+
+
+def apply_ready_titles() -> bool:
+    """取回已生成的标题，写入会话状态并回填到已保存的历史文件。返回是否仍有标题在生成中。"""
+    worker = get_title_worker(_generate_title_safe)
+    owner = st.session_state.title_owner
+    for session_id, digest, title in worker.drain(owner):
+        title = title or _fallback_title(session_id)
+        if not title:
+            continue
+        st.session_state.generated_titles[session_id] = title
+        # 仅回填内容未变化、且尚无标题的记录
+        history_store().set_title(session_id, title, title_digest=digest)
+    return bool(worker.pending(owner))
+
+
+def is_title_pending(session_id: str) -> bool:
+    return session_id in get_title_worker(_generate_title_safe).pending(st.session_state.title_owner)
+
+
+def _stored_title(session_id: str, digest: str) -> Optional[str]:
+    """历史记录中已有、且对应同一对话内容的标题。"""
+    meta = history_store().get_meta(session_id)
+    if meta and meta["title_digest"] == digest:
+        return meta["title"]
+    return None
+
+
+def _fallback_title(session_id: str) -> Optional[str]:
+    """标题生成失败时，退回到最近一条用户消息。"""
+    messages = history_store().load(session_id) or []
+    for m in reversed(messages):
+        if m.get("role") == "user" and m.get("content"):
+            return _truncate_title(m["content"])
+    return None
 
 
 def _generate_title_safe(messages: List[dict]) -> str:
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# (会话 ID, 对话哈希, 标题)；标题生成失败时为 None
+TitleResult = Tuple[str, str, Optional[str]]
+
+
+def conversation_digest(messages: List[dict]) -> str:
+    """对话内容的哈希，内容不变则哈希不变。"""
+    payload = json.dumps([(m.get("role"), m.get("content")) for m in messages], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class TitleWorker:
+    """
+    后台生成会话标题：请求提交到线程池，结果按提交方（每个浏览器会话一个 owner）放入各自的结果队列，
+    由页面脚本在下次运行时取回。相同对话内容的并发请求合并为一次调用，已生成的标题按对话哈希缓存。
+    """
+
+    def __init__(self, generate: Callable[[List[dict]], str], max_workers: Optional[int] = None, cache_size: int = 1024):
+        self._generate = generate
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("TITLE_WORKERS", "2")),
+            thread_name_prefix="chat-title",
+        )
+        self._lock = threading.Lock()
+        # 对话哈希 -> 等待该结果的 (owner, 会话 ID)
+        self._inflight: Dict[str, List[Tuple[str, str]]] = {}
+        self._queues: Dict[str, "queue.Queue[TitleResult]"] = {}
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_size = cache_size
+
+    def submit(self, owner: str, session_id: str, messages: List[dict]) -> Optional[str]:
+        """提交标题请求：命中缓存时直接返回标题，否则在后台生成并返回 None。"""
+        digest = conversation_digest(messages)
+        with self._lock:
+            title = self._cache.get(digest)
+            if title is not None:
+                self._cache.move_to_end(digest)
+                return title
+            self._queues.setdefault(owner, queue.Queue())
+            waiters = self._inflight.get(digest)
+            if waiters is not None:
+                if (owner, session_id) not in waiters:
+                    waiters.append((owner, session_id))
+                return None
+            self._inflight[digest] = [(owner, session_id)]
+        self._pool.submit(self._run, digest, list(messages))
+        return None
+
+    def drain(self, owner: str) -> List[TitleResult]:
+        """取回该 owner 已完成的全部结果（不阻塞）。"""
+        q = self._queues.get(owner)
+        results = []
+        while q is not None:
+            try:
+                results.append(q.get_nowait())
+            except queue.Empty:
+                break
+        return results
+
+    def pending(self, owner: str) -> Set[str]:
+        """该 owner 仍在生成中的会话 ID。"""
+        with self._lock:
+            return {sid for waiters in self._inflight.values() for o, sid in waiters if o == owner}
+
+    def _run(self, digest: str, messages: List[dict]) -> None:
+        try:
+            title = self._generate(messages) or None
+        except Exception:
+            title = None
+        with self._lock:
+            if title:
+                self._cache[digest] = title
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+            waiters = self._inflight.pop(digest, [])
+            for owner, session_id in waiters:
+                self._queues.setdefault(owner, queue.Queue()).put((session_id, digest, title))
+
+
+_worker: Optional[TitleWorker] = None
+_worker_lock = threading.Lock()
+
+
+def get_title_worker(generate: Callable[[List[dict]], str]) -> TitleWorker:
+    """进程级共享的标题生成器（Streamlit 的各个会话共用一个线程池与缓存）。"""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = TitleWorker(generate)
+    return _worker
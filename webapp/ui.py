@@ -1,8 +1,20 @@
 import streamlit as st
 import os
+import time
 from datetime import datetime
-from langchain_core.messages import HumanMessage, AIMessage
-from .session import handle_new_chat, load_chat_history, HISTORY_DIR, delete_chat_history
+from financial_agent.core.executor import get_blocking_executor
+from financial_agent.core.memory import memory_metrics
+from financial_agent.core.serving import ServerBusy
+from financial_agent.core.streaming import stream_agent_events, streaming_metrics
+from .session import (
+    handle_new_chat, load_chat_history, delete_chat_history, apply_ready_titles, is_title_pending,
+    list_chat_history, count_chat_history, get_session_memory, get_client_id,
+)
+
+# 标题尚在后台生成时的占位文字
+TITLE_PLACEHOLDER = "⏳ 正在生成标题…"
+# 侧边栏每页显示的历史会话数
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
 
 def render_page_config():
     """设置页面配置和标题"""
@@ -37,32 +49,75 @@ def render_sidebar():
         if st.button("➕ 新对话"):
             handle_new_chat()
 
+        _render_memory_metrics()
+        _render_streaming_metrics()
+
         st.header("历史记录")
-        history_files = sorted(os.listdir(HISTORY_DIR), reverse=True)
-        for filename in history_files:
-            session_id = filename.split('.')[0]
-            # 读取标题（兼容旧格式）
-            title = None
-            try:
-                fp = os.path.join(HISTORY_DIR, filename)
-                with open(fp, 'r', encoding='utf-8') as f:
-                    data = f.read()
-                import json as _json
-                parsed = _json.loads(data)
-                if isinstance(parsed, dict):
-                    title = parsed.get('title')
-            except Exception:
-                title = None
-            display_label = title or session_id
-
-            col1, col2 = st.columns([0.8, 0.2])
-            with col1:
-                if st.button(display_label, key=f"history_{filename}", use_container_width=True):
-                    load_chat_history(session_id)
-            with col2:
-                if st.button("🗑️", key=f"delete_{filename}", use_container_width=True):
-                    delete_chat_history(session_id)
-                    st.rerun()
+        if apply_ready_titles():
+            # 有标题仍在生成：历史列表放进定时刷新的片段，标题到达后替换占位符，无需整页重跑
+            fragment = getattr(st, "fragment", None)
+            if fragment is not None:
+                fragment(run_every=2)(_render_history_list)()
+                return
+        _render_history_list()
+
+def _render_memory_metrics():
+    """上下文用量：每轮送入智能体的 prompt token（估算）"""
+    last = get_session_memory().last_stats
+    stats = memory_metrics.snapshot()
+    if not last:
+        return
+    with st.expander("上下文用量", expanded=False):
+        st.caption(f"本会话上一轮 {last['prompt_tokens']} tokens（完整历史约 {last['full_tokens']}）")
+        st.caption(f"全部会话 p50 {stats['prompt_tokens_p50']:.0f} · p95 {stats['prompt_tokens_p95']:.0f}")
+
+def _render_streaming_metrics():
+    """响应速度：首个可见 token 耗时（TTFT）"""
+    stats = streaming_metrics.snapshot()
+    if not stats["responses"]:
+        return
+    with st.expander("响应速度", expanded=False):
+        st.caption(f"首字耗时 p50 {stats['ttft_p50'] or 0:.2f}s · p95 {stats['ttft_p95'] or 0:.2f}s")
+        for path, label in (("agent", "智能体"), ("fast", "快速路由")):
+            if stats.get(f"{path}_ttft_p50") is not None:
+                st.caption(f"{label} p50 {stats[f'{path}_ttft_p50']:.2f}s（完整回答 {stats[f'{path}_total_p50']:.2f}s）")
+
+def _render_history_list():
+    """分页渲染历史记录列表（只查询元数据索引）；标题未生成完成的会话显示占位符"""
+    apply_ready_titles()
+    total = count_chat_history()
+    pages = max(1, -(-total // HISTORY_PAGE_SIZE))
+    page = min(st.session_state.get("history_page", 0), pages - 1)
+    for session in list_chat_history(HISTORY_PAGE_SIZE, page * HISTORY_PAGE_SIZE):
+        session_id = session.id
+        if session.title:
+            display_label = session.title
+        elif is_title_pending(session_id):
+            display_label = TITLE_PLACEHOLDER
+        else:
+            display_label = session_id
+
+        col1, col2 = st.columns([0.8, 0.2])
+        with col1:
+            if st.button(display_label, key=f"history_{session_id}", use_container_width=True):
+                load_chat_history(session_id)
+        with col2:
+            if st.button("🗑️", key=f"delete_{session_id}", use_container_width=True):
+                delete_chat_history(session_id)
+                st.rerun()
+
+    if pages > 1:
+        col_prev, col_info, col_next = st.columns([0.3, 0.4, 0.3])
+        with col_prev:
+            if st.button("‹", key="history_prev", disabled=page == 0, use_container_width=True):
+                st.session_state.history_page = page - 1
+                st.rerun()
+        with col_info:
+            st.caption(f"{page + 1} / {pages}")
+        with col_next:
+            if st.button("›", key="history_next", disabled=page >= pages - 1, use_container_width=True):
+                st.session_state.history_page = page + 1
+                st.rerun()
 
 def render_chat_messages(messages):
     """从历史记录中显示聊天消息"""
@@ -70,43 +125,145 @@ def render_chat_messages(messages):
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
-def render_agent_response(agent, prompt, current_messages):
-    """处理用户输入，获取并流式显示智能体的回复"""
+def render_response_cache_metrics(response_cache):
+    """侧边栏：回答缓存命中率"""
+    if response_cache is None:
+        return
+    stats = response_cache.metrics.snapshot()
+    if not stats["lookups"]:
+        return
+    with st.sidebar.expander("回答缓存", expanded=False):
+        st.caption(
+            f"命中率 {stats['hit_rate']:.0%}（精确 {stats['exact_hits']} · 语义 {stats['semantic_hits']} · "
+            f"未命中 {stats['misses']}）"
+        )
+
+def render_serving_metrics(server):
+    """侧边栏：服务层排队情况与上游并发"""
+    if server is None:
+        return
+    from financial_agent.core.upstream import upstream_metrics
+    stats = server.snapshot()
+    if not stats["submitted"] and not stats["rejected"]:
+        return
+    with st.sidebar.expander("服务负载", expanded=False):
+        st.caption(
+            f"执行中 {stats['running']}/{stats['workers']} · 排队 {stats['queue_depth']} · "
+            f"已拒绝 {stats['rejected']}"
+        )
+        if stats["queue_wait_p50"] is not None:
+            st.caption(f"排队耗时 p50 {stats['queue_wait_p50']:.2f}s · p95 {stats['queue_wait_p95']:.2f}s")
+        for name, upstream in sorted(upstream_metrics.snapshot().items()):
+            state = {"open": "（熔断中）", "half_open": "（半开探测中）"}.get(upstream["state"], "")
+            st.caption(
+                f"{name}{state}：在途 {upstream['in_flight']}（峰值 {upstream['peak']}）· "
+                f"等待 p95 {upstream['wait_p95']:.2f}s · 限流 {upstream['throttled']} · "
+                f"重试 {upstream['retries']} · 熔断拒绝 {upstream['short_circuits']}"
+            )
+
+def _tools_ready(agent) -> bool:
+    """后台加载的工具（如知识库）是否均已就绪；未就绪时的回答不写入缓存"""
+    return all(getattr(t, "ready", None) is None or t.ready.is_set() for t in getattr(agent, "tools", []))
+
+def _stream_fast_path(router, prompt, enhanced_prompt, message_placeholder, status_placeholder):
+    """规则路由命中时直接调用工具并流式输出回答；未命中或工具出错（尚未输出）时返回 None，交给智能体。"""
+    if router is None:
+        return None
+    full_response = ""
+    try:
+        # 路由规则本身出错（如无法处理的输入）同样交给智能体
+        route = router.match(prompt)
+        if route is None:
+            return None
+        tool_name = router.tool_name(route)
+        status_placeholder.text(f"查询工具: {tool_name}...")
+        started = time.perf_counter()
+        ttft = None
+        for piece in router.stream(route, enhanced_prompt):
+            if not full_response:
+                status_placeholder.empty()
+                ttft = time.perf_counter() - started
+            full_response += piece
+            message_placeholder.markdown(full_response + "▌")
+    except Exception:
+        if not full_response:
+            return None
+        raise
+    streaming_metrics.record("fast", ttft, time.perf_counter() - started)
+    return full_response, [tool_name]
+
+def render_agent_response(agent, prompt, current_messages, response_cache=None, router=None, server=None):
+    """处理用户输入，获取并流式显示智能体的回复。
+    命中回答缓存时直接返回缓存的回答；明确的行情、指标、名词解释问题走快速路由，不经过智能体循环。
+    传入 server 时智能体调用经服务层排队执行，排队已满时只在界面上提示并返回 None（不是回答，不写入会话历史与回答缓存）。
+    """
     with st.chat_message("assistant"):
         message_placeholder = st.empty()
         status_placeholder = st.empty()
         full_response = ""
         output_started = False
-        
-        # 为智能体准备对话历史
-        chat_history = []
-        for msg in current_messages[:-1]: # 排除刚刚添加的用户最新消息
-            if msg["role"] == "user":
-                chat_history.append(HumanMessage(content=msg["content"]))
-            elif msg["role"] == "assistant":
-                chat_history.append(AIMessage(content=msg["content"]))
+        busy = None
+
+        cached = response_cache.lookup(prompt) if response_cache is not None else None
+        if cached is not None:
+            message_placeholder.markdown(cached.answer)
+            note = f"⚡ 来自缓存（{cached.age / 60:.0f} 分钟前）" if cached.time_sensitive else "⚡ 来自缓存"
+            st.caption(note)
+            return cached.answer
         
         # 注入当前日期
         current_date = datetime.now().strftime("%Y-%m-%d")
         enhanced_prompt = f"当前日期是 {current_date}。用户的请求是：{prompt}"
 
+        tools_used = []
         try:
-            status_placeholder.text("思考中...")
-            for chunk in agent.stream({"input": enhanced_prompt, "chat_history": chat_history}):
-                if "actions" in chunk and not output_started:
-                    for action in chunk["actions"]:
-                        status_placeholder.text(f"查询工具: {action.tool}...")
-                elif "steps" in chunk and not output_started:
-                    status_placeholder.text("分析中...")
-                elif "output" in chunk and chunk["output"]:
-                    if not output_started:
-                        status_placeholder.empty()
-                        output_started = True
-                    
-                    full_response += chunk["output"]
-                    message_placeholder.markdown(full_response + "▌")
+            fast = _stream_fast_path(router, prompt, enhanced_prompt, message_placeholder, status_placeholder)
+            if fast is not None:
+                full_response, tools_used = fast
+            else:
+                # 为智能体准备对话历史：最近几轮原文 + 更早对话的摘要，大块表格换成引用
+                # 排除刚刚添加的用户最新消息
+                chat_history = get_session_memory().build(current_messages[:-1], enhanced_prompt)
+                status_placeholder.text("思考中...")
+                # 最终回答的 token 从 LLM 回调中逐段解析出来，边生成边显示
+                inputs = {"input": enhanced_prompt, "chat_history": chat_history}
+                if server is not None:
+                    events = server.stream(get_client_id(), inputs)
+                else:
+                    events = stream_agent_events(agent, inputs)
+                for event in events:
+                    if event.kind == "queued":
+                        ahead = f"，前面还有 {event.data} 个请求" if event.data else ""
+                        status_placeholder.text(f"排队中{ahead}...")
+                    elif event.kind == "started":
+                        status_placeholder.text("思考中...")
+                    elif event.kind == "action":
+                        tools_used.append(event.data)
+                        if not output_started:
+                            status_placeholder.text(f"查询工具: {event.data}...")
+                    elif event.kind == "step" and not output_started:
+                        status_placeholder.text("分析中...")
+                    elif event.kind in ("token", "output") and event.data:
+                        if not output_started:
+                            status_placeholder.empty()
+                            output_started = True
+                        # 完整的 output 以智能体解析结果为准（未按 JSON 输出的回答也只在这里出现）
+                        full_response = full_response + event.data if event.kind == "token" else event.data
+                        message_placeholder.markdown(full_response + "▌")
+        except ServerBusy as e:
+            busy = str(e)
         finally:
             status_placeholder.empty()
-            message_placeholder.markdown(full_response)
-            
-    return full_response
\ No newline at end of file
+            if busy is None:
+                message_placeholder.markdown(full_response)
+        if busy is not None:
+            message_placeholder.warning(busy)
+            return None
+
+    if response_cache is not None and full_response and _tools_ready(agent):
+        from financial_agent.core.response_cache import is_time_sensitive
+        from financial_agent.tools.knowledge_base_tool import KB_TOOL_NAME
+        # 写入缓存需要一次 Embedding 调用，放到后台执行
+        time_sensitive = is_time_sensitive(prompt, tools_used, static_tools={KB_TOOL_NAME})
+        get_blocking_executor().submit(response_cache.store, prompt, full_response, time_sensitive)
+    return full_response